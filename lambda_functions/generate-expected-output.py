@@ -1,10 +1,28 @@
 import boto3
+import hashlib
+import json
+import math
+import random
+import re
+import select
+import signal
+import struct
 import subprocess
 import os
 import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from botocore.exceptions import ClientError
 
 # Initialize boto3 client for S3
 s3 = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+
+# Questions whose reference solution fails performance verification are flagged unavailable here
+QUESTIONS_TABLE = os.getenv('QUESTIONS_TABLE', 'leetcode-ai-questions')
 
 # Setup logger for better debugging and information tracking
 logger = logging.getLogger()
@@ -20,33 +38,467 @@ def download_file_from_s3(bucket_name, file_key, local_file_path):
         logger.error(f"Error downloading {file_key} from S3: {str(e)}")
         raise e
 
-def upload_file_to_s3(bucket_name, file_key, local_file_path):
-    """Upload file from local Lambda environment to S3."""
+def read_s3_text(bucket_name, file_key):
+    """Read a text object from S3 straight into memory."""
     try:
-        logger.info(f"Uploading {file_key} to bucket {bucket_name}")
-        s3.upload_file(local_file_path, bucket_name, file_key)
-        logger.info(f"Successfully uploaded {file_key}")
+        logger.info(f"Fetching {file_key} from bucket {bucket_name}")
+        response = s3.get_object(Bucket=bucket_name, Key=file_key)
+        return response['Body'].read().decode('utf-8')
+    except Exception as e:
+        logger.error(f"Error fetching {file_key} from S3: {str(e)}")
+        raise e
+
+def write_s3_bytes(bucket_name, file_key, data):
+    """Upload an in-memory payload to S3."""
+    try:
+        s3.put_object(Bucket=bucket_name, Key=file_key, Body=data, ContentType='text/plain')
+        logger.info(f"Uploaded {file_key} ({len(data)} bytes)")
     except Exception as e:
         logger.error(f"Error uploading {file_key} to S3: {str(e)}")
         raise e
 
-def run_tester_solution(local_script, input_data):
-    """Run the tester solution and capture its output."""
+# Concurrent S3 transfers (input prefetches and output uploads) per invocation
+TRANSFER_WORKERS = int(os.getenv('TRANSFER_WORKERS', '8'))
+
+# Seconds a single test case may run before its harness worker is killed and replaced
+CASE_TIMEOUT = float(os.getenv('HARNESS_CASE_TIMEOUT', '30'))
+
+# Long-lived worker that compiles tester_solution.py once and then forks a fresh child for
+# every input it is sent, so globals, builtins, sys.modules and interpreter settings a case
+# changes never leak into the next one, at the cost of a fork instead of an interpreter start.
+# In the child the real fds 0/1/2 are pointed at per-case files (stdin holding the input), so
+# solutions reading open(0) or os.read(0, ...) see the same input as sys.stdin. Requests and
+# responses are length-prefixed JSON on private copies of the original fds 0/1, which the
+# child closes, so nothing the solution writes can corrupt the protocol. The child times only
+# the solution's own run, which is what performance verification measures.
+HARNESS_SOURCE = r"""
+import json, os, struct, sys, tempfile, time, traceback
+
+proto_in, proto_out = os.dup(0), os.dup(1)
+workdir = tempfile.mkdtemp()
+stdin_path, stdout_path, stderr_path, result_path = (
+    os.path.join(workdir, name) for name in ('stdin', 'stdout', 'stderr', 'result')
+)
+
+def read_exact(size):
+    data = b''
+    while len(data) < size:
+        chunk = os.read(proto_in, size - len(data))
+        if not chunk:
+            sys.exit(0)
+        data += chunk
+    return data
+
+def write_message(message):
+    payload = json.dumps(message).encode('utf-8')
+    data = memoryview(struct.pack('>I', len(payload)) + payload)
+    while data:
+        data = data[os.write(proto_out, data):]
+
+def redirect(path, fd, flags):
+    new_fd = os.open(path, flags, 0o600)
+    if new_fd != fd:
+        os.dup2(new_fd, fd)
+        os.close(new_fd)
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8', errors='replace')
+
+def run_case():
+    # Runs in the forked child, which exits without returning
+    os.close(proto_in)
+    os.close(proto_out)
+    redirect(stdin_path, 0, os.O_RDONLY)
+    redirect(stdout_path, 1, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    redirect(stderr_path, 2, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    sys.stdin = open(0, 'r', encoding='utf-8', closefd=False)
+    sys.stdout = open(1, 'w', encoding='utf-8', closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf-8', closefd=False)
+    error = None
+    started = time.perf_counter()
     try:
-        logger.info("Running tester solution.")
-        process = subprocess.run(
-            ['python3', local_script],
-            input=input_data,
-            text=True,
-            capture_output=True,
-            check=True
+        try:
+            exec(code, {'__name__': '__main__', '__file__': script_path, '__builtins__': __builtins__})
+        finally:
+            seconds = time.perf_counter() - started
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"exited with status {e.code}"
+    except BaseException:
+        error = traceback.format_exc()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump({'error': error, 'seconds': seconds}, f)
+    os._exit(1 if error is not None else 0)
+
+script_path = sys.argv[1]
+with open(script_path) as f:
+    code = compile(f.read(), script_path, 'exec')
+
+while True:
+    (size,) = struct.unpack('>I', read_exact(4))
+    request = json.loads(read_exact(size))
+    with open(stdin_path, 'wb') as f:
+        f.write(request['stdin'].encode('utf-8'))
+    open(result_path, 'wb').close()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_case()
+        finally:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    result = json.loads(read_file(result_path) or '{"error": null, "seconds": null}')
+    error = result['error']
+    if error is None and os.WIFSIGNALED(status):
+        error = f"killed by signal {os.WTERMSIG(status)}"
+    elif error is None and os.WEXITSTATUS(status) != 0:
+        error = f"exited with status {os.WEXITSTATUS(status)}"
+    write_message({
+        'stdout': read_file(stdout_path), 'stderr': read_file(stderr_path), 'error': error, 'seconds': result['seconds']
+    })
+"""
+
+class HarnessError(Exception):
+    """Raised when the tester solution fails, crashes or times out on a test case."""
+
+class SolutionHarness:
+    """
+    Runs the tester solution from one persistent interpreter that forks per case, instead of
+    starting an interpreter per case. A worker that crashes or overruns CASE_TIMEOUT is killed
+    along with its case and lazily replaced, so one bad case never affects the next.
+    """
+
+    def __init__(self, script_path, timeout=CASE_TIMEOUT):
+        self.script_path = script_path
+        self.timeout = timeout
+        self.process = None
+        self.started = 0
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            ['python3', '-c', HARNESS_SOURCE, self.script_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # Its own process group, so a timed-out case dies with the worker
+            start_new_session=True
         )
+        self.started += 1
+        logger.info(f"Started harness worker (pid {self.process.pid})")
+
+    def _read_exact(self, size, deadline):
+        fd = self.process.stdout.fileno()
+        data = b''
+        while len(data) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise TimeoutError
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def run(self, input_data):
+        return self.run_timed(input_data)[0]
+
+    def run_timed(self, input_data):
+        """The solution's output and the seconds its own run took, excluding process and IPC overhead"""
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+        payload = json.dumps({'stdin': input_data}).encode('utf-8')
+        deadline = time.monotonic() + self.timeout
+        try:
+            self.process.stdin.write(struct.pack('>I', len(payload)) + payload)
+            self.process.stdin.flush()
+            (size,) = struct.unpack('>I', self._read_exact(4, deadline))
+            response = json.loads(self._read_exact(size, deadline))
+        except TimeoutError:
+            self.close()
+            raise HarnessError(f"timed out after {self.timeout}s")
+        except (EOFError, BrokenPipeError):
+            returncode = self.process.wait()
+            self.close()
+            raise HarnessError(f"harness worker crashed with exit status {returncode}")
+
+        if response['error']:
+            raise HarnessError(f"{response['error']}\n{response['stderr']}".strip())
+        return response['stdout'], response['seconds']
+
+    def close(self):
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+            self.process.stdin.close()
+            self.process.stdout.close()
+            self.process = None
+
+def run_tester_solution(harness, input_data):
+    """Run the tester solution with input and capture its output."""
+    try:
+        logger.info("Running tester solution.")
+        output = harness.run(input_data)
         logger.info("Script executed successfully.")
-        return process.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error executing script: {e.stderr}")
+        return output.strip()
+    except HarnessError as e:
+        logger.error(f"Error executing script: {str(e)}")
         raise e
 
+def case_number(name):
+    """Numeric part of a test case name such as 'testcase12', used to keep cases in order."""
+    match = re.search(r'(\d+)$', name)
+    return int(match.group(1)) if match else 0
+
+def is_sample(name):
+    """sampleN.txt files hold the question's worked examples, in the same stdin format."""
+    return name.startswith('sample')
+
+def case_sort_key(name):
+    """Samples first, then test cases in numeric order."""
+    return (not is_sample(name), case_number(name))
+
+def file_sha256(local_path):
+    with open(local_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def output_content_key(solution_hash, input_etag):
+    """Identity of an expected output: the solution that produced it and the input it ran on."""
+    return hashlib.sha256(f"{solution_hash}:{input_etag}".encode('utf-8')).hexdigest()
+
+def output_is_current(case, solution_hash):
+    output = case.get('output')
+    return bool(output) and output.get('content_key') == output_content_key(solution_hash, case['input']['etag'])
+
+# The manifest is also rewritten by the generate_test_cases Lambda, so it is only ever written
+# conditionally on the version that was read; a write that lost the race is redone this often
+MANIFEST_WRITE_ATTEMPTS = 5
+
+def read_manifest(bucket_name, question_id):
+    """
+    The question's manifest and its ETag, or (None, None) when there is none. The inputs
+    are never listed instead: while generate_test_cases is still uploading, a listing is
+    incomplete, and that Lambda invokes this one once the manifest is written.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=f"{question_id}/manifest.json")
+        manifest = json.loads(response['Body'].read())
+        logger.info(f"Loaded manifest with {manifest['count']} test cases")
+        return manifest, response['ETag']
+    except s3.exceptions.NoSuchKey:
+        return None, None
+
+def put_manifest_if_unchanged(bucket_name, question_id, manifest, etag):
+    """Write the manifest only if it is still at `etag` (or still absent); False if it changed."""
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=f"{question_id}/manifest.json",
+            Body=json.dumps(manifest),
+            ContentType='application/json',
+            **condition
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            return False
+        raise
+
+def update_manifest(bucket_name, question_id, change):
+    """
+    Apply `change(manifest)` to the current manifest and write it with a fresh version, so
+    the judge's test-case cache reloads this question. Returns what `change` returned.
+    """
+    for attempt in range(MANIFEST_WRITE_ATTEMPTS):
+        manifest, etag = read_manifest(bucket_name, question_id)
+        if manifest is None:
+            raise RuntimeError(f"The manifest of {question_id} disappeared while it was being updated")
+        result = change(manifest)
+        manifest['version'] = str(uuid.uuid4())
+        manifest['count'] = len(manifest['cases'])
+        if put_manifest_if_unchanged(bucket_name, question_id, manifest, etag):
+            logger.info(f"Saved manifest version {manifest['version']} for {question_id}")
+            return result
+        logger.info(f"Manifest of {question_id} changed while it was being updated, retrying")
+        time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+    raise RuntimeError(f"Could not update the manifest of {question_id} after {MANIFEST_WRITE_ATTEMPTS} attempts")
+
+def verification_summary(verification):
+    return {key: verification[key] for key in ('solution_sha256', 'status', 'reason')} if verification else None
+
+def save_outputs(bucket_name, question_id, outputs, verification=None):
+    """
+    Merge {case name: output entry} into the manifest, along with the verification verdict
+    of the solution that produced them. An output is only recorded while its case still has
+    the input it was produced from.
+    """
+    def change(manifest):
+        recorded = 0
+        for case in manifest['cases']:
+            output = outputs.get(case['name'])
+            if output and case.get('input') and output['input_etag'] == case['input']['etag']:
+                case['output'] = output
+                recorded += 1
+        manifest['verification'] = verification_summary(verification)
+        return recorded
+
+    recorded = update_manifest(bucket_name, question_id, change)
+    logger.info(f"Recorded {recorded} new outputs for {question_id}")
+    return recorded
+
+def record_availability(question_id, verification):
+    """
+    Flag the question unavailable in DynamoDB when its reference solution failed
+    verification, and clear the flag when a later solution passes. Best-effort: the row is
+    never created here, and a failure to write it is only logged.
+    """
+    table = dynamodb.Table(QUESTIONS_TABLE)
+    if verification['status'] == 'failed':
+        update = {
+            'UpdateExpression': 'SET available = :available, unavailable_reason = :reason',
+            'ExpressionAttributeValues': {
+                ':available': False,
+                ':reason': f"Reference solution failed performance verification: {verification['reason']}"
+            }
+        }
+    else:
+        update = {
+            'UpdateExpression': 'SET available = :available REMOVE unavailable_reason',
+            'ExpressionAttributeValues': {':available': True}
+        }
+    try:
+        table.update_item(
+            Key={'question_id': question_id},
+            ConditionExpression='attribute_exists(question_id)',
+            **update
+        )
+    except ClientError as e:
+        logger.error(f"Error recording availability of {question_id}: {str(e)}")
+
+# Performance verification: the reference solution is timed on inputs from the question's
+# scaling_input.py at geometrically growing sizes up to the constraints, and the growth
+# exponent of time against n is compared with the complexity the solution prompt asks for.
+# Only the solution's own run is timed, inside the harness, so process and IPC overhead do
+# not flatten the curve at small n.
+VERIFY_TIME_BUDGET = float(os.getenv('VERIFY_TIME_BUDGET', '10'))  # seconds allowed at the largest n
+VERIFY_EXPONENT_TOLERANCE = float(os.getenv('VERIFY_EXPONENT_TOLERANCE', '0.5'))
+VERIFY_STEPS = int(os.getenv('VERIFY_STEPS', '7'))  # sizes tried: MAX_N / 4^k for k < VERIFY_STEPS
+VERIFY_NOISE_FLOOR = 0.01  # runs faster than this (seconds) say nothing about growth
+VERIFY_MAX_INPUT_BYTES = 64 * 1024 * 1024
+
+def target_exponent(max_n):
+    """Growth exponent allowed for a given n, mirroring the table in the solution prompt."""
+    if max_n > 10 ** 9:
+        return 0
+    if max_n >= 10 ** 8:
+        return 1
+    if max_n >= 10 ** 5:
+        return 1.15  # n log n over the sizes we try
+    if max_n > 10 ** 3:
+        return 2
+    if max_n >= 16:
+        return 3
+    return None  # exponential solutions are allowed for tiny n
+
+def fit_exponent(points):
+    """Least-squares slope of log(seconds) against log(n), or None without enough signal."""
+    points = [(n, seconds) for n, seconds in points if n > 0 and seconds >= VERIFY_NOISE_FLOOR]
+    if len(points) < 2:
+        return None
+    xs = [math.log(n) for n, _ in points]
+    ys = [math.log(seconds) for _, seconds in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if spread == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+def verify_solution_performance(bucket_name, question_id, local_script_path, solution_hash):
+    """
+    Time the reference solution across input sizes and decide whether it is fast enough to
+    become ground truth. The result is stored in {question_id}/verification.json keyed by
+    the solution hash, so a re-trigger for the same solution reuses it. Questions without a
+    scaling_input.py are not verified.
+    """
+    verification_key = f"{question_id}/verification.json"
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=verification_key)
+        previous = json.loads(response['Body'].read())
+        if previous.get('solution_sha256') == solution_hash:
+            logger.info(f"Reusing performance verification for {question_id}: {previous['status']}")
+            return previous
+    except s3.exceptions.NoSuchKey:
+        pass
+
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=f"{question_id}/scaling_input.py")
+        scaling_script = response['Body'].read().decode('utf-8')
+    except s3.exceptions.NoSuchKey:
+        logger.info(f"No scaling_input.py for {question_id}, skipping performance verification")
+        return None
+    local_scaling_path = '/tmp/scaling_input.py'
+    with open(local_scaling_path, 'w') as f:
+        f.write(scaling_script)
+
+    generator = SolutionHarness(local_scaling_path)
+    solution = SolutionHarness(local_script_path, timeout=2 * VERIFY_TIME_BUDGET)
+    measurements = []
+    status, reason = 'passed', None
+    try:
+        max_n = int(generator.run('max').strip())
+        sizes = sorted({max(1, max_n // 4 ** step) for step in range(VERIFY_STEPS)})
+        # The smallest size runs twice: the first run only warms up imports and caches
+        for attempt, n in enumerate([sizes[0]] + sizes):
+            input_data = generator.run(str(n))
+            if len(input_data) > VERIFY_MAX_INPUT_BYTES:
+                logger.info(f"Stopping verification at n={n}: input is {len(input_data)} bytes")
+                break
+            try:
+                _, seconds = solution.run_timed(input_data)
+            except HarnessError as e:
+                status, reason = 'failed', f"n={n}: {str(e)[:500]}"
+                break
+            if attempt == 0:
+                continue
+            measurements.append({'n': n, 'seconds': round(seconds, 4), 'input_bytes': len(input_data)})
+            logger.info(f"Reference solution took {seconds:.3f}s at n={n}")
+    except (HarnessError, ValueError) as e:
+        # A broken scaling script says nothing about the solution
+        status, reason = 'inconclusive', f"scaling_input.py failed: {str(e)[:500]}"
+        max_n = None
+    finally:
+        generator.close()
+        solution.close()
+
+    exponent = fit_exponent([(m['n'], m['seconds']) for m in measurements])
+    target = target_exponent(max_n) if max_n else None
+    if status == 'passed':
+        if measurements and measurements[-1]['seconds'] > VERIFY_TIME_BUDGET:
+            status, reason = 'failed', f"{measurements[-1]['seconds']}s at n={measurements[-1]['n']} exceeds {VERIFY_TIME_BUDGET}s"
+        elif exponent is not None and target is not None and exponent > target + VERIFY_EXPONENT_TOLERANCE:
+            status, reason = 'failed', f"time grows like n^{exponent:.2f}, expected at most n^{target}"
+
+    verification = {
+        'solution_sha256': solution_hash,
+        'status': status,
+        'reason': reason,
+        'max_n': max_n,
+        'exponent': round(exponent, 3) if exponent is not None else None,
+        'target_exponent': target,
+        'measurements': measurements
+    }
+    write_s3_bytes(bucket_name, verification_key, json.dumps(verification).encode('utf-8'))
+    logger.info(f"Performance verification for {question_id}: {status} {reason or ''}")
+    return verification
+
 def lambda_handler(event, context):
     # S3 bucket details
     try:
@@ -63,9 +515,6 @@ def lambda_handler(event, context):
         # bucket_name = event['bucket_name']
         # question_id = event['question_id']
         
-        # Number of test cases (assuming fixed to 25 as mentioned)
-        total_test_cases = 25
-
         # Paths for S3 and Lambda temp storage
         script_s3_path = f"{question_id}/tester_solution.py"
         local_script_path = '/tmp/tester_solution.py'
@@ -73,50 +522,108 @@ def lambda_handler(event, context):
         # Step 1: Download the tester solution from S3
         logger.info("Starting process to download tester solution.")
         download_file_from_s3(bucket_name, script_s3_path, local_script_path)
+        solution_hash = file_sha256(local_script_path)
 
-        # Iterate through each test case
-        for test_case_num in range(1, total_test_cases + 1):
-            input_s3_path = f"{question_id}/input/testcase{test_case_num}.txt"
-            output_s3_path = f"{question_id}/output/testcase{test_case_num}.txt"
+        # Discover the test cases from the manifest instead of probing fixed keys. Without one
+        # the inputs are not all uploaded yet; generate_test_cases invokes this Lambda again
+        # after writing the manifest, so this delivery can stop here
+        manifest, _ = read_manifest(bucket_name, question_id)
+        if manifest is None:
+            logger.info(f"No manifest for {question_id} yet, deferring to generate_test_cases")
+            return {
+                'statusCode': 202,
+                'body': f"Test case inputs for {question_id} are not ready yet; outputs will be generated once they are."
+            }
+        total_test_cases = len(manifest['cases'])
+        if total_test_cases == 0:
+            logger.error(f"No test case inputs found for {question_id}")
+            return {
+                'statusCode': 404,
+                'body': f"No test case inputs found for {question_id}"
+            }
 
-            local_input_path = f'/tmp/input_testcase{test_case_num}.txt'
-            local_output_path = f'/tmp/output_testcase{test_case_num}.txt'
+        # Only cases whose (solution, input) pair has no output yet need to run, so retries and
+        # duplicate S3 event deliveries cost the solution download and one manifest read;
+        # nothing is verified or run
+        stale_cases = [case for case in manifest['cases'] if not output_is_current(case, solution_hash)]
+        logger.info(f"{len(stale_cases)} of {total_test_cases} test cases need new outputs")
+        if not stale_cases:
+            return {
+                'statusCode': 200,
+                'body': f"All {total_test_cases} outputs are already up to date."
+            }
 
-            logger.info(f"Processing test case {test_case_num}")
+        # Refuse to turn an asymptotically slow solution's outputs into ground truth
+        verification = verify_solution_performance(bucket_name, question_id, local_script_path, solution_hash)
+        if verification:
+            record_availability(question_id, verification)
+        if verification and verification['status'] == 'failed':
+            # The judge reads the verdict from the manifest to explain why nothing can be run
+            update_manifest(
+                bucket_name, question_id,
+                lambda manifest: manifest.update(verification=verification_summary(verification))
+            )
+            return {
+                'statusCode': 422,
+                'body': f"Reference solution failed performance verification: {verification['reason']}"
+            }
 
-            # Step 2: Download the input file from S3
-            download_file_from_s3(bucket_name, input_s3_path, local_input_path)
+        harness = SolutionHarness(local_script_path)
 
-            # Read the input data from the local file
-            with open(local_input_path, 'r') as input_file:
-                input_data = input_file.read()
-                logger.info(f"Read input data for test case {test_case_num}")
+        # Step 2: Prefetch every input in parallel while the solution runs, and upload each
+        # output as soon as it is produced, so transfers overlap with execution. The harness
+        # worker is closed however this ends, including a failed fetch or upload
+        with closing(harness), ThreadPoolExecutor(max_workers=TRANSFER_WORKERS) as transfers:
+            inputs = [transfers.submit(read_s3_text, bucket_name, case['input']['key']) for case in stale_cases]
+            uploads = []
+            outputs = {}
 
-            # Step 3: Run the tester solution with input
-            try:
-                logger.info(f"Running tester solution for test case {test_case_num}")
-                output_data = run_tester_solution(local_script_path, input_data)
-                logger.info(f"Tester solution ran successfully for test case {test_case_num}")
-            except Exception as e:
-                logger.error(f"Error while running solution for test case {test_case_num}: {str(e)}")
-                return {
-                    'statusCode': 500,
-                    'body': f"Error running solution for test case {test_case_num}: {str(e)}"
+            for case, input_future in zip(stale_cases, inputs):
+                test_case_num = case_number(case['name'])
+                output_s3_path = f"{question_id}/output/{case['name']}.txt"
+
+                logger.info(f"Processing test case {test_case_num}")
+                input_data = input_future.result()
+
+                # Step 3: Run the tester solution with input
+                try:
+                    logger.info(f"Running tester solution for test case {test_case_num}")
+                    output_data = run_tester_solution(harness, input_data)
+                    logger.info(f"Tester solution ran successfully for test case {test_case_num}")
+                except Exception as e:
+                    logger.error(f"Error while running solution for test case {test_case_num}: {str(e)}")
+                    for future in inputs:
+                        future.cancel()
+                    return {
+                        'statusCode': 500,
+                        'body': f"Error running solution for test case {test_case_num}: {str(e)}"
+                    }
+
+                # Step 4: Upload the output straight from memory
+                encoded_output = output_data.encode('utf-8')
+                uploads.append(transfers.submit(write_s3_bytes, bucket_name, output_s3_path, encoded_output))
+
+                outputs[case['name']] = {
+                    'key': output_s3_path,
+                    'size': len(encoded_output),
+                    'sha256': hashlib.sha256(encoded_output).hexdigest(),
+                    'input_etag': case['input']['etag'],
+                    'content_key': output_content_key(solution_hash, case['input']['etag'])
                 }
 
-            # Step 4: Write the output data to a local file
-            with open(local_output_path, 'w') as output_file:
-                output_file.write(output_data)
-                logger.info(f"Wrote output data for test case {test_case_num}")
+            # Step 5: Make sure every output landed before the manifest points at it
+            for future in uploads:
+                future.result()
+
+        logger.info(f"Ran {len(stale_cases)} test cases with {harness.started} harness worker(s)")
 
-            # Step 5: Upload the output file to S3
-            upload_file_to_s3(bucket_name, output_s3_path, local_output_path)
-            logger.info(f"Uploaded output for test case {test_case_num} to {output_s3_path}")
+        # Step 6: Record the outputs in the manifest, bumping its version
+        save_outputs(bucket_name, question_id, outputs, verification)
 
         # All test cases processed successfully
         return {
             'statusCode': 200,
-            'body': f"All {total_test_cases} test cases executed successfully and outputs saved to S3."
+            'body': f"{len(stale_cases)} of {total_test_cases} test cases executed successfully and outputs saved to S3."
         }
     except KeyError as e:
         print(f"Error processing event: {e}")
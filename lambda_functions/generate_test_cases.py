@@ -1,8 +1,80 @@
 import boto3
+import json
+import hashlib
+import re
+import shutil
 import subprocess
 import os
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
 
 s3 = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+
+# Invoked once the manifest is written, when the question's tester_solution.py is already
+# there: its own S3 trigger may have fired before any inputs existed
+EXPECTED_OUTPUT_FUNCTION = os.getenv('EXPECTED_OUTPUT_FUNCTION', 'generate-expected-output')
+
+# The generated script's uploads are staged here and then written to S3 in one concurrent batch
+STAGING_DIR = '/tmp/staged_uploads'
+SHIM_DIR = '/tmp/staging_shim'
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '16'))
+
+# The manifest is also rewritten by the expected-output Lambda, so it is only ever written
+# conditionally on the version that was read; a write that lost the race is redone this often
+MANIFEST_WRITE_ATTEMPTS = 5
+
+# Installed as sitecustomize for the generated script: boto3 S3 clients it creates write to
+# STAGING_DIR/{bucket}/{key} instead of S3. Anything else is passed to a real client.
+STAGING_SITECUSTOMIZE = r"""
+import os
+if os.getenv('S3_STAGING_DIR'):
+    import hashlib
+    import boto3
+    _client = boto3.client
+
+    class StagingS3:
+        def __init__(self, args, kwargs):
+            self._args, self._kwargs, self._real = args, kwargs, None
+
+        def _stage(self, bucket, key, data):
+            path = os.path.join(os.environ['S3_STAGING_DIR'], bucket, *key.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        def put_object(self, Bucket, Key, Body=b'', **kwargs):
+            data = Body.encode('utf-8') if isinstance(Body, str) else Body if isinstance(Body, bytes) else Body.read()
+            self._stage(Bucket, Key, data)
+            # Shaped like a real response, since scripts often check the status code or ETag
+            return {
+                'ResponseMetadata': {'HTTPStatusCode': 200, 'HTTPHeaders': {}, 'RetryAttempts': 0},
+                'ETag': '"' + hashlib.md5(data).hexdigest() + '"'
+            }
+
+        def upload_file(self, Filename, Bucket, Key, *args, **kwargs):
+            with open(Filename, 'rb') as f:
+                self._stage(Bucket, Key, f.read())
+
+        def upload_fileobj(self, Fileobj, Bucket, Key, *args, **kwargs):
+            self._stage(Bucket, Key, Fileobj.read())
+
+        def __getattr__(self, name):
+            if self._real is None:
+                self._real = _client('s3', *self._args, **self._kwargs)
+            return getattr(self._real, name)
+
+    def client(service_name, *args, **kwargs):
+        if service_name == 's3':
+            return StagingS3(args, kwargs)
+        return _client(service_name, *args, **kwargs)
+
+    boto3.client = client
+"""
 
 def download_script_from_s3(bucket_name, script_path):
     local_file_path = '/tmp/generate_test_cases.py'  # Temporary storage in Lambda
@@ -19,6 +91,167 @@ def download_script_from_s3(bucket_name, script_path):
     return local_file_path
 
 
+def run_generator_staged(local_script):
+    """Run the generated script with its S3 uploads redirected to STAGING_DIR."""
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)  # /tmp survives between warm invocations
+    os.makedirs(SHIM_DIR, exist_ok=True)
+    with open(os.path.join(SHIM_DIR, 'sitecustomize.py'), 'w') as f:
+        f.write(STAGING_SITECUSTOMIZE)
+    python_path = os.pathsep.join(path for path in [SHIM_DIR, os.environ.get('PYTHONPATH')] if path)
+    env = dict(os.environ, S3_STAGING_DIR=STAGING_DIR, PYTHONPATH=python_path)
+    return subprocess.run(['python3', local_script], capture_output=True, text=True, check=True, env=env)
+
+
+def staged_files():
+    """(bucket, key, local path) for everything the generated script uploaded."""
+    files = []
+    for directory, _, file_names in os.walk(STAGING_DIR):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            bucket, key = os.path.relpath(path, STAGING_DIR).replace(os.sep, '/').split('/', 1)
+            files.append((bucket, key, path))
+    return files
+
+
+def upload_staged(bucket, key, path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    response = s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType='text/plain')
+    return {
+        'key': key,
+        'size': len(data),
+        'etag': response['ETag'].strip('"'),
+        'sha256': hashlib.sha256(data).hexdigest()
+    }
+
+
+def bulk_upload_staged(files):
+    """Upload every staged file concurrently and return the S3 metadata of each, in order."""
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        uploaded = list(executor.map(lambda file: upload_staged(*file), files))
+    print(f"Uploaded {len(uploaded)} staged files")
+    return uploaded
+
+
+def case_number(name):
+    """Numeric part of a test case name such as 'testcase12', used to keep cases in order."""
+    match = re.search(r'(\d+)$', name)
+    return int(match.group(1)) if match else 0
+
+
+def is_sample(name):
+    """sampleN.txt files hold the question's worked examples, in the same stdin format."""
+    return name.startswith('sample')
+
+
+def case_sort_key(name):
+    """Samples first, then test cases in numeric order."""
+    return (not is_sample(name), case_number(name))
+
+
+def list_inputs(bucket_name, question_id):
+    """S3 metadata of every input under {question_id}/input/, from one listing."""
+    inputs = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{question_id}/input/"):
+        for obj in page.get('Contents', []):
+            inputs[obj['Key']] = {'key': obj['Key'], 'size': obj['Size'], 'etag': obj['ETag'].strip('"')}
+    return inputs
+
+
+def read_manifest(bucket_name, question_id):
+    """The question's manifest and its ETag, or (None, None) when there is none yet."""
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=f"{question_id}/manifest.json")
+        return json.loads(response['Body'].read()), response['ETag']
+    except s3.exceptions.NoSuchKey:
+        return None, None
+
+
+def put_manifest_if_unchanged(bucket_name, question_id, manifest, etag):
+    """Write the manifest only if it is still at `etag` (or still absent); False if it changed."""
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=f"{question_id}/manifest.json",
+            Body=json.dumps(manifest),
+            ContentType='application/json',
+            **condition
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            return False
+        raise
+
+
+def write_manifest(bucket_name, question_id, inputs=None):
+    """
+    Record the generated inputs in {question_id}/manifest.json, so the judge and the
+    expected-output Lambda never have to probe fixed test case keys. `inputs` comes from
+    the bulk upload; without it the inputs are listed once. Output entries from a previous
+    run are kept only while their input is unchanged.
+    """
+    if inputs is None:
+        inputs = list_inputs(bucket_name, question_id)
+
+    for attempt in range(MANIFEST_WRITE_ATTEMPTS):
+        previous, etag = read_manifest(bucket_name, question_id)
+        manifest = build_manifest(question_id, inputs, previous)
+        if put_manifest_if_unchanged(bucket_name, question_id, manifest, etag):
+            print(f"Wrote manifest with {manifest['count']} test cases to {question_id}/manifest.json")
+            return manifest
+        print(f"Manifest of {question_id} changed while it was being rewritten, retrying")
+        time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+    raise RuntimeError(f"Could not write the manifest of {question_id} after {MANIFEST_WRITE_ATTEMPTS} attempts")
+
+
+def build_manifest(question_id, inputs, previous=None):
+    previous_outputs = {}
+    for case in (previous or {}).get('cases', []):
+        if case.get('output'):
+            previous_outputs[case['name']] = case['output']
+
+    cases = []
+    for key, entry in inputs.items():
+        file_name = key.rsplit('/', 1)[-1]
+        if not key.startswith(f"{question_id}/input/") or not file_name.endswith('.txt'):
+            continue
+        name = file_name[:-len('.txt')]
+        output = previous_outputs.get(name)
+        cases.append({
+            'name': name,
+            'sample': is_sample(name),
+            'input': entry,
+            'output': output if output and output.get('input_etag') == entry['etag'] else None
+        })
+    cases.sort(key=lambda case: case_sort_key(case['name']))
+
+    return {
+        'question_id': question_id,
+        'version': str(uuid.uuid4()),
+        'count': len(cases),
+        'cases': cases
+    }
+
+
+def trigger_expected_outputs(bucket_name, question_id):
+    """Invoke the expected-output Lambda asynchronously if the question has a tester solution."""
+    solution_key = f"{question_id}/tester_solution.py"
+    try:
+        s3.head_object(Bucket=bucket_name, Key=solution_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            print(f"No {solution_key} yet; its upload will generate the expected outputs")
+            return False
+        raise
+    event = {'Records': [{'s3': {'bucket': {'name': bucket_name}, 'object': {'key': solution_key}}}]}
+    lambda_client.invoke(FunctionName=EXPECTED_OUTPUT_FUNCTION, InvocationType='Event', Payload=json.dumps(event))
+    print(f"Invoked {EXPECTED_OUTPUT_FUNCTION} for {question_id}")
+    return True
+
+
 def lambda_handler(event, context):
     # Extracting the bucket name and object key (file path) from the S3 event
     try:
@@ -37,9 +270,9 @@ def lambda_handler(event, context):
         # Step 1: Download the Python script from S3
         local_script = download_script_from_s3(bucket_name, script_path)
 
-        # Step 2: Execute the downloaded Python script
+        # Step 2: Execute the downloaded Python script, staging its uploads locally
         try:
-            result = subprocess.run(['python3', local_script], capture_output=True, text=True, check=True)
+            result = run_generator_staged(local_script)
             print("Script executed successfully")
             print(result.stdout)
         except subprocess.CalledProcessError as e:
@@ -48,10 +281,22 @@ def lambda_handler(event, context):
                 'statusCode': 500,
                 'body': f"Error executing script: {e.stderr}"
             }
-        
+
+        # Step 3: Upload everything the script produced in one concurrent batch
+        files = staged_files()
+        uploaded = bulk_upload_staged(files)
+
+        # Step 4: Record the generated inputs in the test manifest. A script that bypassed
+        # boto3.client staged nothing, so its inputs are listed instead
+        inputs = {entry['key']: entry for (bucket, _, _), entry in zip(files, uploaded) if bucket == bucket_name}
+        manifest = write_manifest(bucket_name, question_id, inputs or None)
+
+        # Step 5: Generate expected outputs now that every input exists
+        trigger_expected_outputs(bucket_name, question_id)
+
         return {
             'statusCode': 200,
-            'body': "Test cases generated and uploaded to S3 successfully!"
+            'body': f"{manifest['count']} test cases generated and uploaded to S3 successfully!"
         }
 
     except KeyError as e:
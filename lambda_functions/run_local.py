@@ -0,0 +1,365 @@
+"""
+Run the test-case Lambda handlers on a dev box against a directory-backed S3 stand-in.
+
+    python lambda_functions/run_local.py --root .local-s3 seed QUESTION_ID path/to/files
+    python lambda_functions/run_local.py --root .local-s3 generate QUESTION_ID
+    python lambda_functions/run_local.py --root .local-s3 outputs QUESTION_ID --repeat 3
+    python lambda_functions/run_local.py --root .local-s3 pipeline QUESTION_ID
+
+Objects live at {root}/{bucket}/{key}. Each handler is called with a synthetic S3 event for
+the object that triggers it in AWS, and the time spent in each of its helper functions and
+in each S3 operation is reported afterwards.
+"""
+import argparse
+import functools
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+LAMBDA_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUCKET = 'leetcode-ai-problems'
+
+# Handler module -> the object whose upload triggers it
+HANDLERS = {
+    'generate': ('generate_test_cases.py', 'generate_test_cases.py'),
+    'outputs': ('generate-expected-output.py', 'tester_solution.py')
+}
+
+class Timings:
+    """Thread-safe call counts and cumulative seconds per label"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.seconds = {}
+        self.bytes = {}
+
+    def record(self, label, seconds, size=0):
+        with self._lock:
+            self.calls[label] = self.calls.get(label, 0) + 1
+            self.seconds[label] = self.seconds.get(label, 0.0) + seconds
+            self.bytes[label] = self.bytes.get(label, 0) + size
+
+    def report(self, wall):
+        lines = [f"{'step':<36}{'calls':>7}{'seconds':>10}{'% wall':>8}{'bytes':>12}"]
+        for label in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            share = 100 * self.seconds[label] / wall if wall else 0
+            lines.append(
+                f"{label:<36}{self.calls[label]:>7}{self.seconds[label]:>10.3f}{share:>8.1f}{self.bytes[label]:>12}"
+            )
+        lines.append(f"{'handler wall time':<36}{'':>7}{wall:>10.3f}")
+        lines.append("Helpers called from worker threads overlap, so their seconds can exceed wall time.")
+        return "\n".join(lines)
+
+
+class NoSuchKey(ClientError):
+    def __init__(self, key):
+        super().__init__({'Error': {'Code': 'NoSuchKey', 'Message': f"{key} does not exist"}}, 'GetObject')
+
+
+class PreconditionFailed(ClientError):
+    def __init__(self, key):
+        super().__init__({'Error': {'Code': 'PreconditionFailed', 'Message': f"{key} changed"}}, 'PutObject')
+
+
+class LocalS3:
+    """
+    The subset of the boto3 S3 client the handlers and generated scripts use, backed by
+    {root}/{bucket}/{key}. ETags are MD5 hex digests, as S3 reports for single-part uploads.
+    Conditional puts (IfMatch / IfNoneMatch) are honoured, atomically within this process.
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, root, timings=None):
+        self.root = root
+        self.timings = timings
+        self._write_lock = threading.Lock()
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split('/'))
+
+    def _timed(self, label, started, size=0):
+        if self.timings is not None:
+            self.timings.record(f"s3.{label}", time.perf_counter() - started, size)
+
+    def _write(self, bucket, key, data):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial object
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _read(self, bucket, key):
+        try:
+            with open(self._path(bucket, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise NoSuchKey(key)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        started = time.perf_counter()
+        data = self._read(Bucket, Key)
+        self._timed('get_object', started, len(data))
+        return {
+            'Body': io.BytesIO(data),
+            'ContentLength': len(data),
+            'ETag': f'"{hashlib.md5(data).hexdigest()}"'
+        }
+
+    def put_object(self, Bucket, Key, Body=b'', IfMatch=None, IfNoneMatch=None, **kwargs):
+        started = time.perf_counter()
+        data = Body.encode('utf-8') if isinstance(Body, str) else Body if isinstance(Body, bytes) else Body.read()
+        with self._write_lock:
+            if IfMatch is not None or IfNoneMatch is not None:
+                try:
+                    current = f'"{hashlib.md5(self._read(Bucket, Key)).hexdigest()}"'
+                except NoSuchKey:
+                    current = None
+                if (IfNoneMatch == '*' and current is not None) or (IfMatch is not None and IfMatch != current):
+                    raise PreconditionFailed(Key)
+            self._write(Bucket, Key, data)
+        self._timed('put_object', started, len(data))
+        return {'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        data = self._read(Bucket, Key)
+        return {'ContentLength': len(data), 'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        started = time.perf_counter()
+        try:
+            data = self._read(Bucket, Key)
+        except NoSuchKey:
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        with open(Filename, 'wb') as f:
+            f.write(data)
+        self._timed('download_file', started, len(data))
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        started = time.perf_counter()
+        with open(Filename, 'rb') as f:
+            data = f.read()
+        self._write(Bucket, Key, data)
+        self._timed('upload_file', started, len(data))
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+
+    def get_paginator(self, operation_name):
+        if operation_name != 'list_objects_v2':
+            raise NotImplementedError(operation_name)
+        return _ListObjectsPaginator(self)
+
+    def list_objects(self, bucket, prefix):
+        started = time.perf_counter()
+        bucket_root = os.path.join(self.root, bucket)
+        contents = []
+        for directory, _, files in os.walk(bucket_root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                key = os.path.relpath(path, bucket_root).replace(os.sep, '/')
+                if not key.startswith(prefix):
+                    continue
+                with open(path, 'rb') as f:
+                    data = f.read()
+                contents.append({'Key': key, 'Size': len(data), 'ETag': f'"{hashlib.md5(data).hexdigest()}"'})
+        contents.sort(key=lambda obj: obj['Key'])
+        self._timed('list_objects_v2', started)
+        return contents
+
+
+class _ListObjectsPaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix='', **kwargs):
+        contents = self.client.list_objects(Bucket, Prefix)
+        # S3 returns at most 1000 keys per page
+        for start in range(0, max(len(contents), 1), 1000):
+            yield {'Contents': contents[start:start + 1000], 'KeyCount': len(contents[start:start + 1000])}
+
+
+class LocalLambda:
+    """Records asynchronous invocations instead of making them; `pipeline` runs the next stage itself"""
+
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload=b'', **kwargs):
+        self.invocations.append((FunctionName, json.loads(Payload)))
+        return {'StatusCode': 202}
+
+
+class LocalDynamoDB:
+    """Records table updates instead of making them; the local store has no DynamoDB"""
+
+    def __init__(self):
+        self.updates = []
+
+    def Table(self, name):
+        return _LocalTable(self, name)
+
+
+class _LocalTable:
+    def __init__(self, resource, name):
+        self.resource = resource
+        self.name = name
+
+    def update_item(self, Key, **kwargs):
+        self.resource.updates.append((self.name, Key, kwargs))
+        return {}
+
+
+class _Unavailable:
+    """Stand-in for an AWS service the local run does not provide"""
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def __getattr__(self, name):
+        raise RuntimeError(f"{self.service_name} is not available when running the handlers locally")
+
+
+def load_handler_module(file_name, services=None):
+    """
+    Import a handler file by path; generate-expected-output.py is not an importable name.
+    The handlers create their boto3 clients at import time, which needs an AWS region and
+    credentials, so while the module loads boto3 hands out `services` (service name ->
+    stand-in) instead, and a stand-in that refuses every call for anything else.
+    """
+    services = services or {}
+
+    def stand_in(service_name, *args, **kwargs):
+        return services.get(service_name) or _Unavailable(service_name)
+
+    module_name = file_name[:-len('.py')].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(LAMBDA_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    client, resource = boto3.client, boto3.resource
+    boto3.client = boto3.resource = stand_in
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        boto3.client, boto3.resource = client, resource
+    return module
+
+
+def instrument(module, timings):
+    """Time every helper function the handler module defines"""
+    for name, value in list(vars(module).items()):
+        if callable(value) and getattr(value, '__module__', None) == module.__name__ and not isinstance(value, type) \
+                and name != 'lambda_handler':
+            setattr(module, name, _timed_function(value, name, timings))
+
+
+def _timed_function(function, label, timings):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.record(label, time.perf_counter() - started)
+    return wrapper
+
+
+def s3_event(bucket_name, key):
+    """Minimal ObjectCreated record with the fields the handlers read"""
+    return {
+        'Records': [{
+            'eventSource': 'aws:s3',
+            'eventName': 'ObjectCreated:Put',
+            's3': {
+                'bucket': {'name': bucket_name},
+                'object': {'key': key}
+            }
+        }]
+    }
+
+
+def run_handler(stage, root, bucket_name, question_id):
+    file_name, trigger = HANDLERS[stage]
+    timings = Timings()
+    lambda_client = LocalLambda()
+    dynamodb = LocalDynamoDB()
+    module = load_handler_module(file_name, {'s3': LocalS3(root, timings), 'lambda': lambda_client, 'dynamodb': dynamodb})
+    instrument(module, timings)
+
+    started = time.perf_counter()
+    response = module.lambda_handler(s3_event(bucket_name, f"{question_id}/{trigger}"), None)
+    wall = time.perf_counter() - started
+    for function_name, _ in lambda_client.invocations:
+        print(f"Handler invoked {function_name} (not run; use the outputs or pipeline command)")
+    for table_name, key, update in dynamodb.updates:
+        print(f"Handler updated {table_name} {key}: {update['ExpressionAttributeValues']}")
+    return response, wall, timings
+
+
+def seed(root, bucket_name, question_id, source_dir):
+    """Copy a directory of question files (tester_solution.py, input/, ...) into the local bucket"""
+    destination = os.path.join(root, bucket_name, question_id)
+    shutil.copytree(source_dir, destination, dirs_exist_ok=True)
+    print(f"Seeded {source_dir} into {destination}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the test-case Lambda handlers against a local S3 directory")
+    parser.add_argument('--root', default='.local-s3', help="Directory holding {bucket}/{key} objects")
+    parser.add_argument('--bucket', default=DEFAULT_BUCKET)
+    parser.add_argument('--verbose', action='store_true', help="Show the handlers' INFO logs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help="Copy local question files into the store")
+    seed_parser.add_argument('question_id')
+    seed_parser.add_argument('source_dir')
+
+    for command in ('generate', 'outputs', 'pipeline'):
+        command_parser = subparsers.add_parser(command)
+        command_parser.add_argument('question_id')
+        command_parser.add_argument('--repeat', type=int, default=1, help="Run each stage this many times")
+
+    args = parser.parse_args(argv)
+    # The handlers set the root logger to INFO themselves, so filter on the handler instead
+    log_handler = logging.StreamHandler()
+    log_handler.setLevel(logging.INFO if args.verbose else logging.WARNING)
+    logging.getLogger().addHandler(log_handler)
+    if args.command == 'seed':
+        seed(args.root, args.bucket, args.question_id, args.source_dir)
+        return 0
+
+    stages = ['generate', 'outputs'] if args.command == 'pipeline' else [args.command]
+    failed = False
+    for stage in stages:
+        walls = []
+        for attempt in range(1, args.repeat + 1):
+            response, wall, timings = run_handler(stage, args.root, args.bucket, args.question_id)
+            walls.append(wall)
+            print(f"\n== {stage} run {attempt}: {json.dumps(response)}")
+            print(timings.report(wall))
+            failed = failed or response.get('statusCode') not in (200, 202)
+        if args.repeat > 1:
+            print(f"\n{stage}: min {min(walls):.3f}s, median {statistics.median(walls):.3f}s over {len(walls)} runs")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
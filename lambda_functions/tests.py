@@ -0,0 +1,392 @@
+"""
+Tests for the test-case Lambda handlers, run offline against run_local's stand-ins:
+
+    python -m unittest discover -s lambda_functions -p tests.py
+
+The directory is not a package, so these are not collected by `manage.py test`.
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import run_local  # noqa: E402
+
+BUCKET = run_local.DEFAULT_BUCKET
+
+SUM_SOLUTION = "print(sum(map(int, input().split())))\n"
+
+
+class LocalStoreTestCase(unittest.TestCase):
+    """A fresh directory-backed bucket per test, with helpers to seed question files"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.s3 = run_local.LocalS3(self.root)
+
+    def put(self, key, body):
+        self.s3.put_object(Bucket=BUCKET, Key=key, Body=body)
+
+    def get(self, key):
+        return self.s3.get_object(Bucket=BUCKET, Key=key)['Body'].read().decode('utf-8')
+
+    def manifest(self, question_id):
+        return json.loads(self.get(f"{question_id}/manifest.json"))
+
+    def seed_inputs(self, question_id, inputs):
+        """Upload inputs and write the manifest the way generate_test_cases does"""
+        for name, data in inputs.items():
+            self.put(f"{question_id}/input/{name}.txt", data)
+        generator = run_local.load_handler_module('generate_test_cases.py', {'s3': self.s3})
+        return generator.write_manifest(BUCKET, question_id)
+
+    def run_outputs(self, question_id):
+        response, _, _ = run_local.run_handler('outputs', self.root, BUCKET, question_id)
+        return response
+
+
+class SolutionHarnessTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.module = run_local.load_handler_module('generate-expected-output.py')
+
+    def harness(self, source, **kwargs):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'tester_solution.py')
+        with open(path, 'w') as f:
+            f.write(textwrap.dedent(source))
+        harness = self.module.SolutionHarness(path, **kwargs)
+        self.addCleanup(harness.close)
+        return harness
+
+    def test_one_worker_serves_every_case(self):
+        harness = self.harness(SUM_SOLUTION)
+        self.assertEqual([harness.run(data) for data in ('1 2', '3 4', '5')], ['3\n', '7\n', '5\n'])
+        self.assertEqual(harness.started, 1)
+
+    def test_state_does_not_leak_between_cases(self):
+        harness = self.harness("""
+            import builtins, sys, types
+            print(getattr(builtins, 'seen', 0), getattr(sys, 'seen', 0), 'leaked' in sys.modules,
+                  sys.getrecursionlimit() == 50000)
+            builtins.seen = sys.seen = 1
+            sys.modules['leaked'] = types.ModuleType('leaked')
+            sys.setrecursionlimit(50000)
+        """)
+        self.assertEqual(harness.run(''), '0 0 False False\n')
+        self.assertEqual(harness.run(''), '0 0 False False\n')
+
+    def test_raw_stdin_reads_see_the_case_input(self):
+        harness = self.harness("""
+            import os
+            head = os.read(0, 6).decode()
+            rest = open(0).read()
+            print(head.strip(), rest.strip())
+        """)
+        # open(0) closes fd 0 when it is collected; the next case still gets its own
+        self.assertEqual(harness.run('first case'), 'first case\n')
+        self.assertEqual(harness.run('second case'), 'second case\n')
+
+    def test_solution_output_cannot_corrupt_the_protocol(self):
+        harness = self.harness("""
+            import os, sys
+            os.write(1, b'\\x00\\x00\\x00\\x05junk')
+            sys.stdout.write('ok\\n')
+            print('noise', file=sys.stderr)
+        """)
+        self.assertEqual(harness.run(''), '\x00\x00\x00\x05junkok\n')
+
+    def test_failures_are_reported_and_the_worker_survives(self):
+        harness = self.harness("""
+            import os, signal, sys
+            command = input()
+            if command == 'raise':
+                raise ValueError('bad input')
+            if command == 'exit':
+                sys.exit(3)
+            if command == 'kill':
+                os.kill(os.getpid(), signal.SIGKILL)
+            print('fine')
+        """)
+        with self.assertRaisesRegex(self.module.HarnessError, 'ValueError: bad input'):
+            harness.run('raise')
+        with self.assertRaisesRegex(self.module.HarnessError, 'exited with status 3'):
+            harness.run('exit')
+        with self.assertRaisesRegex(self.module.HarnessError, 'killed by signal 9'):
+            harness.run('kill')
+        self.assertEqual(harness.run('ok'), 'fine\n')
+        self.assertEqual(harness.started, 1)
+
+    def test_timed_out_case_is_killed_and_the_worker_replaced(self):
+        harness = self.harness("""
+            if input() == 'spin':
+                while True:
+                    pass
+            print('done')
+        """, timeout=0.5)
+        with self.assertRaisesRegex(self.module.HarnessError, 'timed out'):
+            harness.run('spin')
+        self.assertEqual(harness.run('go'), 'done\n')
+        self.assertEqual(harness.started, 2)
+
+
+class ExpectedOutputHandlerTests(LocalStoreTestCase):
+    def test_outputs_are_generated_for_every_case(self):
+        self.put('Q1/tester_solution.py', SUM_SOLUTION)
+        self.seed_inputs('Q1', {'sample1': '1 1', 'testcase1': '1 2 3', 'testcase2': '10 20'})
+        response = self.run_outputs('Q1')
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(self.get('Q1/output/testcase1.txt'), '6')
+        self.assertEqual(self.get('Q1/output/testcase2.txt'), '30')
+        cases = self.manifest('Q1')['cases']
+        self.assertEqual([case['name'] for case in cases], ['sample1', 'testcase1', 'testcase2'])
+        self.assertTrue(all(case['output'] for case in cases))
+
+    def test_failing_solution_reports_the_case(self):
+        self.put('Q1/tester_solution.py', "raise SystemExit(input() == '2' and 4)\n")
+        self.seed_inputs('Q1', {'testcase1': '1', 'testcase2': '2'})
+        response = self.run_outputs('Q1')
+        self.assertEqual(response['statusCode'], 500)
+        self.assertIn('test case 2', response['body'])
+        self.assertIn('exited with status 4', response['body'])
+
+    def test_missing_manifest_defers_to_generate_test_cases(self):
+        self.put('Q1/tester_solution.py', SUM_SOLUTION)
+        self.assertEqual(self.run_outputs('Q1')['statusCode'], 202)
+
+
+class OverlappedTransferTests(LocalStoreTestCase):
+    def test_each_input_is_fetched_and_each_output_uploaded_once(self):
+        self.put('Q1/tester_solution.py', SUM_SOLUTION)
+        self.seed_inputs('Q1', {f"testcase{n}": f"{n} {n}" for n in range(1, 13)})
+        response, _, timings = run_local.run_handler('outputs', self.root, BUCKET, 'Q1')
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(timings.calls['read_s3_text'], 12)
+        self.assertEqual(timings.calls['write_s3_bytes'], 12)
+        self.assertEqual(self.get('Q1/output/testcase12.txt'), '24')
+
+    def test_manifest_is_not_updated_when_an_upload_fails(self):
+        self.put('Q1/tester_solution.py', SUM_SOLUTION)
+        self.seed_inputs('Q1', {'testcase1': '1', 'testcase2': '2'})
+        put_object = run_local.LocalS3.put_object
+
+        def failing_put(store, Bucket, Key, **kwargs):
+            if Key == 'Q1/output/testcase2.txt':
+                raise OSError('upload failed')
+            return put_object(store, Bucket, Key, **kwargs)
+
+        with mock.patch.object(run_local.LocalS3, 'put_object', failing_put):
+            with self.assertRaisesRegex(OSError, 'upload failed'):
+                self.run_outputs('Q1')
+        self.assertTrue(all(case['output'] is None for case in self.manifest('Q1')['cases']))
+
+
+class IncrementalOutputTests(LocalStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.put('Q1/tester_solution.py', SUM_SOLUTION)
+        self.seed_inputs('Q1', {'testcase1': '1 2', 'testcase2': '3 4'})
+        self.assertEqual(self.run_outputs('Q1')['statusCode'], 200)
+
+    def runs(self):
+        response, _, timings = run_local.run_handler('outputs', self.root, BUCKET, 'Q1')
+        self.assertEqual(response['statusCode'], 200)
+        return timings.calls.get('run_tester_solution', 0)
+
+    def test_redelivery_runs_nothing(self):
+        self.assertEqual(self.runs(), 0)
+
+    def test_only_changed_inputs_are_rerun(self):
+        self.seed_inputs('Q1', {'testcase2': '30 40'})
+        self.assertEqual(self.runs(), 1)
+        self.assertEqual(self.get('Q1/output/testcase2.txt'), '70')
+        self.assertEqual(self.runs(), 0)
+
+    def test_new_solution_reruns_every_case(self):
+        self.put('Q1/tester_solution.py', "print(max(map(int, input().split())))\n")
+        self.assertEqual(self.runs(), 2)
+        self.assertEqual(self.get('Q1/output/testcase1.txt'), '2')
+
+
+# Sizes are only passed as numbers, so verification can reach n = 10^8 and a linear target
+SCALING_INPUT = """
+n = input().strip()
+print(10 ** 8 if n == 'max' else n)
+"""
+
+
+def sleeping_solution(exponent, seconds_at_max):
+    return f"""
+import time
+line = input().strip()
+n = int(line) if line.isdigit() else 1
+time.sleep({seconds_at_max} * (n / 10 ** 8) ** {exponent})
+print(n)
+"""
+
+
+class PerformanceVerificationTests(LocalStoreTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.module = run_local.load_handler_module('generate-expected-output.py')
+
+    def test_harness_times_only_the_solution(self):
+        path = os.path.join(self.root, 'tester_solution.py')
+        with open(path, 'w') as f:
+            f.write("import time\nline = input()\ntime.sleep(float(line))\n")
+        harness = self.module.SolutionHarness(path)
+        self.addCleanup(harness.close)
+        _, seconds = harness.run_timed('0.05')
+        self.assertGreaterEqual(seconds, 0.05)
+        self.assertLess(seconds, 0.09)
+        # A fork and a JSON round trip cost more than this; the measurement must not include them
+        _, seconds = harness.run_timed('0')
+        self.assertLess(seconds, 0.005)
+
+    def test_fit_exponent(self):
+        linear = [(n, n * 1e-6) for n in (10 ** 4, 10 ** 5, 10 ** 6)]
+        quadratic = [(n, n * n * 1e-12) for n in (10 ** 4, 10 ** 5, 10 ** 6)]
+        self.assertAlmostEqual(self.module.fit_exponent(linear), 1)
+        self.assertAlmostEqual(self.module.fit_exponent(quadratic), 2)
+        # Runs under the noise floor carry no signal
+        self.assertIsNone(self.module.fit_exponent([(10, 0.001), (100, 0.002), (1000, 0.02)]))
+
+    def verify(self, solution):
+        self.put('Q1/tester_solution.py', solution)
+        self.put('Q1/scaling_input.py', SCALING_INPUT)
+        self.seed_inputs('Q1', {'testcase1': '5'})
+        response = self.run_outputs('Q1')
+        return response, json.loads(self.get('Q1/verification.json'))
+
+    def test_linear_solution_passes(self):
+        response, verification = self.verify(sleeping_solution(1, 0.2))
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(verification['status'], 'passed')
+        self.assertEqual(verification['target_exponent'], 1)
+        self.assertAlmostEqual(verification['exponent'], 1, delta=0.3)
+        self.assertEqual(self.manifest('Q1')['verification']['status'], 'passed')
+
+    def test_quadratic_solution_is_refused(self):
+        response, verification = self.verify(sleeping_solution(2, 0.4))
+        self.assertEqual(response['statusCode'], 422)
+        self.assertEqual(verification['status'], 'failed')
+        self.assertAlmostEqual(verification['exponent'], 2, delta=0.3)
+        manifest = self.manifest('Q1')
+        self.assertEqual(manifest['verification']['status'], 'failed')
+        self.assertIsNone(manifest['cases'][0]['output'])
+
+
+GENERATOR_SCRIPT = f"""
+import boto3
+s3 = boto3.client('s3')
+for i in range(1, 4):
+    s3.put_object(Bucket='{BUCKET}', Key=f'Q1/input/testcase{{i}}.txt', Body=' '.join([str(i)] * i))
+"""
+
+# No region or credentials anywhere boto3 would look
+NO_AWS_ENVIRONMENT = {
+    'AWS_CONFIG_FILE': '/nonexistent/config',
+    'AWS_SHARED_CREDENTIALS_FILE': '/nonexistent/credentials',
+    'AWS_EC2_METADATA_DISABLED': 'true'
+}
+
+
+class RunLocalTests(LocalStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        environment = {name: value for name, value in os.environ.items() if not name.startswith('AWS_')}
+        patcher = mock.patch.dict(os.environ, {**environment, **NO_AWS_ENVIRONMENT}, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_handlers_load_without_aws_configuration(self):
+        outputs = run_local.load_handler_module('generate-expected-output.py', {'s3': self.s3})
+        self.assertIs(outputs.s3, self.s3)
+        generator = run_local.load_handler_module('generate_test_cases.py')
+        with self.assertRaisesRegex(RuntimeError, 'lambda is not available'):
+            generator.lambda_client.invoke(FunctionName='generate-expected-output')
+
+    def test_seed_and_pipeline_commands(self):
+        source = os.path.join(self.root, 'source')
+        os.makedirs(source)
+        for name, body in (('generate_test_cases.py', GENERATOR_SCRIPT), ('tester_solution.py', SUM_SOLUTION)):
+            with open(os.path.join(source, name), 'w') as f:
+                f.write(body)
+        store = os.path.join(self.root, 'store')
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            self.assertEqual(run_local.main(['--root', store, 'seed', 'Q1', source]), 0)
+            self.assertEqual(run_local.main(['--root', store, 'pipeline', 'Q1']), 0)
+        self.assertIn('handler wall time', printed.getvalue())
+        self.s3.root = store
+        self.assertEqual([case['name'] for case in self.manifest('Q1')['cases']], ['testcase1', 'testcase2', 'testcase3'])
+        self.assertEqual(self.get('Q1/output/testcase3.txt'), '9')
+
+    def test_conditional_puts(self):
+        etag = self.s3.put_object(Bucket=BUCKET, Key='Q1/manifest.json', Body='{}', IfNoneMatch='*')['ETag']
+        with self.assertRaises(run_local.PreconditionFailed):
+            self.s3.put_object(Bucket=BUCKET, Key='Q1/manifest.json', Body='[]', IfNoneMatch='*')
+        with self.assertRaises(run_local.PreconditionFailed):
+            self.s3.put_object(Bucket=BUCKET, Key='Q1/manifest.json', Body='[]', IfMatch='"stale"')
+        self.s3.put_object(Bucket=BUCKET, Key='Q1/manifest.json', Body='[]', IfMatch=etag)
+        self.assertEqual(self.get('Q1/manifest.json'), '[]')
+        with self.assertRaises(self.s3.exceptions.NoSuchKey):
+            self.s3.get_object(Bucket=BUCKET, Key='Q1/missing.txt')
+
+
+class GenerateTestCasesHandlerTests(LocalStoreTestCase):
+    def run_generate(self, script):
+        self.put('Q1/generate_test_cases.py', script)
+        lambda_client = run_local.LocalLambda()
+        module = run_local.load_handler_module('generate_test_cases.py', {'s3': self.s3, 'lambda': lambda_client})
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = module.lambda_handler(run_local.s3_event(BUCKET, 'Q1/generate_test_cases.py'), None)
+        return response, lambda_client.invocations
+
+    def test_staged_uploads_land_with_their_etags_in_the_manifest(self):
+        response, invocations = self.run_generate(GENERATOR_SCRIPT + textwrap.dedent(f"""
+            import hashlib
+            response = s3.put_object(Bucket='{BUCKET}', Key='Q1/input/sample1.txt', Body=b'7')
+            assert response['ResponseMetadata']['HTTPStatusCode'] == 200
+            assert response['ETag'] == '"' + hashlib.md5(b'7').hexdigest() + '"'
+            with open('/tmp/q1_case4.txt', 'w') as f:
+                f.write('4 4 4 4')
+            s3.upload_file('/tmp/q1_case4.txt', '{BUCKET}', 'Q1/input/testcase4.txt')
+        """))
+        self.assertEqual(response['statusCode'], 200)
+        cases = self.manifest('Q1')['cases']
+        self.assertEqual([case['name'] for case in cases], ['sample1', 'testcase1', 'testcase2', 'testcase3', 'testcase4'])
+        listed = self.s3.head_object(Bucket=BUCKET, Key='Q1/input/testcase4.txt')['ETag'].strip('"')
+        self.assertEqual(cases[-1]['input']['etag'], listed)
+        self.assertTrue(cases[0]['sample'])
+        # No tester solution yet, so its own upload will generate the outputs
+        self.assertEqual(invocations, [])
+
+    def test_expected_outputs_are_triggered_when_the_solution_exists(self):
+        self.put('Q1/tester_solution.py', SUM_SOLUTION)
+        _, invocations = self.run_generate(GENERATOR_SCRIPT)
+        self.assertEqual(len(invocations), 1)
+        function_name, event = invocations[0]
+        self.assertEqual(function_name, 'generate-expected-output')
+        self.assertEqual(event['Records'][0]['s3']['object']['key'], 'Q1/tester_solution.py')
+
+    def test_failing_script_writes_nothing(self):
+        response, _ = self.run_generate(GENERATOR_SCRIPT + "raise SystemExit('no more inputs')\n")
+        self.assertEqual(response['statusCode'], 500)
+        self.assertIn('no more inputs', response['body'])
+        with self.assertRaises(self.s3.exceptions.NoSuchKey):
+            self.manifest('Q1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache bounded by entry count and/or total size,
+    with an optional time-to-live per entry. `on_evict(key, value)` is called,
+    outside the lock, for every entry pushed out by the size bounds.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, sizeof=sys.getsizeof, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at is not None and time.monotonic() > expires_at:
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None, ttl=None):
+        size = self.sizeof(value) if size is None else size
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never cache an entry that would evict everything else
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            evicted = self._evict()
+        if self.on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        value, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        return value
+
+    def _evict(self):
+        evicted = []
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            key = next(iter(self._entries))
+            evicted.append((key, self._remove(key)))
+            self.evictions += 1
+        return evicted
+
+
+# The shared tier is a best-effort Django cache (Redis in settings); when it is
+# unreachable we log and carry on as if it were a miss.
+
+def get_shared(key, default=None, alias='default'):
+    try:
+        return caches[alias].get(key, default)
+    except Exception as e:
+        logger.error(f"Error reading {key} from shared cache: {str(e)}")
+        return default
+
+
+def set_shared(key, value, timeout=None, alias='default'):
+    try:
+        caches[alias].set(key, value, timeout)
+        return True
+    except Exception as e:
+        logger.error(f"Error writing {key} to shared cache: {str(e)}")
+        return False
+
+
+def delete_shared(key, alias='default'):
+    try:
+        caches[alias].delete(key)
+        return True
+    except Exception as e:
+        logger.error(f"Error deleting {key} from shared cache: {str(e)}")
+        return False
+
+
+def get_many_shared(keys, alias='default'):
+    try:
+        return caches[alias].get_many(keys)
+    except Exception as e:
+        logger.error(f"Error reading {len(keys)} keys from shared cache: {str(e)}")
+        return {}
+
+
+def incr_shared(key, delta=1, timeout=None, alias='default'):
+    """Atomically add `delta` to a counter, creating it first if needed"""
+    try:
+        cache = caches[alias]
+        cache.add(key, 0, timeout)
+        return cache.incr(key, delta)
+    except Exception as e:
+        logger.error(f"Error incrementing {key} in shared cache: {str(e)}")
+        return None
@@ -0,0 +1,316 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from .caching import get_many_shared, get_shared, incr_shared, set_shared
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: throttling and transient gateway errors
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Methods safe to resend after the upstream may already have acted on them. Anything else
+# (the Judge0 batch submit) is only retried when it provably never ran: a 429, or a failure
+# to connect. A read timeout or gateway error may mean the submissions were created anyway.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+UNSENT_RETRY_STATUSES = (429,)
+
+# Queue waits longer than this (seconds) are logged as a sign the upstream budget is too small
+SLOW_WAIT_THRESHOLD = float(os.getenv('HTTP_SLOW_WAIT_THRESHOLD', '2'))
+
+# How many recent queue waits each upstream keeps for its p50/p95
+WAIT_SAMPLE_SIZE = 1024
+
+# Each process publishes its clients' stats to the shared cache at most this often (seconds),
+# one slot per process taken from an atomic counter, so reports run elsewhere can sum them.
+# A process that has sent nothing for STATS_TTL drops out of the report.
+STATS_PUBLISH_INTERVAL = float(os.getenv('HTTP_STATS_PUBLISH_INTERVAL', '30'))
+STATS_TTL = int(os.getenv('HTTP_STATS_TTL', str(24 * 60 * 60)))
+STATS_SLOT_LIMIT = 500
+STATS_COUNT_KEY = 'upstream-stats:count'
+
+# Counters that add up across processes; queue waits are only comparable per process
+SUMMED_STATS = ('requests', 'retries', 'throttled', 'failures', 'admitted')
+
+# Per-upstream budgets. `rate` is sustained requests per second, `burst` how many may go out
+# back to back, `max_concurrency` how many may be in flight (and the keep-alive pool size).
+UPSTREAMS = {
+    'judge0': {
+        'rate': float(os.getenv('JUDGE0_RATE_LIMIT', '5')),
+        'burst': int(os.getenv('JUDGE0_BURST', '10')),
+        'max_concurrency': int(os.getenv('JUDGE0_MAX_CONCURRENCY', '8')),
+        'max_retries': int(os.getenv('JUDGE0_MAX_RETRIES', '4')),
+        'timeout': float(os.getenv('JUDGE0_HTTP_TIMEOUT', '15'))
+    },
+    'openai': {
+        'rate': float(os.getenv('OPENAI_RATE_LIMIT', '2')),
+        'burst': int(os.getenv('OPENAI_BURST', '5')),
+        'max_concurrency': int(os.getenv('OPENAI_MAX_CONCURRENCY', '4')),
+        'max_retries': int(os.getenv('OPENAI_MAX_RETRIES', '3')),
+        'timeout': float(os.getenv('OPENAI_HTTP_TIMEOUT', '60'))
+    }
+}
+
+
+class UpstreamLimiter:
+    """
+    Token bucket plus concurrency cap for one upstream. Callers are admitted strictly in
+    arrival order, so a burst of requests is queued fairly instead of racing for tokens.
+    """
+
+    def __init__(self, rate, burst, max_concurrency):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._in_flight = 0
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self.admitted = 0
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until it is this caller's turn and both a token and a slot are free; return the wait"""
+        ticket = object()
+        started = time.monotonic()
+        with self._condition:
+            self._queue.append(ticket)
+            while True:
+                self._refill()
+                if self._queue[0] is ticket and self._in_flight < self.max_concurrency and self._tokens >= 1:
+                    break
+                # Wake up when the next token is due; releases and departures notify earlier
+                timeout = (1 - self._tokens) / self.rate if self._tokens < 1 else None
+                self._condition.wait(timeout)
+            self._queue.popleft()
+            self._tokens -= 1
+            self._in_flight += 1
+            waited = time.monotonic() - started
+            self._waits.append(waited)
+            self.admitted += 1
+            self.max_wait = max(self.max_wait, waited)
+            self._condition.notify_all()
+        return waited
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        waited = self.acquire()
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._condition:
+            waits = sorted(self._waits)
+            queued = len(self._queue)
+            in_flight = self._in_flight
+        return {
+            'admitted': self.admitted,
+            'queued': queued,
+            'in_flight': in_flight,
+            'wait_p50': waits[len(waits) // 2] if waits else None,
+            'wait_p95': waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+            'wait_max': self.max_wait
+        }
+
+
+class UpstreamClient:
+    """
+    Keep-alive `requests` session for one upstream, governed by an UpstreamLimiter and
+    retrying throttled or failed requests with full-jitter exponential backoff. Requests that
+    are not idempotent are only retried when they never reached the upstream.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrency, max_retries=3, timeout=30,
+                 backoff_base=0.5, backoff_max=10):
+        self.name = name
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = UpstreamLimiter(rate, burst, max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+    def _backoff(self, attempt, response=None):
+        """Honour Retry-After when the upstream sends one, otherwise back off with full jitter"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _never_sent(error):
+        """True when the request failed before reaching the upstream"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        cause = error.args[0] if error.args else None
+        return isinstance(cause, MaxRetryError) and isinstance(cause.reason, NewConnectionError)
+
+    def _retryable(self, method, response, error):
+        if method.upper() in IDEMPOTENT_METHODS:
+            return error is not None or response.status_code in RETRY_STATUSES
+        if error is not None:
+            return self._never_sent(error)
+        return response.status_code in UNSENT_RETRY_STATUSES
+
+    @staticmethod
+    def _rewind(kwargs):
+        # Uploaded file objects have been read by the failed attempt
+        for value in (kwargs.get('files') or {}).values():
+            fileobj = value[1] if isinstance(value, tuple) else value
+            if hasattr(fileobj, 'seek'):
+                fileobj.seek(0)
+
+    def request(self, method, url, **kwargs):
+        try:
+            return self._request(method, url, **kwargs)
+        finally:
+            publish_client_stats()
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            response = None
+            error = None
+            with self.limiter.slot() as waited:
+                if waited > SLOW_WAIT_THRESHOLD:
+                    logger.warning(f"{self.name} request waited {waited:.2f}s for its turn")
+                self.requests += 1
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+
+            if response is not None and response.status_code == 429:
+                self.throttled += 1
+            if error is None and response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt >= self.max_retries or not self._retryable(method, response, error):
+                self.failures += 1
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self._backoff(attempt, response)
+            reason = str(error) if error is not None else f"status {response.status_code}"
+            logger.info(f"Retrying {self.name} {method} in {delay:.2f}s after {reason}")
+            self.retries += 1
+            attempt += 1
+            time.sleep(delay)
+            self._rewind(kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'failures': self.failures,
+            **self.limiter.stats()
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Return the process-wide client for a configured upstream, creating it on first use"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = UpstreamClient(name, **UPSTREAMS[name])
+        return _clients[name]
+
+
+def client_stats():
+    """Stats of the clients this process has created"""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.stats() for name, client in clients.items()}
+
+
+def _stats_slot_key(slot):
+    return f"upstream-stats:{slot}"
+
+
+_published = {'pid': None, 'slot': None, 'at': 0.0}
+_published_lock = threading.Lock()
+
+
+def publish_client_stats(force=False):
+    """Write this process's client stats to its shared slot, at most every STATS_PUBLISH_INTERVAL"""
+    now = time.monotonic()
+    with _published_lock:
+        pid = os.getpid()
+        if not force and _published['pid'] == pid and now - _published['at'] < STATS_PUBLISH_INTERVAL:
+            return False
+        _published['at'] = now
+        if _published['pid'] != pid:
+            # First publish, or a forked worker that inherited its parent's slot
+            slot = incr_shared(STATS_COUNT_KEY)
+            if slot is None:
+                return False
+            _published.update(pid=pid, slot=slot)
+        slot = _published['slot']
+    snapshot = {'host': socket.gethostname(), 'pid': pid, 'published_at': time.time(), 'clients': client_stats()}
+    return set_shared(_stats_slot_key(slot), snapshot, STATS_TTL)
+
+
+def shared_client_stats():
+    """
+    Stats last published by every live process, per upstream: counters are summed, while
+    queue waits keep the worst process's p95 and max.
+    """
+    count = get_shared(STATS_COUNT_KEY) or 0
+    slot_keys = [_stats_slot_key(slot) for slot in range(max(1, count - STATS_SLOT_LIMIT + 1), count + 1)]
+    snapshots = get_many_shared(slot_keys).values() if slot_keys else []
+    totals = {}
+    for snapshot in snapshots:
+        for name, stats in snapshot['clients'].items():
+            total = totals.setdefault(name, {'processes': 0, 'wait_p95': None, 'wait_max': 0.0,
+                                             **{field: 0 for field in SUMMED_STATS}})
+            total['processes'] += 1
+            for field in SUMMED_STATS:
+                total[field] += stats[field]
+            if stats['wait_p95'] is not None:
+                total['wait_p95'] = max(total['wait_p95'] or 0.0, stats['wait_p95'])
+            total['wait_max'] = max(total['wait_max'], stats['wait_max'])
+    return totals
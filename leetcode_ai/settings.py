@@ -26,6 +26,19 @@ CELERY_BROKER_URL = 'redis://localhost:6379/0'  # Update with your Redis URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+# Report STARTED while a task runs, so a resumed import can tell running jobs from lost ones
+CELERY_TASK_TRACK_STARTED = True
+
+# Shared cache tier (test-case suites, verdicts, ...) on the same Redis as Celery
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/1'),
+    }
+}
+
+# Judge backend used by problems.views.run_code: 'judge0' (hosted RapidAPI) or 'local' (subprocess sandboxes)
+JUDGE_BACKEND = os.getenv('JUDGE_BACKEND', 'judge0')
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
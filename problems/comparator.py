@@ -0,0 +1,154 @@
+import io
+import math
+import os
+import re
+
+# 'lines': tokens must match and sit on the same lines; trailing whitespace and trailing
+#          blank lines are ignored.
+# 'tokens': whitespace-insensitive, only the sequence of tokens matters.
+MODE_LINES = 'lines'
+MODE_TOKENS = 'tokens'
+COMPARE_MODES = (MODE_LINES, MODE_TOKENS)
+
+COMPARE_MODE = os.getenv('JUDGE_COMPARE_MODE', MODE_LINES)
+# When set, numeric tokens match if they are within this absolute or relative tolerance
+FLOAT_TOLERANCE = float(os.getenv('JUDGE_FLOAT_TOLERANCE')) if os.getenv('JUDGE_FLOAT_TOLERANCE') else None
+
+# Characters of input/expected/actual echoed back per test case
+PREVIEW_LIMIT = int(os.getenv('JUDGE_PREVIEW_LIMIT', '512'))
+# Longest token echoed back when describing the first difference
+DIFF_TOKEN_LIMIT = 40
+
+CHUNK_SIZE = 64 * 1024
+
+TOKEN_PATTERN = re.compile(r'\S+|\n')
+TRAILING_TOKEN_PATTERN = re.compile(r'\S+$')
+
+# Sentinel token marking a line break in 'lines' mode
+NEWLINE = object()
+
+
+class CompareResult:
+    """Outcome of a comparison; on a mismatch, where it happened and what was found there"""
+
+    def __init__(self, passed, token_index=None, line=None, expected_token=None, actual_token=None, reason=None):
+        self.passed = passed
+        self.token_index = token_index
+        self.line = line
+        self.expected_token = expected_token
+        self.actual_token = actual_token
+        self.reason = reason
+
+    def to_dict(self):
+        if self.passed:
+            return None
+        return {
+            'reason': self.reason,
+            'line': self.line,
+            'token': self.token_index,
+            'expected': _describe(self.expected_token),
+            'actual': _describe(self.actual_token)
+        }
+
+
+def _describe(token):
+    if token is None:
+        return None
+    if token is NEWLINE:
+        return '<end of line>'
+    return preview(token, DIFF_TOKEN_LIMIT)['text']
+
+
+def _as_stream(source):
+    if source is None:
+        return io.StringIO('')
+    if isinstance(source, str):
+        return io.StringIO(source)
+    return source
+
+
+def iter_tokens(source, mode=MODE_LINES):
+    """
+    Lazily split a string or text stream into (token, line) pairs, reading it in chunks so
+    large outputs are never split into one big list. In 'lines' mode line breaks are emitted
+    as NEWLINE tokens, except for leading and trailing ones.
+    """
+    stream = _as_stream(source)
+    line = 1
+    pending_newlines = 0
+    started = False
+    carry = ''
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        text = carry + chunk
+        carry = ''
+        if chunk and text and not text[-1].isspace():
+            # The last token may continue in the next chunk
+            partial = TRAILING_TOKEN_PATTERN.search(text)
+            carry = partial.group()
+            text = text[:partial.start()]
+        for match in TOKEN_PATTERN.finditer(text):
+            token = match.group()
+            if token == '\n':
+                line += 1
+                if mode == MODE_LINES and started:
+                    pending_newlines += 1
+                continue
+            # Only line breaks between pieces of output are significant
+            for offset in range(pending_newlines):
+                yield NEWLINE, line - pending_newlines + offset
+            pending_newlines = 0
+            started = True
+            yield token, line
+        if not chunk:
+            break
+
+
+def _tokens_match(expected, actual, float_tolerance):
+    if expected == actual:
+        return True
+    if float_tolerance is None or expected is NEWLINE or actual is NEWLINE:
+        return False
+    try:
+        expected_value, actual_value = float(expected), float(actual)
+    except ValueError:
+        return False
+    if math.isnan(expected_value) or math.isnan(actual_value):
+        return False
+    return math.isclose(expected_value, actual_value, rel_tol=float_tolerance, abs_tol=float_tolerance)
+
+
+def compare_outputs(expected, actual, mode=None, float_tolerance=None):
+    """Compare expected and actual output token by token, stopping at the first difference"""
+    mode = mode or COMPARE_MODE
+    float_tolerance = FLOAT_TOLERANCE if float_tolerance is None else float_tolerance
+
+    expected_tokens = iter_tokens(expected, mode)
+    actual_tokens = iter_tokens(actual, mode)
+    token_index = 0
+    while True:
+        expected_item = next(expected_tokens, None)
+        actual_item = next(actual_tokens, None)
+        if expected_item is None and actual_item is None:
+            return CompareResult(True)
+
+        expected_token, expected_line = expected_item or (None, None)
+        actual_token, actual_line = actual_item or (None, None)
+        if expected_item is None:
+            return CompareResult(False, token_index, actual_line, None, actual_token, 'extra output')
+        if actual_item is None:
+            return CompareResult(False, token_index, expected_line, expected_token, None, 'missing output')
+        if not _tokens_match(expected_token, actual_token, float_tolerance):
+            return CompareResult(False, token_index, expected_line, expected_token, actual_token, 'mismatch')
+        token_index += 1
+
+
+def preview(text, limit=PREVIEW_LIMIT):
+    """Bounded view of a possibly huge payload, with its full size so the UI can say what was cut"""
+    text = text or ''
+    truncated = len(text) > limit
+    return {
+        'text': text[:limit] + ('…' if truncated else ''),
+        'size': len(text),
+        'truncated': truncated
+    }
@@ -0,0 +1,189 @@
+import base64
+import logging
+import os
+import time
+
+import requests
+
+from leetcode_ai.http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# RapidAPI configuration for Judge0
+RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY')
+JUDGE0_API_URL = "https://judge0-ce.p.rapidapi.com/submissions"
+JUDGE0_BATCH_URL = f"{JUDGE0_API_URL}/batch"
+
+# Judge0 accepts at most 20 submissions in a single batch request
+MAX_BATCH_SIZE = 20
+
+# How often (seconds) to poll Judge0 for unfinished submissions, and how long to wait without progress
+POLL_INTERVAL = float(os.getenv('JUDGE0_POLL_INTERVAL', '0.5'))
+POLL_TIMEOUT = float(os.getenv('JUDGE0_POLL_TIMEOUT', '60'))
+
+# Status ids 1 (In Queue) and 2 (Processing) mean the submission has not finished yet
+PENDING_STATUS_IDS = (1, 2)
+
+RESULT_FIELDS = "token,stdout,stderr,compile_output,status,time,memory"
+
+# Editor language -> Judge0 language_id
+LANGUAGE_IDS = {
+    'python': 71,
+    'javascript': 63,
+    'cpp': 54,
+    'c': 50,
+    'java': 62
+}
+
+
+class Judge0Error(Exception):
+    """Raised when Judge0 rejects a submission or a result cannot be fetched"""
+
+
+def get_language_id(language):
+    """Map an editor language to its Judge0 language_id, defaulting to Python"""
+    return LANGUAGE_IDS.get(language, LANGUAGE_IDS['python'])
+
+
+def _headers():
+    return {
+        'content-type': "application/json",
+        'x-rapidapi-host': "judge0-ce.p.rapidapi.com",
+        'x-rapidapi-key': RAPIDAPI_KEY
+    }
+
+
+def _encode(text):
+    return base64.b64encode(text.encode('utf-8')).decode('utf-8')
+
+
+def _decode(text):
+    if not text:
+        return text
+    return base64.b64decode(text).decode('utf-8', errors='replace')
+
+
+def submit_batch(language_id, source_code, inputs):
+    """Submit one submission per stdin in `inputs` and return their tokens in order"""
+    tokens = []
+    for start in range(0, len(inputs), MAX_BATCH_SIZE):
+        chunk = inputs[start:start + MAX_BATCH_SIZE]
+        payload = {
+            "submissions": [
+                {
+                    "language_id": language_id,
+                    "source_code": _encode(source_code),
+                    "stdin": _encode(stdin)
+                }
+                for stdin in chunk
+            ]
+        }
+
+        logger.info(f"Submitting batch of {len(chunk)} submissions to Judge0")
+        try:
+            response = get_client('judge0').post(
+                JUDGE0_BATCH_URL,
+                params={'base64_encoded': 'true'},
+                json=payload,
+                headers=_headers()
+            )
+        except requests.RequestException as e:
+            raise Judge0Error(f"Failed to submit batch to Judge0: {str(e)}") from e
+        logger.info(f"Response status code from Judge0 batch submit: {response.status_code}")
+
+        if response.status_code != 201:
+            raise Judge0Error(f"Failed to submit batch to Judge0: {response.status_code}, {response.text}")
+
+        for submission in response.json():
+            if 'token' not in submission:
+                raise Judge0Error(f"Judge0 rejected a submission: {submission}")
+            tokens.append(submission['token'])
+
+    return tokens
+
+
+def _normalize_result(submission):
+    """Decode a raw Judge0 submission into the fields run_code cares about"""
+    return {
+        'stdout': _decode(submission.get('stdout')),
+        'stderr': _decode(submission.get('stderr')) or '',
+        'compile_output': _decode(submission.get('compile_output')) or '',
+        'status_id': submission.get('status', {}).get('id'),
+        'status': submission.get('status', {}).get('description', 'Unknown'),
+        'time': submission.get('time'),
+        'memory': submission.get('memory')
+    }
+
+
+def _poll_finished(pending):
+    """Fetch every pending token once; pop and return (index, result) for those that have finished"""
+    finished = []
+    pending_tokens = list(pending)
+    for start in range(0, len(pending_tokens), MAX_BATCH_SIZE):
+        chunk = pending_tokens[start:start + MAX_BATCH_SIZE]
+        try:
+            response = get_client('judge0').get(
+                JUDGE0_BATCH_URL,
+                params={
+                    'tokens': ','.join(chunk),
+                    'base64_encoded': 'true',
+                    'fields': RESULT_FIELDS
+                },
+                headers=_headers()
+            )
+        except requests.RequestException as e:
+            raise Judge0Error(f"Failed to fetch results from Judge0: {str(e)}") from e
+        logger.info(f"Judge0 batch result fetch status: {response.status_code}")
+
+        if response.status_code != 200:
+            raise Judge0Error(f"Failed to fetch results from Judge0: {response.status_code}, {response.text}")
+
+        for submission in response.json().get('submissions', []):
+            if submission is None:
+                continue
+            if submission.get('status', {}).get('id') in PENDING_STATUS_IDS:
+                continue
+            index = pending.pop(submission['token'], None)
+            if index is not None:
+                finished.append((index, _normalize_result(submission)))
+    return finished
+
+
+def iter_results(language_id, source_code, inputs, window=None):
+    """
+    Run `source_code` against every stdin in `inputs` and yield (index, result) pairs as each
+    submission finishes. With `window`, at most that many submissions are in flight and the
+    rest are only submitted as earlier ones finish, so a caller that stops iterating (for
+    example on the first failure) never schedules the remaining cases.
+    """
+    window = window or len(inputs)
+    pending = {}
+    next_index = 0
+    deadline = time.monotonic() + POLL_TIMEOUT
+
+    while next_index < len(inputs) or pending:
+        free = window - len(pending)
+        if free > 0 and next_index < len(inputs):
+            chunk = inputs[next_index:next_index + free]
+            for offset, token in enumerate(submit_batch(language_id, source_code, chunk)):
+                pending[token] = next_index + offset
+            next_index += len(chunk)
+
+        finished = _poll_finished(pending)
+        for index, result in finished:
+            yield index, result
+
+        if finished:
+            deadline = time.monotonic() + POLL_TIMEOUT
+        elif time.monotonic() > deadline:
+            raise Judge0Error(f"Timed out waiting for {len(pending)} Judge0 submissions")
+        elif pending:
+            time.sleep(POLL_INTERVAL)
+
+
+def run_batch(language_id, source_code, inputs):
+    """Run `source_code` against every stdin in `inputs` and return the results in input order"""
+    results = [None] * len(inputs)
+    for index, result in iter_results(language_id, source_code, inputs):
+        results[index] = result
+    return results
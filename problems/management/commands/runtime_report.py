@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from leetcode_ai.http_client import shared_client_stats
+from problems.judge0 import LANGUAGE_IDS
+from problems.metrics import (
+    JUDGE_TIME_LIMIT, SLOWEST_CASE, TOTAL_RUNTIME, distribution_summary, get_runtime_distribution,
+    time_limit_verdict
+)
+
+
+class Command(BaseCommand):
+    help = ("Summarize accepted runtimes per question, flag time limits that look too strict or too loose, "
+            "and show how the shared upstream clients are holding up")
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_ids', nargs='+')
+        parser.add_argument('--language', action='append', choices=sorted(LANGUAGE_IDS),
+                            help="Language to report on (repeatable, default: all)")
+        parser.add_argument('--time-limit', type=float, default=JUDGE_TIME_LIMIT,
+                            help="Per-test-case time limit in seconds")
+
+    def handle(self, *args, **options):
+        languages = options['language'] or sorted(LANGUAGE_IDS)
+        for question_id in options['question_ids']:
+            for language in languages:
+                total = distribution_summary(get_runtime_distribution(question_id, language, TOTAL_RUNTIME))
+                slowest = distribution_summary(get_runtime_distribution(question_id, language, SLOWEST_CASE))
+                if not total['count']:
+                    continue
+                verdict = time_limit_verdict(slowest, options['time_limit'])
+                self.stdout.write(
+                    f"{question_id} {language}: {total['count']} accepted, "
+                    f"total p50 {total['p50']:.3f}s p95 {total['p95']:.3f}s max {total['max']:.3f}s, "
+                    f"slowest case p95 {slowest['p95']:.3f}s max {slowest['max']:.3f}s -> {verdict}"
+                )
+        self.report_upstreams()
+
+    def report_upstreams(self):
+        for name, stats in sorted(shared_client_stats().items()):
+            wait_p95 = f"{stats['wait_p95']:.2f}s" if stats['wait_p95'] is not None else "n/a"
+            self.stdout.write(
+                f"upstream {name}: {stats['requests']} requests from {stats['processes']} processes, "
+                f"{stats['retries']} retries, {stats['throttled']} throttled, {stats['failures']} failed, "
+                f"queue wait p95 {wait_p95} max {stats['wait_max']:.2f}s"
+            )
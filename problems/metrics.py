@@ -0,0 +1,127 @@
+import math
+import os
+
+from leetcode_ai.caching import get_many_shared, incr_shared
+
+# Accepted runtimes are kept as log-scale histograms per (question, language): bucket b
+# holds runtimes up to 2^((b + 1) / BUCKETS_PER_OCTAVE) - 1 milliseconds, and the last
+# bucket collects everything slower. Each bucket is an atomic counter in the shared cache.
+BUCKETS_PER_OCTAVE = 4
+MAX_BUCKET = 16 * BUCKETS_PER_OCTAVE  # ~65 seconds
+RUNTIME_DISTRIBUTION_TTL = int(os.getenv('RUNTIME_DISTRIBUTION_TTL', str(90 * 24 * 60 * 60)))
+
+# Two distributions are kept: the submission's total CPU time (what "beats X%" compares)
+# and its slowest test case (what a per-case time limit has to accommodate)
+TOTAL_RUNTIME = 'total'
+SLOWEST_CASE = 'slowest'
+
+# Per-case time limit the distributions are checked against, and the thresholds for calling
+# it too strict (accepted solutions come close to it) or too loose (they are nowhere near it)
+JUDGE_TIME_LIMIT = float(os.getenv('JUDGE_TIME_LIMIT', '2'))
+STRICT_LIMIT_FRACTION = 0.8
+LOOSE_LIMIT_FRACTION = 0.02
+
+
+def to_seconds(value):
+    """Judge0 reports time as a string of seconds; missing or malformed values become None"""
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (fraction in 0..1), or None if there are none"""
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+def summarize(values):
+    """p50 / p95 / max of a submission's per-test measurements"""
+    return {
+        'p50': percentile(values, 0.50),
+        'p95': percentile(values, 0.95),
+        'max': percentile(values, 1.0)
+    }
+
+
+def submission_metrics(results):
+    """Aggregate CPU time (seconds) and peak memory (KB) over a submission's test case results"""
+    times = [to_seconds(result.get('run_time')) for result in results]
+    return {
+        'time': summarize(times),
+        'memory': summarize([result.get('memory') for result in results]),
+        'total_time': round(sum(value for value in times if value is not None), 3)
+    }
+
+
+def runtime_bucket(seconds):
+    milliseconds = seconds * 1000
+    return min(MAX_BUCKET, int(math.log2(1 + milliseconds) * BUCKETS_PER_OCTAVE))
+
+
+def bucket_upper_bound(bucket):
+    """Largest runtime (seconds) that falls into `bucket`"""
+    return (2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE) - 1) / 1000
+
+
+def _bucket_key(question_id, language, kind, bucket):
+    return f"runtimes:{kind}:{question_id}:{language}:{bucket}"
+
+
+def record_accepted_runtime(question_id, language, metrics):
+    """Add one accepted submission to the question's total-runtime and slowest-case distributions"""
+    for kind, seconds in ((TOTAL_RUNTIME, metrics['total_time']), (SLOWEST_CASE, metrics['time']['max'])):
+        if seconds is not None:
+            key = _bucket_key(question_id, language, kind, runtime_bucket(seconds))
+            incr_shared(key, timeout=RUNTIME_DISTRIBUTION_TTL)
+
+
+def get_runtime_distribution(question_id, language, kind=TOTAL_RUNTIME):
+    """Return {bucket: count} for every non-empty bucket, fetched in one round trip"""
+    keys = {_bucket_key(question_id, language, kind, bucket): bucket for bucket in range(MAX_BUCKET + 1)}
+    counts = get_many_shared(list(keys))
+    return {keys[key]: count for key, count in counts.items() if count}
+
+
+def beats_percent(distribution, seconds):
+    """Share of recorded accepted runtimes slower than `seconds`; runtimes in the same bucket count half"""
+    total = sum(distribution.values())
+    if not total:
+        return None
+    bucket = runtime_bucket(seconds)
+    slower = sum(count for other, count in distribution.items() if other > bucket)
+    same = distribution.get(bucket, 0)
+    return round(100 * (slower + same / 2) / total, 1)
+
+
+def distribution_summary(distribution):
+    """Approximate p50 / p95 / max of a runtime distribution, as bucket upper bounds in seconds"""
+    total = sum(distribution.values())
+    if not total:
+        return {'count': 0, 'p50': None, 'p95': None, 'max': None}
+
+    summary = {'count': total}
+    for name, fraction in (('p50', 0.50), ('p95', 0.95), ('max', 1.0)):
+        rank = max(1, math.ceil(fraction * total))
+        seen = 0
+        for bucket in sorted(distribution):
+            seen += distribution[bucket]
+            if seen >= rank:
+                summary[name] = bucket_upper_bound(bucket)
+                break
+    return summary
+
+
+def time_limit_verdict(slowest_case_summary, time_limit=JUDGE_TIME_LIMIT):
+    """Classify a question's time limit from the slowest-case distribution of accepted submissions"""
+    if not slowest_case_summary['count']:
+        return 'no data'
+    if slowest_case_summary['p95'] >= STRICT_LIMIT_FRACTION * time_limit:
+        return 'too strict'
+    if slowest_case_summary['max'] <= LOOSE_LIMIT_FRACTION * time_limit:
+        return 'too loose'
+    return 'ok'
@@ -0,0 +1,574 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from leetcode_ai.caching import LRUCache
+
+from . import judge0
+from .judge0 import Judge0Error, get_language_id
+
+logger = logging.getLogger(__name__)
+
+# Limits applied to every local submission (seconds / megabytes / bytes)
+LOCAL_TIME_LIMIT = float(os.getenv('LOCAL_JUDGE_TIME_LIMIT', '2'))
+LOCAL_WALL_LIMIT = float(os.getenv('LOCAL_JUDGE_WALL_LIMIT', '5'))
+LOCAL_MEMORY_LIMIT_MB = int(os.getenv('LOCAL_JUDGE_MEMORY_LIMIT_MB', '256'))
+LOCAL_OUTPUT_LIMIT = int(os.getenv('LOCAL_JUDGE_OUTPUT_LIMIT', str(8 * 1024 * 1024)))
+LOCAL_COMPILE_TIMEOUT = float(os.getenv('LOCAL_JUDGE_COMPILE_TIMEOUT', '30'))
+# RLIMIT_NPROC counts every process and thread of the user, not just the submission's, so run
+# the judge as a dedicated user; the cap is what stops a fork bomb from taking the host down
+LOCAL_MAX_PROCESSES = int(os.getenv('LOCAL_JUDGE_MAX_PROCESSES', '256'))
+LOCAL_MAX_OPEN_FILES = int(os.getenv('LOCAL_JUDGE_MAX_OPEN_FILES', '256'))
+
+# util-linux prlimit applies the rlimits and execs the submission, so nothing runs between
+# fork and exec in this (threaded) process
+LOCAL_PRLIMIT = os.getenv('LOCAL_JUDGE_PRLIMIT', 'prlimit')
+
+# Where compiled submissions are kept, and how many of them
+LOCAL_ARTIFACT_DIR = os.getenv('LOCAL_JUDGE_ARTIFACT_DIR', os.path.join(tempfile.gettempdir(), 'judge-artifacts'))
+LOCAL_ARTIFACT_CACHE_SIZE = int(os.getenv('LOCAL_JUDGE_ARTIFACT_CACHE_SIZE', '256'))
+
+# Number of warm workers per language; defaults to the number of local cores
+LOCAL_WORKERS = int(os.getenv('LOCAL_JUDGE_WORKERS', str(os.cpu_count() or 1)))
+LOCAL_PYTHON = os.getenv('LOCAL_JUDGE_PYTHON', 'python3')
+
+# Judge0 status ids, reused so both backends report results the same way
+STATUS_ACCEPTED = (3, 'Accepted')
+STATUS_TIME_LIMIT = (5, 'Time Limit Exceeded')
+STATUS_COMPILATION_ERROR = (6, 'Compilation Error')
+STATUS_SIGSEGV = (7, 'Runtime Error (SIGSEGV)')
+STATUS_SIGXFSZ = (8, 'Runtime Error (SIGXFSZ)')
+STATUS_SIGFPE = (9, 'Runtime Error (SIGFPE)')
+STATUS_SIGABRT = (10, 'Runtime Error (SIGABRT)')
+STATUS_NZEC = (11, 'Runtime Error (NZEC)')
+STATUS_OTHER = (12, 'Runtime Error (Other)')
+
+SIGNAL_STATUSES = {
+    signal.SIGSEGV: STATUS_SIGSEGV,
+    signal.SIGXFSZ: STATUS_SIGXFSZ,
+    signal.SIGFPE: STATUS_SIGFPE,
+    signal.SIGABRT: STATUS_SIGABRT,
+    signal.SIGXCPU: STATUS_TIME_LIMIT,
+}
+
+# Source file name, compile command and run command for each language the editor offers.
+# Python is absent on purpose: it runs inside the warm worker pool below.
+LANGUAGE_COMMANDS = {
+    'javascript': ('main.js', None, ['node', 'main.js']),
+    'c': ('main.c', ['gcc', '-O2', '-o', 'main', 'main.c', '-lm'], ['./main']),
+    'cpp': ('main.cpp', ['g++', '-O2', '-std=c++17', '-o', 'main', 'main.cpp'], ['./main']),
+    'java': ('Main.java', ['javac', 'Main.java'], ['java', f'-Xmx{LOCAL_MEMORY_LIMIT_MB}m', '-cp', '.', 'Main']),
+}
+
+# Languages with a separate compile step
+COMPILED_LANGUAGES = ('c', 'cpp', 'java')
+
+# The JVM reserves far more address space than it uses, so RLIMIT_AS is left to -Xmx
+NO_ADDRESS_SPACE_LIMIT = ('java',)
+
+# Long-lived Python worker. It is started once, imports what it needs, then for every job
+# forks a child that applies rlimits, swaps stdin/stdout/stderr and execs the submission.
+# Jobs and replies are length-prefixed JSON on fds 0/1, read and written unbuffered so
+# the forked child never inherits half-read protocol data.
+PYTHON_WORKER_SOURCE = r'''
+import json, os, resource, signal, struct, sys, tempfile, time, traceback
+
+def read_exact(size):
+    data = b''
+    while len(data) < size:
+        chunk = os.read(0, size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+def send(message):
+    payload = json.dumps(message).encode('utf-8')
+    view = memoryview(struct.pack('>I', len(payload)) + payload)
+    while view:
+        view = view[os.write(1, view):]
+
+def child(job, workdir):
+    exit_code = 1
+    try:
+        os.setsid()
+        os.chdir(workdir)
+        for fd, name, flags in ((0, 'stdin', os.O_RDONLY),
+                                (1, 'stdout', os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+                                (2, 'stderr', os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+            os.dup2(os.open(name, flags, 0o600), fd)
+        cpu = int(job['time_limit']) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (job['memory_limit'], job['memory_limit']))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (job['output_limit'], job['output_limit']))
+        resource.setrlimit(resource.RLIMIT_NPROC, (job['max_processes'], job['max_processes']))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (job['max_open_files'], job['max_open_files']))
+        sys.stdin = open(0, 'r', closefd=False)
+        sys.stdout = open(1, 'w', closefd=False)
+        sys.stderr = open(2, 'w', closefd=False)
+        code = compile(job['source_code'], 'main.py', 'exec')
+        exec(code, {'__name__': '__main__', '__builtins__': __builtins__})
+        exit_code = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException as e:
+        # Report only the submission's frames, not the worker's own
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != 'main.py':
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            pass
+        os._exit(exit_code)
+
+def run(job):
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, 'stdin'), 'w') as stdin_file:
+            stdin_file.write(job['stdin'])
+        started = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            child(job, workdir)
+        deadline = started + job['wall_limit']
+        timed_out = False
+        while True:
+            waited, status, rusage = os.wait4(pid, os.WNOHANG)
+            if waited:
+                break
+            if time.monotonic() > deadline:
+                timed_out = True
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    os.kill(pid, signal.SIGKILL)
+                _, status, rusage = os.wait4(pid, 0)
+                break
+            time.sleep(0.002)
+        wall_time = time.monotonic() - started
+        outputs = {}
+        for name in ('stdout', 'stderr'):
+            with open(os.path.join(workdir, name), 'rb') as output_file:
+                outputs[name] = output_file.read(job['output_limit']).decode('utf-8', errors='replace')
+    return {
+        'stdout': outputs['stdout'],
+        'stderr': outputs['stderr'],
+        'exit_code': os.WEXITSTATUS(status) if os.WIFEXITED(status) else None,
+        'signal': os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+        'timed_out': timed_out,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'wall_time': wall_time,
+        'memory': rusage.ru_maxrss
+    }
+
+while True:
+    header = read_exact(4)
+    if header is None:
+        break
+    job = json.loads(read_exact(struct.unpack('>I', header)[0]))
+    try:
+        send(run(job))
+    except Exception:
+        send({'error': traceback.format_exc()})
+'''
+
+
+class RunnerError(Exception):
+    """Raised when a backend cannot run a submission at all (as opposed to the submission failing)"""
+
+
+class Runner:
+    """
+    Interface shared by every judge backend. `iter_results` yields (index, result) pairs in
+    completion order; each result carries the same keys Judge0 results are normalized to
+    (stdout, stderr, compile_output, status_id, status, time, memory) plus compile_time and
+    compile_cached, so run time (`time`) and compile time are reported separately. With `window`, no
+    more than that many cases are scheduled ahead of the caller, and closing the generator
+    stops scheduling and drops whatever has not started yet.
+    """
+    name = None
+
+    def iter_results(self, language, source_code, inputs, window=None):
+        raise NotImplementedError
+
+    def run(self, language, source_code, inputs):
+        """Run `source_code` against every stdin in `inputs` and return the results in input order"""
+        results = [None] * len(inputs)
+        for index, result in self.iter_results(language, source_code, inputs):
+            results[index] = result
+        return results
+
+
+class Judge0Runner(Runner):
+    """Hosted Judge0 on RapidAPI, using batch submissions"""
+    name = 'judge0'
+
+    def iter_results(self, language, source_code, inputs, window=None):
+        # Judge0 on RapidAPI does not allow deleting queued submissions, so closing this
+        # generator only stops polling and submitting; in-flight cases run to completion.
+        language_id = get_language_id(language)
+        try:
+            if window is not None and language in COMPILED_LANGUAGES and len(inputs) > 1:
+                # Judge0 compiles every submission separately and cannot share a binary between
+                # them. A windowed caller stops at the first failure, so run one case first and
+                # only fill the window once the source is known to build; a full run fans out at
+                # once rather than paying an extra round trip on every submission.
+                index, first = next(judge0.iter_results(language_id, source_code, inputs[:1]))
+                yield index, self._with_compile_info(first)
+                if first['status_id'] == STATUS_COMPILATION_ERROR[0]:
+                    for index in range(1, len(inputs)):
+                        yield index, self._with_compile_info(dict(first))
+                    return
+                for index, result in judge0.iter_results(language_id, source_code, inputs[1:], window):
+                    yield index + 1, self._with_compile_info(result)
+            else:
+                for index, result in judge0.iter_results(language_id, source_code, inputs, window):
+                    yield index, self._with_compile_info(result)
+        except Judge0Error as e:
+            raise RunnerError(str(e)) from e
+
+    @staticmethod
+    def _with_compile_info(result):
+        # Judge0 folds compilation into each submission's wall time and does not report it separately
+        result['compile_time'] = None
+        result['compile_cached'] = False
+        return result
+
+
+class PythonWorkerPool:
+    """Fixed-size pool of warm Python worker processes; dead workers are replaced on demand"""
+
+    def __init__(self, size):
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [LOCAL_PYTHON, '-c', PYTHON_WORKER_SOURCE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+
+    def execute(self, job):
+        worker = self._idle.get()
+        try:
+            payload = json.dumps(job).encode('utf-8')
+            worker.stdin.write(struct.pack('>I', len(payload)) + payload)
+            worker.stdin.flush()
+            header = worker.stdout.read(4)
+            if len(header) < 4:
+                raise RunnerError("Python worker exited unexpectedly")
+            response = json.loads(worker.stdout.read(struct.unpack('>I', header)[0]))
+        except (OSError, ValueError, RunnerError) as e:
+            logger.error(f"Python worker failed, replacing it: {str(e)}")
+            worker.kill()
+            worker.wait()
+            worker = self._spawn()
+            raise RunnerError(f"Python worker failed: {str(e)}") from e
+        finally:
+            self._idle.put(worker)
+
+        if 'error' in response:
+            raise RunnerError(f"Python worker failed: {response['error']}")
+        return response
+
+
+def _limited(command, address_space):
+    """Prefix `command` with the prlimit call that applies the local rlimits before exec"""
+    cpu = int(LOCAL_TIME_LIMIT) + 1
+    limits = [
+        f"--cpu={cpu}:{cpu + 1}",
+        f"--fsize={LOCAL_OUTPUT_LIMIT}",
+        f"--nproc={LOCAL_MAX_PROCESSES}",
+        f"--nofile={LOCAL_MAX_OPEN_FILES}"
+    ]
+    if address_space:
+        limits.append(f"--as={LOCAL_MEMORY_LIMIT_MB * 1024 * 1024}")
+    return [LOCAL_PRLIMIT, *limits, '--', *command]
+
+
+def _run_command(command, stdin, workdir, address_space=True):
+    """Run one submission process under rlimits and a wall-clock deadline; returns the raw worker-style result"""
+    with tempfile.TemporaryDirectory() as iodir:
+        paths = {name: os.path.join(iodir, name) for name in ('stdin', 'stdout', 'stderr')}
+        with open(paths['stdin'], 'w') as stdin_file:
+            stdin_file.write(stdin)
+
+        with open(paths['stdin'], 'rb') as stdin_file, \
+                open(paths['stdout'], 'wb') as stdout_file, \
+                open(paths['stderr'], 'wb') as stderr_file:
+            started = time.monotonic()
+            try:
+                process = subprocess.Popen(
+                    _limited(command, address_space),
+                    cwd=workdir,
+                    stdin=stdin_file,
+                    stdout=stdout_file,
+                    stderr=stderr_file,
+                    start_new_session=True
+                )
+            except FileNotFoundError as e:
+                raise RunnerError(f"Cannot start a sandboxed process: {str(e)}") from e
+            deadline = started + LOCAL_WALL_LIMIT
+            timed_out = False
+            while True:
+                waited, status, rusage = os.wait4(process.pid, os.WNOHANG)
+                if waited:
+                    break
+                if time.monotonic() > deadline:
+                    timed_out = True
+                    os.killpg(process.pid, signal.SIGKILL)
+                    _, status, rusage = os.wait4(process.pid, 0)
+                    break
+                time.sleep(0.002)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            wall_time = time.monotonic() - started
+
+        outputs = {}
+        for name in ('stdout', 'stderr'):
+            with open(paths[name], 'rb') as output_file:
+                outputs[name] = output_file.read(LOCAL_OUTPUT_LIMIT).decode('utf-8', errors='replace')
+
+    return {
+        'stdout': outputs['stdout'],
+        'stderr': outputs['stderr'],
+        'exit_code': os.WEXITSTATUS(status) if os.WIFEXITED(status) else None,
+        'signal': os.WTERMSIG(status) if os.WIFSIGNALED(status) else None,
+        'timed_out': timed_out,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'wall_time': wall_time,
+        'memory': rusage.ru_maxrss
+    }
+
+
+def _to_result(raw):
+    """Translate a raw local execution into a Judge0-shaped result"""
+    if raw['timed_out'] or raw['cpu_time'] > LOCAL_TIME_LIMIT:
+        status_id, status = STATUS_TIME_LIMIT
+    elif raw['signal'] is not None:
+        status_id, status = SIGNAL_STATUSES.get(raw['signal'], STATUS_OTHER)
+    elif raw['exit_code']:
+        status_id, status = STATUS_NZEC
+    else:
+        status_id, status = STATUS_ACCEPTED
+
+    return {
+        'stdout': raw['stdout'] or None,
+        'stderr': raw['stderr'],
+        'compile_output': '',
+        'status_id': status_id,
+        'status': status,
+        'time': f"{raw['cpu_time']:.3f}",
+        'memory': raw['memory']
+    }
+
+
+def _compile_error_result(artifact):
+    status_id, status = STATUS_COMPILATION_ERROR
+    return {
+        'stdout': None,
+        'stderr': '',
+        'compile_output': artifact.compile_output,
+        'status_id': status_id,
+        'status': status,
+        'time': None,
+        'memory': None,
+        'compile_time': artifact.compile_time,
+        'compile_cached': artifact.cached
+    }
+
+
+class Artifact:
+    """A submission written (and, for compiled languages, compiled) into its own directory"""
+
+    def __init__(self, workdir, compile_output, compile_time, cached=False):
+        self.workdir = workdir
+        self.compile_output = compile_output
+        self.compile_time = compile_time
+        self.cached = cached
+
+    @property
+    def failed(self):
+        return self.compile_output is not None
+
+
+class ArtifactCache:
+    """
+    Compiled submissions keyed by (language, source hash), so pressing Run again with the
+    same code, or judging the same code in another mode, never recompiles it. Failed
+    compilations are cached too. Evicted artifacts have their directory removed.
+    """
+
+    def __init__(self, root=LOCAL_ARTIFACT_DIR, max_entries=LOCAL_ARTIFACT_CACHE_SIZE):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._artifacts = LRUCache(
+            max_entries=max_entries,
+            sizeof=lambda artifact: 1,
+            on_evict=lambda key, artifact: shutil.rmtree(artifact.workdir, ignore_errors=True)
+        )
+        # Striped locks: concurrent runs of the same source wait for one compilation
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def get(self, language, source_code):
+        digest = hashlib.sha256(source_code.encode('utf-8')).hexdigest()
+        key = f"{language}:{digest}"
+        with self._locks[int(digest[:8], 16) % len(self._locks)]:
+            artifact = self._artifacts.get(key)
+            if artifact is not None:
+                return Artifact(artifact.workdir, artifact.compile_output, artifact.compile_time, cached=True)
+
+            workdir = tempfile.mkdtemp(prefix=f"{language}-", dir=self.root)
+            started = time.monotonic()
+            compile_output = _compile(language, source_code, workdir)
+            artifact = Artifact(workdir, compile_output, time.monotonic() - started)
+            self._artifacts.set(key, artifact)
+        return artifact
+
+
+def _compile(language, source_code, workdir):
+    """Write and, where needed, compile the submission; returns compiler output on failure, else None"""
+    source_name, compile_command, _ = LANGUAGE_COMMANDS[language]
+    with open(os.path.join(workdir, source_name), 'w') as source_file:
+        source_file.write(source_code)
+    if compile_command is None:
+        return None
+
+    try:
+        process = subprocess.run(
+            compile_command,
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+            timeout=LOCAL_COMPILE_TIMEOUT
+        )
+    except FileNotFoundError as e:
+        raise RunnerError(f"Compiler for {language} is not installed: {str(e)}") from e
+    except subprocess.TimeoutExpired:
+        return "Compilation timed out"
+    if process.returncode != 0:
+        return process.stderr or process.stdout
+    return None
+
+
+class LocalRunner(Runner):
+    """
+    Runs submissions on this machine in rlimited subprocesses. Python submissions are forked
+    from a pool of warm interpreters, so no interpreter start-up is paid per test case; other
+    languages are compiled once into a cached artifact and that artifact is executed once per
+    test case. Concurrency is bounded by LOCAL_WORKERS for every language.
+    """
+    name = 'local'
+
+    def __init__(self, workers=LOCAL_WORKERS):
+        self.workers = workers
+        self._python_pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._artifacts = ArtifactCache()
+
+    def _get_python_pool(self):
+        with self._pool_lock:
+            if self._python_pool is None:
+                logger.info(f"Starting {self.workers} warm Python workers")
+                self._python_pool = PythonWorkerPool(self.workers)
+            return self._python_pool
+
+    def _run_python(self, source_code, stdin):
+        job = {
+            'source_code': source_code,
+            'stdin': stdin,
+            'time_limit': LOCAL_TIME_LIMIT,
+            'wall_limit': LOCAL_WALL_LIMIT,
+            'memory_limit': LOCAL_MEMORY_LIMIT_MB * 1024 * 1024,
+            'output_limit': LOCAL_OUTPUT_LIMIT,
+            'max_processes': LOCAL_MAX_PROCESSES,
+            'max_open_files': LOCAL_MAX_OPEN_FILES
+        }
+        result = _to_result(self._get_python_pool().execute(job))
+        # Python is compiled to bytecode inside the worker as part of the run
+        result['compile_time'] = None
+        result['compile_cached'] = False
+        return result
+
+    def _run_artifact(self, language, artifact, stdin):
+        _, _, run_command = LANGUAGE_COMMANDS[language]
+        with self._slots:
+            raw = _run_command(run_command, stdin, artifact.workdir, address_space=language not in NO_ADDRESS_SPACE_LIMIT)
+        result = _to_result(raw)
+        result['compile_time'] = artifact.compile_time
+        result['compile_cached'] = artifact.cached
+        return result
+
+    def iter_results(self, language, source_code, inputs, window=None):
+        if language not in LANGUAGE_COMMANDS:
+            language = 'python'
+
+        if language == 'python':
+            execute = lambda stdin: self._run_python(source_code, stdin)
+        else:
+            artifact = self._artifacts.get(language, source_code)
+            logger.info(
+                f"{'Reusing cached' if artifact.cached else 'Compiled'} {language} artifact "
+                f"(compile time {artifact.compile_time:.3f}s)"
+            )
+            if artifact.failed:
+                for index in range(len(inputs)):
+                    yield index, _compile_error_result(artifact)
+                return
+            execute = lambda stdin: self._run_artifact(language, artifact, stdin)
+
+        # Cases are submitted lazily so no more than `window` are queued ahead of the caller
+        window = max(1, window or self.workers)
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.workers, window, len(inputs))))
+        try:
+            futures = {}
+            next_index = 0
+            while next_index < len(inputs) or futures:
+                while next_index < len(inputs) and len(futures) < window:
+                    futures[executor.submit(execute, inputs[next_index])] = next_index
+                    next_index += 1
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield futures.pop(future), future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+RUNNERS = {
+    Judge0Runner.name: Judge0Runner,
+    LocalRunner.name: LocalRunner,
+}
+
+_runners = {}
+_runners_lock = threading.Lock()
+
+
+def get_runner(name=None):
+    """Return the shared runner instance for `name`, defaulting to settings.JUDGE_BACKEND"""
+    name = name or settings.JUDGE_BACKEND
+    if name not in RUNNERS:
+        raise RunnerError(f"Unknown judge backend: {name}")
+    with _runners_lock:
+        if name not in _runners:
+            _runners[name] = RUNNERS[name]()
+        return _runners[name]
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from leetcode_ai.caching import LRUCache, get_shared, set_shared
+
+logger = logging.getLogger(__name__)
+
+TESTCASE_BUCKET = 'leetcode-ai-problems'
+
+# Written by the generate_test_cases Lambda (inputs) and the generate-expected-output
+# Lambda (outputs); its version changes whenever either of them rewrites the suite.
+MANIFEST_KEY = "manifest.json"
+
+# In-process tier: size-bounded LRU of whole suites
+TESTCASE_CACHE_MAX_BYTES = int(os.getenv('TESTCASE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# How long a locally cached suite is trusted before its manifest is read again
+TESTCASE_REVALIDATE_SECONDS = float(os.getenv('TESTCASE_REVALIDATE_SECONDS', '60'))
+# Shared tier (Django cache / Redis) entries are keyed by version, so this only bounds storage
+TESTCASE_SHARED_TTL = int(os.getenv('TESTCASE_SHARED_TTL', str(24 * 60 * 60)))
+# Parallel S3 GETs when a suite has to be loaded from the bucket
+TESTCASE_FETCH_WORKERS = int(os.getenv('TESTCASE_FETCH_WORKERS', '16'))
+
+s3 = boto3.client(
+    's3',
+    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+    region_name=os.getenv('AWS_REGION')
+)
+
+
+class TestCaseMissingError(Exception):
+    """Raised when a test case input or expected output cannot be loaded from S3"""
+
+
+class TestSuite:
+    """All (input, expected_output) pairs of one question at one output version"""
+
+    def __init__(self, question_id, version, cases, names=None, sample_indexes=None):
+        self.question_id = question_id
+        self.version = version
+        self.cases = cases
+        self.names = names or [f"testcase{i}" for i in range(1, len(cases) + 1)]
+        # Questions generated before samples existed have none; sample mode refuses to run them
+        self.sample_indexes = list(sample_indexes or [])
+        self.checked_at = time.monotonic()
+
+    @property
+    def size(self):
+        return sum(len(input_data) + len(expected_output) for input_data, expected_output in self.cases)
+
+    def __len__(self):
+        return len(self.cases)
+
+
+_suites = LRUCache(max_bytes=TESTCASE_CACHE_MAX_BYTES, sizeof=lambda suite: suite.size)
+
+
+def _shared_key(question_id, version):
+    return f"testsuite:{question_id}:{version}"
+
+
+def fetch_s3_file(bucket_name, key):
+    """Helper function to fetch file content from S3"""
+    try:
+        logger.info(f"Fetching file from S3: bucket={bucket_name}, key={key}")
+        response = s3.get_object(Bucket=bucket_name, Key=key)
+        content = response['Body'].read().decode('utf-8')
+        logger.info(f"Successfully fetched file from S3: {key}")
+        return content
+    except Exception as e:
+        logger.error(f"Error fetching file from S3: {str(e)}")
+        return None
+
+
+def _case_sort_key(name):
+    """Samples (the question's worked examples) first, then test cases in numeric order"""
+    match = re.search(r'(\d+)$', name)
+    return (not name.startswith('sample'), int(match.group(1)) if match else 0)
+
+
+def _listing_version(cases):
+    """Version of a listed suite: changes whenever any of its objects is added, removed or rewritten"""
+    digest = hashlib.sha256()
+    for case in cases:
+        for side in ('input', 'output'):
+            if case[side] is not None:
+                digest.update(f"{case[side]['key']}:{case[side]['etag']}\n".encode('utf-8'))
+    return f"listing-{digest.hexdigest()[:16]}"
+
+
+def _list_manifest(question_id):
+    """Build a manifest from one listing, for questions generated before manifests existed"""
+    cases = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=TESTCASE_BUCKET, Prefix=f"{question_id}/"):
+        for obj in page.get('Contents', []):
+            parts = obj['Key'].split('/')
+            if len(parts) != 3 or parts[1] not in ('input', 'output') or not parts[2].endswith('.txt'):
+                continue
+            name = parts[2][:-len('.txt')]
+            case = cases.setdefault(name, {'name': name, 'sample': name.startswith('sample'), 'input': None, 'output': None})
+            case[parts[1]] = {'key': obj['Key'], 'size': obj['Size'], 'etag': obj['ETag'].strip('"')}
+    ordered = sorted(cases.values(), key=lambda case: _case_sort_key(case['name']))
+    return {'question_id': question_id, 'version': _listing_version(ordered), 'count': len(ordered), 'cases': ordered}
+
+
+def get_manifest(question_id):
+    """Read the question's test manifest; falls back to a single listing when there is none"""
+    try:
+        response = s3.get_object(Bucket=TESTCASE_BUCKET, Key=f"{question_id}/{MANIFEST_KEY}")
+        return json.loads(response['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        logger.info(f"No test manifest for {question_id}, listing test cases instead")
+        return _list_manifest(question_id)
+
+
+def _fetch_suite(question_id, manifest):
+    """Load every input/expected-output pair listed in the manifest from S3 in parallel"""
+    judged = []
+    for case in manifest['cases']:
+        if case.get('input') and case.get('output'):
+            judged.append(case)
+        else:
+            logger.warning(f"Test case {case['name']} of {question_id} has no expected output yet, skipping it")
+    if not judged:
+        verification = manifest.get('verification') or {}
+        if verification.get('status') == 'failed':
+            raise TestCaseMissingError(
+                f"Question {question_id} is unavailable: its reference solution failed performance "
+                f"verification ({verification.get('reason')})"
+            )
+        raise TestCaseMissingError(f"No test cases with expected outputs for {question_id}")
+
+    keys = []
+    for case in judged:
+        keys.append(case['input']['key'])
+        keys.append(case['output']['key'])
+
+    with ThreadPoolExecutor(max_workers=TESTCASE_FETCH_WORKERS) as executor:
+        contents = list(executor.map(lambda key: fetch_s3_file(TESTCASE_BUCKET, key), keys))
+
+    cases = []
+    for i, case in enumerate(judged):
+        input_data, expected_output = contents[2 * i], contents[2 * i + 1]
+        if input_data is None or expected_output is None:
+            raise TestCaseMissingError(f"Test case {case['name']} missing in S3")
+        cases.append((input_data, expected_output))
+
+    sample_indexes = [i for i, case in enumerate(judged) if case.get('sample')]
+    return TestSuite(question_id, manifest['version'], cases, [case['name'] for case in judged], sample_indexes)
+
+
+def load_test_suite(question_id):
+    """
+    Return the TestSuite for `question_id`, checking the in-process LRU first, then the
+    shared cache, and only then S3. A locally cached suite is reused without any S3 call
+    for TESTCASE_REVALIDATE_SECONDS; after that one manifest read decides whether it is
+    still current.
+    """
+    suite = _suites.get(question_id)
+    if suite is not None and time.monotonic() - suite.checked_at < TESTCASE_REVALIDATE_SECONDS:
+        return suite
+
+    manifest = get_manifest(question_id)
+    version = manifest['version']
+    if suite is not None and suite.version == version:
+        suite.checked_at = time.monotonic()
+        return suite
+
+    shared = get_shared(_shared_key(question_id, version))
+    if shared is not None:
+        logger.info(f"Loaded test suite for {question_id} from shared cache")
+        suite = TestSuite(question_id, version, shared['cases'], shared['names'], shared['sample_indexes'])
+        _suites.set(question_id, suite)
+        return suite
+
+    logger.info(f"Loading test suite for {question_id} from S3")
+    suite = _fetch_suite(question_id, manifest)
+    _suites.set(question_id, suite)
+    shared = {'cases': suite.cases, 'names': suite.names, 'sample_indexes': suite.sample_indexes}
+    set_shared(_shared_key(question_id, version), shared, TESTCASE_SHARED_TTL)
+    return suite
@@ -1,3 +1,910 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from leetcode_ai import http_client
+from leetcode_ai.caching import LRUCache
+from leetcode_ai.http_client import UpstreamClient, UpstreamLimiter
+
+from . import comparator, judge0, metrics, runners, testcases, verdicts, views
+from .comparator import MODE_LINES, MODE_TOKENS, NEWLINE, compare_outputs, iter_tokens
+from .metrics import beats_percent, percentile, runtime_bucket
+
+
+class IterTokensTests(SimpleTestCase):
+    def tokens(self, text, mode=MODE_LINES, chunk_size=None):
+        if chunk_size is None:
+            return list(iter_tokens(text, mode))
+        with mock.patch.object(comparator, 'CHUNK_SIZE', chunk_size):
+            return list(iter_tokens(io.StringIO(text), mode))
+
+    def test_line_breaks_between_tokens_are_kept(self):
+        self.assertEqual(self.tokens("1 2\n3\n"), [('1', 1), ('2', 1), (NEWLINE, 1), ('3', 2)])
+
+    def test_trailing_whitespace_and_blank_lines_are_dropped(self):
+        self.assertEqual(self.tokens("1 2  \n\n\n"), [('1', 1), ('2', 1)])
+
+    def test_leading_blank_lines_are_dropped(self):
+        self.assertEqual(self.tokens("\n\n  1\n2"), [('1', 3), (NEWLINE, 3), ('2', 4)])
+        self.assertEqual(self.tokens("\n\n1", chunk_size=1), [('1', 3)])
+
+    def test_tokens_mode_ignores_line_breaks(self):
+        self.assertEqual(self.tokens("1\n\n2", MODE_TOKENS), [('1', 1), ('2', 3)])
+
+    def test_tokens_split_across_chunks_are_joined(self):
+        text = "12345 678\n9 abcdefghij\nk\n"
+        for chunk_size in (1, 2, 3, 4, 5, 7):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.tokens(text, chunk_size=chunk_size), self.tokens(text))
+
+    def test_chunk_ending_on_whitespace(self):
+        self.assertEqual(self.tokens("abc def", chunk_size=4), [('abc', 1), ('def', 1)])
+
+    def test_empty_and_missing_output(self):
+        self.assertEqual(self.tokens(""), [])
+        self.assertEqual(list(iter_tokens(None)), [])
+
+
+class CompareOutputsTests(SimpleTestCase):
+    def test_identical_output_passes(self):
+        self.assertTrue(compare_outputs("1 2\n3\n", "1 2\n3").passed)
+
+    def test_surrounding_blank_lines_are_ignored(self):
+        # Matches the .strip() the judge applied before token-wise comparison
+        self.assertTrue(compare_outputs("1 2\n3", "\n\n1 2\n3\n\n", mode=MODE_LINES).passed)
+        self.assertFalse(compare_outputs("1 2\n3", "\n1 2\n\n3", mode=MODE_LINES).passed)
+
+    def test_line_layout_matters_in_lines_mode(self):
+        result = compare_outputs("1 2\n3", "1\n2 3", mode=MODE_LINES)
+        self.assertFalse(result.passed)
+        self.assertEqual((result.reason, result.token_index, result.line), ('mismatch', 1, 1))
+
+    def test_line_layout_is_ignored_in_tokens_mode(self):
+        self.assertTrue(compare_outputs("1 2\n3", "1\n2 3", mode=MODE_TOKENS).passed)
+
+    def test_missing_and_extra_output(self):
+        self.assertEqual(compare_outputs("1 2", "1", mode=MODE_TOKENS).reason, 'missing output')
+        self.assertEqual(compare_outputs("1", "1 2", mode=MODE_TOKENS).reason, 'extra output')
+
+    def test_float_tolerance(self):
+        self.assertTrue(compare_outputs("0.333333", "0.3333331", mode=MODE_TOKENS, float_tolerance=1e-6).passed)
+        self.assertFalse(compare_outputs("0.33", "0.34", mode=MODE_TOKENS, float_tolerance=1e-6).passed)
+        self.assertFalse(compare_outputs("nan", "0.0", mode=MODE_TOKENS, float_tolerance=1e-6).passed)
+
+    def test_streams_compare_across_chunk_boundaries(self):
+        expected = " ".join(str(n) for n in range(1000)) + "\n"
+        actual = expected.replace(" 999", " 998")
+        with mock.patch.object(comparator, 'CHUNK_SIZE', 7):
+            self.assertTrue(compare_outputs(io.StringIO(expected), io.StringIO(expected), mode=MODE_TOKENS).passed)
+            result = compare_outputs(io.StringIO(expected), io.StringIO(actual), mode=MODE_TOKENS)
+        self.assertEqual((result.token_index, result.expected_token, result.actual_token), (999, '999', '998'))
+
+
+class FakeJudge0:
+    """Judge0 batch API double: each submission finishes after `polls` result fetches"""
+
+    def __init__(self, polls=1, outputs=None):
+        self.polls = polls
+        self.outputs = outputs or (lambda stdin: stdin.upper())
+        self.submissions = {}  # token -> {'stdin', 'fetches'}
+        self.batch_sizes = []
+        self.max_in_flight = 0
+
+    def post(self, url, params=None, json=None, headers=None):
+        self.batch_sizes.append(len(json['submissions']))
+        tokens = []
+        for submission in json['submissions']:
+            token = f"t{len(self.submissions)}"
+            stdin = base64.b64decode(submission['stdin']).decode('utf-8')
+            self.submissions[token] = {'stdin': stdin, 'fetches': 0, 'done': False}
+            tokens.append({'token': token})
+        in_flight = sum(not submission['done'] for submission in self.submissions.values())
+        self.max_in_flight = max(self.max_in_flight, in_flight)
+        return mock.Mock(status_code=201, json=lambda: tokens)
+
+    def get(self, url, params=None, headers=None):
+        results = []
+        for token in params['tokens'].split(','):
+            submission = self.submissions[token]
+            submission['fetches'] += 1
+            if submission['fetches'] < self.polls:
+                results.append({'token': token, 'status': {'id': 2, 'description': 'Processing'}})
+                continue
+            submission['done'] = True
+            results.append({
+                'token': token,
+                'stdout': base64.b64encode(self.outputs(submission['stdin']).encode('utf-8')).decode('utf-8'),
+                'status': {'id': 3, 'description': 'Accepted'},
+                'time': '0.01',
+                'memory': 1024
+            })
+        return mock.Mock(status_code=200, json=lambda: {'submissions': results})
+
+
+class Judge0BatchTests(SimpleTestCase):
+    def setUp(self):
+        self.judge = FakeJudge0(polls=2)
+        for patcher in (
+            mock.patch.object(judge0, 'get_client', return_value=self.judge),
+            mock.patch.object(judge0, 'POLL_INTERVAL', 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_run_batch_returns_results_in_input_order(self):
+        results = judge0.run_batch(71, 'print(input())', ['a', 'b', 'c'])
+        self.assertEqual([result['stdout'] for result in results], ['A', 'B', 'C'])
+        self.assertEqual(results[0]['status'], 'Accepted')
+        self.assertEqual(self.judge.batch_sizes, [3])
+
+    def test_large_runs_are_split_into_batches(self):
+        judge0.run_batch(71, 'x', [str(n) for n in range(45)])
+        self.assertEqual(self.judge.batch_sizes, [20, 20, 5])
+
+    def test_window_limits_submissions_in_flight(self):
+        inputs = [str(n) for n in range(7)]
+        results = dict(judge0.iter_results(71, 'x', inputs, window=2))
+        self.assertEqual(sorted(results), list(range(7)))
+        self.assertEqual(self.judge.max_in_flight, 2)
+
+    def test_closing_early_stops_submitting(self):
+        results = judge0.iter_results(71, 'x', [str(n) for n in range(10)], window=3)
+        next(results)
+        results.close()
+        self.assertLessEqual(len(self.judge.submissions), 4)
+
+    def test_stalled_submissions_time_out(self):
+        self.judge.polls = float('inf')
+        with mock.patch.object(judge0, 'POLL_TIMEOUT', 0):
+            with self.assertRaises(judge0.Judge0Error):
+                judge0.run_batch(71, 'x', ['a'])
+
+    def test_rejected_batch_raises(self):
+        self.judge.post = lambda *args, **kwargs: mock.Mock(status_code=422, text='bad language')
+        with self.assertRaisesMessage(judge0.Judge0Error, '422'):
+            judge0.run_batch(71, 'x', ['a'])
+
+    def test_transport_errors_become_judge0_errors(self):
+        def refuse(*args, **kwargs):
+            raise requests.ConnectionError('refused')
+
+        self.judge.post = refuse
+        with self.assertRaises(judge0.Judge0Error):
+            judge0.run_batch(71, 'x', ['a'])
+
+
+class LocalRunnerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.artifact_dir = tempfile.TemporaryDirectory()
+        with mock.patch.object(runners, 'LOCAL_ARTIFACT_DIR', cls.artifact_dir.name):
+            cls.runner = runners.LocalRunner(workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.artifact_dir.cleanup()
+        super().tearDownClass()
+
+    def test_python_cases_run_in_input_order(self):
+        results = self.runner.run('python', "print(int(input()) * 2)", ['1', '2', '3'])
+        self.assertEqual([result['stdout'] for result in results], ['2\n', '4\n', '6\n'])
+        self.assertTrue(all(result['status_id'] == runners.STATUS_ACCEPTED[0] for result in results))
+
+    def test_python_state_does_not_leak_between_cases(self):
+        source = "import builtins\nprint(getattr(builtins, 'seen', 0))\nbuiltins.seen = 1"
+        results = self.runner.run('python', source, ['', ''])
+        self.assertEqual([result['stdout'] for result in results], ['0\n', '0\n'])
+
+    def test_runtime_error_reports_only_submission_frames(self):
+        source = "def f():\n    return 1 // 0\nf()\n"
+        result = self.runner.run('python', source, [''])[0]
+        self.assertEqual(result['status_id'], runners.STATUS_NZEC[0])
+        self.assertIn('File "main.py", line 2, in f', result['stderr'])
+        self.assertIn('ZeroDivisionError', result['stderr'])
+        self.assertNotIn('in child', result['stderr'])
+
+    def test_python_limits_are_applied(self):
+        source = "import resource\nprint(resource.getrlimit(resource.RLIMIT_NPROC)[1], resource.getrlimit(resource.RLIMIT_NOFILE)[1])"
+        result = self.runner.run('python', source, [''])[0]
+        self.assertEqual(result['stdout'].split(), [str(runners.LOCAL_MAX_PROCESSES), str(runners.LOCAL_MAX_OPEN_FILES)])
+
+    def test_wall_clock_limit(self):
+        with mock.patch.object(runners, 'LOCAL_WALL_LIMIT', 0.3):
+            result = self.runner.run('python', "import time\ntime.sleep(5)", [''])[0]
+        self.assertEqual(result['status_id'], runners.STATUS_TIME_LIMIT[0])
+
+    def test_window_yields_every_case_once(self):
+        indexes = [index for index, _ in self.runner.iter_results('python', "print(input())", list('abcde'), window=2)]
+        self.assertEqual(sorted(indexes), [0, 1, 2, 3, 4])
+
+    @skipUnless(shutil.which('gcc') and shutil.which(runners.LOCAL_PRLIMIT), "gcc and prlimit are required")
+    def test_compiled_submission_runs_under_rlimits(self):
+        source = (
+            "#include <stdio.h>\n#include <sys/resource.h>\n"
+            "int main(){struct rlimit p, f; getrlimit(RLIMIT_NPROC, &p); getrlimit(RLIMIT_NOFILE, &f);"
+            "int n; scanf(\"%d\", &n); printf(\"%d %ld %ld\\n\", n + 1, (long)p.rlim_max, (long)f.rlim_max); return 0;}\n"
+        )
+        result = self.runner.run('c', source, ['41'])[0]
+        self.assertEqual(
+            result['stdout'].split(),
+            ['42', str(runners.LOCAL_MAX_PROCESSES), str(runners.LOCAL_MAX_OPEN_FILES)]
+        )
+
+    def test_limited_command(self):
+        command = runners._limited(['./main'], address_space=False)
+        self.assertEqual(command[0], runners.LOCAL_PRLIMIT)
+        self.assertEqual(command[-2:], ['--', './main'])
+        self.assertIn(f"--nproc={runners.LOCAL_MAX_PROCESSES}", command)
+        self.assertFalse(any(arg.startswith('--as=') for arg in command))
+        self.assertTrue(any(arg.startswith('--as=') for arg in runners._limited(['./main'], address_space=True)))
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_entry(self):
+        evicted = []
+        cache = LRUCache(max_entries=2, on_evict=lambda key, value: evicted.append(key))
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(evicted, ['b'])
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_evicts_by_total_size(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set('a', 'x', size=4)
+        cache.set('b', 'y', size=4)
+        cache.set('c', 'z', size=4)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['bytes'], 8)
+
+    def test_oversized_entry_is_not_cached(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set('a', 'x', size=4)
+        cache.set('big', 'y', size=11)
+        self.assertIsNone(cache.get('big'))
+        self.assertEqual(cache.get('a'), 'x')
+
+    def test_entries_expire_after_ttl(self):
+        now = [100.0]
+        with mock.patch('leetcode_ai.caching.time.monotonic', lambda: now[0]):
+            cache = LRUCache(ttl=10)
+            cache.set('a', 1)
+            cache.set('b', 2, ttl=30)
+            now[0] += 11
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), 2)
+            now[0] += 20
+            self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+
+class FakeS3:
+    """Bucket-less S3 double for problems.testcases: objects are {key: text}"""
+
+    class NoSuchKey(Exception):
+        pass
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.exceptions = types.SimpleNamespace(NoSuchKey=self.NoSuchKey)
+        self.gets = []
+
+    def put(self, key, text):
+        self.objects[key] = text
+
+    def get_object(self, Bucket, Key):
+        self.gets.append(Key)
+        if Key not in self.objects:
+            raise self.NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[Key].encode('utf-8'))}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {'Contents': [
+            {'Key': key, 'Size': len(text), 'ETag': f'"{hashlib.md5(text.encode("utf-8")).hexdigest()}"'}
+            for key, text in sorted(self.objects.items()) if key.startswith(Prefix)
+        ]}
+
+
+def manifest_for(question_id, names, version, samples=()):
+    return json.dumps({
+        'question_id': question_id,
+        'version': version,
+        'count': len(names),
+        'cases': [
+            {
+                'name': name,
+                'sample': name in samples,
+                'input': {'key': f"{question_id}/input/{name}.txt"},
+                'output': {'key': f"{question_id}/output/{name}.txt"}
+            }
+            for name in names
+        ]
+    })
+
+
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'problems-tests'}}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LoadTestSuiteTests(SimpleTestCase):
+    def setUp(self):
+        self.s3 = FakeS3({
+            'q/input/testcase1.txt': '1',
+            'q/output/testcase1.txt': '2',
+            'q/input/testcase2.txt': '3',
+            'q/output/testcase2.txt': '4',
+            'q/manifest.json': manifest_for('q', ['testcase1', 'testcase2'], 'v1')
+        })
+        patcher = mock.patch.object(testcases, 's3', self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        testcases._suites.clear()
+        self.addCleanup(testcases._suites.clear)
+        caches['default'].clear()
+
+    def test_suite_is_reused_without_s3_calls_until_revalidation(self):
+        suite = testcases.load_test_suite('q')
+        self.assertEqual(suite.cases, [('1', '2'), ('3', '4')])
+        self.assertEqual(suite.version, 'v1')
+        self.s3.gets.clear()
+        self.assertIs(testcases.load_test_suite('q'), suite)
+        self.assertEqual(self.s3.gets, [])
+
+    def test_revalidation_reads_only_the_manifest(self):
+        suite = testcases.load_test_suite('q')
+        self.s3.gets.clear()
+        with mock.patch.object(testcases, 'TESTCASE_REVALIDATE_SECONDS', 0):
+            self.assertIs(testcases.load_test_suite('q'), suite)
+        self.assertEqual(self.s3.gets, ['q/manifest.json'])
+
+    def test_new_version_is_fetched(self):
+        testcases.load_test_suite('q')
+        self.s3.put('q/output/testcase1.txt', '20')
+        self.s3.put('q/manifest.json', manifest_for('q', ['testcase1', 'testcase2'], 'v2'))
+        with mock.patch.object(testcases, 'TESTCASE_REVALIDATE_SECONDS', 0):
+            suite = testcases.load_test_suite('q')
+        self.assertEqual((suite.version, suite.cases[0]), ('v2', ('1', '20')))
+
+    def test_other_processes_load_from_the_shared_tier(self):
+        testcases.load_test_suite('q')
+        testcases._suites.clear()
+        self.s3.gets.clear()
+        suite = testcases.load_test_suite('q')
+        self.assertEqual(suite.cases, [('1', '2'), ('3', '4')])
+        self.assertEqual(self.s3.gets, ['q/manifest.json'])
+
+    def test_listed_suites_get_a_stable_version(self):
+        del self.s3.objects['q/manifest.json']
+        suite = testcases.load_test_suite('q')
+        self.assertTrue(suite.version.startswith('listing-'))
+
+        testcases._suites.clear()
+        self.s3.gets.clear()
+        self.assertEqual(testcases.load_test_suite('q').version, suite.version)
+        self.assertEqual(self.s3.gets, ['q/manifest.json'])
+
+        self.s3.put('q/output/testcase2.txt', '40')
+        testcases._suites.clear()
+        changed = testcases.load_test_suite('q')
+        self.assertNotEqual(changed.version, suite.version)
+        self.assertEqual(changed.cases[1], ('3', '40'))
+
+
+class GetManifestTests(SimpleTestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        patcher = mock.patch.object(testcases, 's3', self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_the_manifest(self):
+        self.s3.put('q/manifest.json', manifest_for('q', ['testcase1'], 'v7'))
+        manifest = testcases.get_manifest('q')
+        self.assertEqual((manifest['version'], manifest['count']), ('v7', 1))
+
+    def test_lists_cases_when_there_is_no_manifest(self):
+        for key in ('q/q.html', 'q/input/testcase10.txt', 'q/input/testcase2.txt', 'q/input/sample1.txt',
+                    'q/output/testcase2.txt', 'q/output/sample1.txt', 'q/input/notes.md', 'q/_jobs/x/a.json'):
+            self.s3.put(key, key)
+        manifest = testcases.get_manifest('q')
+        self.assertEqual([case['name'] for case in manifest['cases']], ['sample1', 'testcase2', 'testcase10'])
+        self.assertEqual(manifest['count'], 3)
+        self.assertTrue(manifest['cases'][0]['sample'])
+        self.assertIsNone(manifest['cases'][2]['output'])
+        self.assertEqual(manifest['cases'][1]['input']['etag'], hashlib.md5(b'q/input/testcase2.txt').hexdigest())
+
+    def test_cases_without_outputs_are_not_judged(self):
+        self.s3.put('q/input/testcase1.txt', '1')
+        self.s3.put('q/output/testcase1.txt', '2')
+        self.s3.put('q/input/testcase2.txt', '3')
+        suite = testcases._fetch_suite('q', testcases.get_manifest('q'))
+        self.assertEqual((suite.names, suite.cases), (['testcase1'], [('1', '2')]))
+
+    def test_question_without_outputs_is_missing(self):
+        self.s3.put('q/input/testcase1.txt', '1')
+        with self.assertRaises(testcases.TestCaseMissingError):
+            testcases._fetch_suite('q', testcases.get_manifest('q'))
+
+
+class FakeRunner:
+    """Judge backend double: echoes each input as its output unless `outputs` says otherwise"""
+    name = 'fake'
+
+    def __init__(self, outputs=None, error_at=None, block_after=None):
+        self.outputs = outputs or {}
+        self.error_at = error_at
+        self.block_after = block_after
+        self.release = threading.Event()
+        self.closed = threading.Event()
+        self.calls = []
+
+    def iter_results(self, language, source_code, inputs, window=None):
+        self.calls.append({'language': language, 'inputs': list(inputs), 'window': window})
+        try:
+            for index, stdin in enumerate(inputs):
+                if index == self.error_at:
+                    raise runners.RunnerError("judge unavailable")
+                if index == self.block_after:
+                    self.release.wait(5)
+                yield index, {
+                    'stdout': self.outputs.get(index, stdin),
+                    'stderr': '',
+                    'compile_output': '',
+                    'status_id': runners.STATUS_ACCEPTED[0],
+                    'status': runners.STATUS_ACCEPTED[1],
+                    'time': '0.010',
+                    'memory': 1024
+                }
+        finally:
+            self.closed.set()
+
+
+class RunCodeViewTestCase(SimpleTestCase):
+    """Patches the suite loader and judge backend behind problems.views"""
+
+    def setUp(self):
+        caches['default'].clear()
+        verdicts._verdicts.clear()
+        self.suite = testcases.TestSuite('q', 'v1', [('1', '1'), ('2', '2'), ('3', '3')], sample_indexes=[0])
+        self.runner = FakeRunner()
+        for patcher in (
+            mock.patch.object(views, 'load_test_suite', lambda question_id: self.suite),
+            mock.patch.object(views, 'get_runner', lambda: self.runner),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, mode=None, source_code="print(input())"):
+        body = {'source_code': source_code, 'language': 'python'}
+        if mode is not None:
+            body['mode'] = mode
+        return RequestFactory().post('/run', data=json.dumps(body), content_type='application/json')
+
+    def run_code(self, **kwargs):
+        response = views.run_code(self.post(**kwargs), 'q')
+        return response.status_code, json.loads(response.content)
+
+    def stream(self, **kwargs):
+        async def consume():
+            response = await views.run_code_stream(self.post(**kwargs), 'q')
+            return [json.loads(line) async for line in response]
+        return asyncio.run(consume())
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RunCodeStreamTests(RunCodeViewTestCase):
+    def test_results_are_framed_by_start_and_done(self):
+        events = self.stream()
+        self.assertEqual([event['event'] for event in events], ['start', 'result', 'result', 'result', 'done'])
+        self.assertEqual((events[0]['total'], events[0]['cached']), (3, False))
+        self.assertEqual((events[-1]['passed'], events[-1]['total'], events[-1]['skipped']), (3, 3, 0))
+        self.assertTrue(self.runner.closed.is_set())
+
+    def test_judge_failure_ends_with_an_error_event(self):
+        self.runner.error_at = 1
+        events = self.stream()
+        self.assertEqual([event['event'] for event in events], ['start', 'result', 'error'])
+        self.assertIn('fake', events[-1]['error'])
+
+    def test_disconnect_closes_the_judge(self):
+        self.runner.block_after = 1
+
+        async def disconnect_after_first_result():
+            response = await views.run_code_stream(self.post(), 'q')
+            received = asyncio.Queue()
+
+            async def consume():
+                async for line in response:
+                    await received.put(json.loads(line))
+
+            task = asyncio.create_task(consume())
+            while (await received.get())['event'] != 'result':
+                pass
+            # Django's ASGI handler cancels the response task when the client goes away
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.runner.release.set()
+            return response
+
+        # Holding on to the response keeps the judge generator from being closed by garbage collection
+        response = asyncio.run(disconnect_after_first_result())
+        self.assertTrue(self.runner.closed.wait(2))
+        del response
+
+    def test_unknown_mode_is_rejected(self):
+        async def request():
+            return await views.run_code_stream(self.post(mode='turbo'), 'q')
+        self.assertEqual(asyncio.run(request()).status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RunModeTests(RunCodeViewTestCase):
+    def test_full_is_the_default(self):
+        status, data = self.run_code()
+        self.assertEqual((status, data['mode'], len(data['test_case_results'])), (200, 'full', 3))
+        self.assertIsNone(self.runner.calls[0]['window'])
+
+    def test_sample_runs_only_the_worked_examples(self):
+        status, data = self.run_code(mode='sample')
+        self.assertEqual(status, 200)
+        self.assertEqual([result['test_case'] for result in data['test_case_results']], [1])
+        self.assertEqual(self.runner.calls[0]['inputs'], ['1'])
+        self.assertIsNone(data['metrics']['beats'])
+
+    def test_sample_without_worked_examples_is_refused(self):
+        self.suite = testcases.TestSuite('q', 'v1', [('1', '1'), ('2', '2')])
+        status, data = self.run_code(mode='sample')
+        self.assertEqual(status, 400)
+        self.assertIn('no sample test cases', data['error'])
+        self.assertEqual(self.runner.calls, [])
+
+    def test_fail_fast_stops_at_the_first_failure(self):
+        self.runner.outputs = {1: 'wrong'}
+        status, data = self.run_code(mode='fail_fast')
+        self.assertEqual(status, 200)
+        self.assertEqual([result['result'] for result in data['test_case_results']], ['Passed', 'Failed'])
+        self.assertEqual(data['skipped'], 1)
+        self.assertEqual(self.runner.calls[0]['window'], views.FAIL_FAST_WINDOW)
+        self.assertTrue(self.runner.closed.is_set())
+
+    def test_full_reports_every_failure(self):
+        self.runner.outputs = {0: 'wrong', 1: 'wrong'}
+        _, data = self.run_code(mode='full')
+        self.assertEqual([result['result'] for result in data['test_case_results']], ['Failed', 'Failed', 'Passed'])
+        self.assertEqual(data['skipped'], 0)
+
+    def test_judge_failure_is_a_json_error(self):
+        self.runner.error_at = 0
+        status, data = self.run_code()
+        self.assertEqual(status, 500)
+        self.assertIn('fake', data['error'])
+
+
+class ArtifactCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.compiles = []
+
+        def fake_compile(language, source_code, workdir):
+            self.compiles.append(source_code)
+            time.sleep(0.01)
+            return "error: expected ';'" if 'broken' in source_code else None
+
+        patcher = mock.patch.object(runners, '_compile', fake_compile)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_source_is_compiled_once(self):
+        cache = runners.ArtifactCache(self.root)
+        first = cache.get('c', 'int main(){}')
+        second = cache.get('c', 'int main(){}')
+        self.assertEqual(self.compiles, ['int main(){}'])
+        self.assertEqual((first.cached, second.cached), (False, True))
+        self.assertEqual(first.workdir, second.workdir)
+
+    def test_language_is_part_of_the_key(self):
+        cache = runners.ArtifactCache(self.root)
+        cache.get('c', 'int main(){}')
+        cache.get('cpp', 'int main(){}')
+        self.assertEqual(len(self.compiles), 2)
+
+    def test_compile_errors_are_cached(self):
+        cache = runners.ArtifactCache(self.root)
+        self.assertTrue(cache.get('c', 'broken').failed)
+        artifact = cache.get('c', 'broken')
+        self.assertTrue(artifact.failed and artifact.cached)
+        self.assertEqual(len(self.compiles), 1)
+
+    def test_concurrent_requests_wait_for_one_compilation(self):
+        cache = runners.ArtifactCache(self.root)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            artifacts = list(executor.map(lambda _: cache.get('c', 'int main(){}'), range(8)))
+        self.assertEqual(len(self.compiles), 1)
+        self.assertEqual(len({artifact.workdir for artifact in artifacts}), 1)
+
+    def test_evicted_artifacts_are_removed(self):
+        cache = runners.ArtifactCache(self.root, max_entries=1)
+        first = cache.get('c', 'one')
+        cache.get('c', 'two')
+        self.assertFalse(os.path.exists(first.workdir))
+        cache.get('c', 'one')
+        self.assertEqual(self.compiles, ['one', 'two', 'one'])
+
+
+@skipUnless(shutil.which('gcc') and shutil.which(runners.LOCAL_PRLIMIT), "gcc and prlimit are required")
+class CompiledRunTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with mock.patch.object(runners, 'LOCAL_ARTIFACT_DIR', directory.name):
+            self.runner = runners.LocalRunner(workers=2)
+
+    def test_compiled_once_and_run_per_case(self):
+        source = "#include <stdio.h>\nint main(){int n; scanf(\"%d\", &n); printf(\"%d\\n\", n * n); return 0;}\n"
+        first = self.runner.run('c', source, ['2', '3'])
+        again = self.runner.run('c', source, ['4'])
+        self.assertEqual([result['stdout'] for result in first + again], ['4\n', '9\n', '16\n'])
+        self.assertFalse(first[0]['compile_cached'])
+        self.assertTrue(again[0]['compile_cached'])
+        self.assertEqual(first[0]['compile_time'], again[0]['compile_time'])
+
+    def test_compile_error_is_reported_for_every_case(self):
+        results = self.runner.run('c', "int main( {", ['1', '2'])
+        self.assertEqual([result['status_id'] for result in results], [runners.STATUS_COMPILATION_ERROR[0]] * 2)
+        self.assertIn('error', results[0]['compile_output'])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class VerdictTests(SimpleTestCase):
+    results = [{'test_case': 1, 'status': 'Accepted', 'result': 'Passed'}]
+
+    def setUp(self):
+        caches['default'].clear()
+        verdicts._verdicts.clear()
+
+    def test_formatting_changes_hit_the_same_verdict(self):
+        verdicts.store_verdict('q', 'python', 'full', "x = 1  \nprint(x)\n", 'v1', self.results)
+        self.assertEqual(verdicts.get_verdict('q', 'python', 'full', "x = 1\r\nprint(x)", 'v1'), self.results)
+
+    def test_key_covers_version_language_and_mode(self):
+        verdicts.store_verdict('q', 'python', 'full', "print(1)", 'v1', self.results)
+        self.assertIsNone(verdicts.get_verdict('q', 'python', 'full', "print(1)", 'v2'))
+        self.assertIsNone(verdicts.get_verdict('q', 'javascript', 'full', "print(1)", 'v1'))
+        self.assertIsNone(verdicts.get_verdict('q', 'python', 'sample', "print(1)", 'v1'))
+        self.assertIsNone(verdicts.get_verdict('q', 'python', 'full', "print(2)", 'v1'))
+
+    def test_load_dependent_outcomes_are_not_cached(self):
+        results = self.results + [{'test_case': 2, 'status': 'Time Limit Exceeded', 'result': 'Failed'}]
+        verdicts.store_verdict('q', 'python', 'full', "print(1)", 'v1', results)
+        self.assertIsNone(verdicts.get_verdict('q', 'python', 'full', "print(1)", 'v1'))
+
+    def test_other_processes_hit_the_shared_tier(self):
+        verdicts.store_verdict('q', 'python', 'full', "print(1)", 'v1', self.results)
+        verdicts._verdicts.clear()
+        self.assertEqual(verdicts.get_verdict('q', 'python', 'full', "print(1)", 'v1'), self.results)
+        self.assertEqual(verdicts._verdicts.stats()['entries'], 1)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CachedVerdictViewTests(RunCodeViewTestCase):
+    def test_identical_resubmission_is_not_judged_again(self):
+        _, first = self.run_code()
+        _, second = self.run_code(source_code="print(input())   \n")
+        self.assertEqual(len(self.runner.calls), 1)
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(second['test_case_results'], first['test_case_results'])
+
+    def test_cached_accepted_run_is_not_recorded_twice(self):
+        self.run_code()
+        self.run_code()
+        distribution = metrics.get_runtime_distribution('q', 'python')
+        self.assertEqual(sum(distribution.values()), 1)
+
+    def test_stream_replays_the_cached_verdict(self):
+        self.run_code()
+        events = self.stream()
+        self.assertTrue(events[0]['cached'])
+        self.assertEqual([event['event'] for event in events], ['start', 'result', 'result', 'result', 'done'])
+        self.assertEqual(len(self.runner.calls), 1)
+
+    def test_new_suite_version_is_judged_again(self):
+        self.run_code()
+        self.suite = testcases.TestSuite('q', 'v2', self.suite.cases, sample_indexes=[0])
+        _, data = self.run_code()
+        self.assertFalse(data['cached'])
+        self.assertEqual(len(self.runner.calls), 2)
+
+
+class PercentileTests(SimpleTestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 11))
+        self.assertEqual(percentile(values, 0.5), 5)
+        self.assertEqual(percentile(values, 0.95), 10)
+        self.assertEqual(percentile(values, 1.0), 10)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_missing_values_are_skipped(self):
+        self.assertEqual(percentile([None, 3, None, 1], 0.5), 1)
+        self.assertIsNone(percentile([None], 0.5))
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_submission_metrics(self):
+        results = [{'run_time': '0.010', 'memory': 100}, {'run_time': '0.030', 'memory': 300}, {'run_time': None, 'memory': None}]
+        summary = metrics.submission_metrics(results)
+        self.assertEqual(summary['time'], {'p50': 0.01, 'p95': 0.03, 'max': 0.03})
+        self.assertEqual(summary['memory']['max'], 300)
+        self.assertEqual(summary['total_time'], 0.04)
+
+
+class BeatsPercentTests(SimpleTestCase):
+    def test_empty_distribution(self):
+        self.assertIsNone(beats_percent({}, 0.1))
+
+    def test_slower_runtimes_count_fully_and_same_bucket_half(self):
+        fast, mid, slow = runtime_bucket(0.001), runtime_bucket(0.05), runtime_bucket(1.0)
+        distribution = {fast: 2, mid: 4, slow: 4}
+        self.assertEqual(beats_percent(distribution, 0.05), 60.0)
+        self.assertEqual(beats_percent(distribution, 0.0002), 100.0)
+        self.assertEqual(beats_percent(distribution, 5.0), 0.0)
+
+    def test_buckets_are_monotonic_and_bounded(self):
+        buckets = [runtime_bucket(seconds) for seconds in (0, 0.001, 0.01, 0.1, 1, 10, 1000)]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], metrics.MAX_BUCKET)
+        self.assertGreaterEqual(metrics.bucket_upper_bound(runtime_bucket(0.25)), 0.25)
+
+    def test_distribution_summary_and_time_limit_verdict(self):
+        distribution = {runtime_bucket(0.01): 90, runtime_bucket(1.9): 10}
+        summary = metrics.distribution_summary(distribution)
+        self.assertEqual(summary['count'], 100)
+        self.assertLess(summary['p50'], 0.02)
+        self.assertEqual(metrics.time_limit_verdict(summary, time_limit=2), 'too strict')
+        self.assertEqual(metrics.time_limit_verdict(metrics.distribution_summary({runtime_bucket(0.01): 10}), time_limit=2), 'too loose')
+        self.assertEqual(metrics.time_limit_verdict(metrics.distribution_summary({})), 'no data')
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RuntimeDistributionTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_recorded_runtimes_feed_beats_percent(self):
+        for total in (0.01, 0.02, 0.5, 1.0):
+            metrics.record_accepted_runtime('q', 'python', {'total_time': total, 'time': {'max': total / 2}})
+        distribution = metrics.get_runtime_distribution('q', 'python')
+        self.assertEqual(sum(distribution.values()), 4)
+        self.assertEqual(beats_percent(distribution, 0.1), 50.0)
+        self.assertEqual(sum(metrics.get_runtime_distribution('q', 'python', metrics.SLOWEST_CASE).values()), 4)
+        self.assertEqual(metrics.get_runtime_distribution('q', 'java'), {})
+
+
+class UpstreamLimiterTests(SimpleTestCase):
+    def test_burst_is_admitted_without_waiting(self):
+        limiter = UpstreamLimiter(rate=1, burst=3, max_concurrency=3)
+        waits = [limiter.acquire() for _ in range(3)]
+        self.assertLess(max(waits), 0.05)
+        self.assertEqual(limiter.stats()['in_flight'], 3)
+
+    def test_tokens_refill_at_rate(self):
+        limiter = UpstreamLimiter(rate=20, burst=1, max_concurrency=5)
+        limiter.acquire()
+        waited = limiter.acquire()
+        self.assertGreater(waited, 0.03)
+        self.assertLess(waited, 0.5)
+
+    def test_concurrency_cap_waits_for_release(self):
+        limiter = UpstreamLimiter(rate=1000, burst=10, max_concurrency=1)
+        limiter.acquire()
+        admitted = threading.Event()
+
+        def second():
+            limiter.acquire()
+            admitted.set()
+
+        thread = threading.Thread(target=second)
+        thread.start()
+        self.assertFalse(admitted.wait(0.1))
+        limiter.release()
+        self.assertTrue(admitted.wait(1))
+        thread.join()
+
+    def test_waiters_are_admitted_in_arrival_order(self):
+        limiter = UpstreamLimiter(rate=50, burst=1, max_concurrency=10)
+        limiter.acquire()
+        order = []
+
+        def worker(n):
+            limiter.acquire()
+            order.append(n)
+
+        threads = []
+        for n in range(4):
+            thread = threading.Thread(target=worker, args=(n,))
+            thread.start()
+            threads.append(thread)
+            # Let each thread join the queue before starting the next
+            time.sleep(0.005)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2, 3])
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class UpstreamClientStatsTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.published = mock.patch.dict(http_client._published, {'pid': None, 'slot': None, 'at': 0.0})
+        self.published.start()
+        self.addCleanup(self.published.stop)
+        self.clients = mock.patch.dict(http_client._clients, clear=True)
+        self.clients.start()
+        self.addCleanup(self.clients.stop)
+
+    def upstream(self, statuses):
+        client = UpstreamClient('judge0', rate=1000, burst=10, max_concurrency=2, max_retries=2, backoff_max=0)
+        client.session.request = mock.Mock(side_effect=[FakeResponse(status) for status in statuses])
+        http_client._clients['judge0'] = client
+        return client
+
+    def test_request_counts_retries_and_throttling(self):
+        client = self.upstream([429, 200])
+        self.assertEqual(client.post('https://judge0.test/submissions').status_code, 200)
+        stats = client.stats()
+        self.assertEqual((stats['requests'], stats['retries'], stats['throttled'], stats['failures']), (2, 1, 1, 0))
+
+    def test_requests_publish_at_most_once_per_interval(self):
+        client = self.upstream([200, 200])
+        client.get('https://judge0.test/a')
+        client.get('https://judge0.test/b')
+        # The second request fell inside the interval, so the shared copy still shows one
+        self.assertEqual(http_client.shared_client_stats()['judge0']['requests'], 1)
+        http_client.publish_client_stats(force=True)
+        self.assertEqual(http_client.shared_client_stats()['judge0']['requests'], 2)
+
+    def test_processes_are_summed_in_their_own_slots(self):
+        self.upstream([200]).get('https://judge0.test/a')
+        # A forked worker has a new pid and must not overwrite its parent's slot
+        with mock.patch('os.getpid', return_value=-1):
+            self.upstream([200, 503, 200]).get('https://judge0.test/b')
+            http_client._clients['judge0'].get('https://judge0.test/c')
+            http_client.publish_client_stats(force=True)
+        totals = http_client.shared_client_stats()['judge0']
+        self.assertEqual(totals['processes'], 2)
+        self.assertEqual((totals['requests'], totals['retries']), (4, 1))
+
+    def test_runtime_report_shows_upstreams(self):
+        self.upstream([200]).get('https://judge0.test/a')
+        out = io.StringIO()
+        call_command('runtime_report', 'Q1', language=['python'], stdout=out)
+        self.assertIn("upstream judge0: 1 requests from 1 processes, 0 retries", out.getvalue())
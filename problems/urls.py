@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     path('<str:question_id>/', views.problem_detail, name='problem_detail'),
-    path('problems/<str:question_id>/run_code/', views.run_code, name='run_code')
+    path('problems/<str:question_id>/run_code/', views.run_code, name='run_code'),
+    path('problems/<str:question_id>/run_code/stream/', views.run_code_stream, name='run_code_stream')
 ]
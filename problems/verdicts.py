@@ -0,0 +1,58 @@
+import hashlib
+import logging
+import os
+
+from leetcode_ai.caching import LRUCache, get_shared, set_shared
+
+logger = logging.getLogger(__name__)
+
+# How long a verdict stays valid, and how many are kept in this process
+VERDICT_TTL = int(os.getenv('VERDICT_TTL', str(60 * 60)))
+VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', '1024'))
+
+# Outcomes that depend on machine load rather than on the code, so they are re-judged every time
+UNCACHEABLE_STATUSES = ('Time Limit Exceeded', 'Internal Error', 'Exec Format Error')
+
+_verdicts = LRUCache(max_entries=VERDICT_CACHE_SIZE, ttl=VERDICT_TTL, sizeof=lambda results: 1)
+
+
+def normalize_source(source_code):
+    """Ignore line-ending and trailing-whitespace differences that cannot change behaviour"""
+    lines = source_code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def verdict_key(question_id, language, mode, source_code, suite_version):
+    source_hash = hashlib.sha256(normalize_source(source_code).encode('utf-8')).hexdigest()
+    return f"verdict:{question_id}:{suite_version}:{language}:{mode}:{source_hash}"
+
+
+def get_verdict(question_id, language, mode, source_code, suite_version):
+    """
+    Return the cached test case results for this exact submission, or None. Suites without
+    a manifest version cannot be invalidated when their outputs change, so they never hit.
+    """
+    if suite_version is None:
+        return None
+
+    key = verdict_key(question_id, language, mode, source_code, suite_version)
+    results = _verdicts.get(key)
+    if results is None:
+        results = get_shared(key)
+        if results is not None:
+            _verdicts.set(key, results)
+    if results is not None:
+        logger.info(f"Verdict cache hit for question_id: {question_id}")
+    return results
+
+
+def store_verdict(question_id, language, mode, source_code, suite_version, results):
+    """Remember the results of a completed run unless the suite is unversioned or an outcome was load-dependent"""
+    if suite_version is None:
+        return
+    if any(result['status'] in UNCACHEABLE_STATUSES for result in results):
+        return
+
+    key = verdict_key(question_id, language, mode, source_code, suite_version)
+    _verdicts.set(key, results)
+    set_shared(key, results, VERDICT_TTL)
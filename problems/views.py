@@ -1,17 +1,37 @@
-import base64
-import requests
+import asyncio
 import json
 import boto3
 import logging
 import os
-from django.http import JsonResponse
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from botocore.exceptions import NoCredentialsError
+from .comparator import compare_outputs, preview
+from .metrics import beats_percent, get_runtime_distribution, record_accepted_runtime, submission_metrics, to_seconds
+from .runners import STATUS_ACCEPTED, RunnerError, get_runner
+from .testcases import TestCaseMissingError, load_test_suite
+from .verdicts import get_verdict, store_verdict
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Execution modes for run_code: every case, only the question's worked examples,
+# or stop at the first failing case
+MODE_FULL = 'full'
+MODE_SAMPLE = 'sample'
+MODE_FAIL_FAST = 'fail_fast'
+RUN_MODES = (MODE_FULL, MODE_SAMPLE, MODE_FAIL_FAST)
+
+# Cases scheduled ahead of the first result in fail-fast mode
+FAIL_FAST_WINDOW = int(os.getenv('FAIL_FAST_WINDOW', '4'))
+
+
+class NoSampleCasesError(Exception):
+    """Raised when sample mode is asked of a question that has no worked examples"""
+
 # Initialize S3 client
 s3 = boto3.client(
     's3',
@@ -20,22 +40,6 @@ s3 = boto3.client(
     region_name=os.getenv('AWS_REGION')
 )
 
-# RapidAPI configuration for Judge0
-RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY')
-JUDGE0_API_URL = "https://judge0-ce.p.rapidapi.com/submissions"
-
-def fetch_s3_file(bucket_name, key):
-    """Helper function to fetch file content from S3"""
-    try:
-        logger.info(f"Fetching file from S3: bucket={bucket_name}, key={key}")
-        response = s3.get_object(Bucket=bucket_name, Key=key)
-        content = response['Body'].read().decode('utf-8')
-        logger.info(f"Successfully fetched file from S3: {key}")
-        return content
-    except Exception as e:
-        logger.error(f"Error fetching file from S3: {str(e)}")
-        return None
-
 def problem_detail(request, question_id):
     """Render the problem detail page"""
     # Fetch the problem metadata from DynamoDB
@@ -66,118 +70,242 @@ def problem_detail(request, question_id):
         'html_content': html_content  # Pass the HTML content to the template
     })
 
+def parse_run_request(request):
+    """Read source code, language and execution mode from a run request body"""
+    body = json.loads(request.body)
+    source_code = body.get('source_code').strip()
+    language = body.get('language')
+    mode = body.get('mode') or MODE_FULL
+    if mode not in RUN_MODES:
+        raise ValueError(f"Unknown execution mode: {mode}")
+
+    # Check for default placeholder and remove it
+    if source_code.startswith("# Write your code here"):
+        source_code = source_code.replace("# Write your code here", "").strip()
+
+    return source_code, language, mode
+
+def select_test_cases(suite, mode):
+    """Return the (test_case_number, input, expected_output) triples a mode should judge"""
+    numbered = [(i, input_data, expected_output) for i, (input_data, expected_output) in enumerate(suite.cases, start=1)]
+    if mode == MODE_SAMPLE:
+        if not suite.sample_indexes:
+            raise NoSampleCasesError(f"Question {suite.question_id} has no sample test cases; submit to judge the full suite")
+        return [numbered[index] for index in suite.sample_indexes]
+    return numbered
+
+def build_test_case_result(test_case, input_data, expected_output, judge_result):
+    """Compare one judge result with its expected output and shape it for the editor"""
+    stdout = judge_result['stdout'] or ''
+    if not stdout:
+        # Handle missing stdout (runtime error or other issues)
+        logger.error(f"No stdout for test case {test_case}: {judge_result['stderr']}")
+
+    # Token-wise comparison that stops at the first difference; only a clean run can pass
+    comparison = compare_outputs(expected_output, stdout)
+    passed = comparison.passed and judge_result['status_id'] == STATUS_ACCEPTED[0]
+
+    # Echo bounded previews instead of full payloads, which can be megabytes at max constraints
+    input_preview = preview(input_data)
+    expected_preview = preview(expected_output.strip())
+    actual_preview = preview(stdout.strip()) if stdout else {
+        'text': "No output or Runtime Error", 'size': 0, 'truncated': False
+    }
+
+    return {
+        'test_case': test_case,
+        'input': input_preview['text'],  # Add test case input to the result
+        'expected': expected_preview['text'],
+        'actual': actual_preview['text'],
+        'truncated': {
+            'input': input_preview['truncated'],
+            'expected': expected_preview['truncated'],
+            'actual': actual_preview['truncated']
+        },
+        'diff': comparison.to_dict(),
+        'status': judge_result['status'],
+        'stderr': preview(judge_result['stderr'])['text'],
+        'compile_output': preview(judge_result['compile_output'])['text'],
+        'run_time': to_seconds(judge_result['time']),  # CPU seconds
+        'memory': judge_result['memory'],  # Peak memory in KB
+        'compile_time': judge_result.get('compile_time'),
+        'result': 'Passed' if passed else 'Failed'
+    }
+
+def build_submission_metrics(question_id, language, mode, results, total, record):
+    """
+    Aggregate per-test time and memory into p50/p95/max. A submission that ran and passed
+    every case also gets its "beats X%" against earlier accepted ones and, when `record`
+    is set, is added to the question's runtime distribution.
+    """
+    metrics = submission_metrics(results)
+    accepted = mode != MODE_SAMPLE and len(results) == total and all(result['result'] == 'Passed' for result in results)
+    metrics['beats'] = None
+    if accepted:
+        metrics['beats'] = beats_percent(get_runtime_distribution(question_id, language), metrics['total_time'])
+        if record:
+            record_accepted_runtime(question_id, language, metrics)
+    return metrics
+
+def iter_test_case_results(runner, language, source_code, test_cases, mode):
+    """
+    Judge `test_cases` and yield editor results in completion order. In fail-fast mode only
+    FAIL_FAST_WINDOW cases are scheduled ahead, and the first failure (wrong answer, time
+    limit, compile error, ...) closes the runner so nothing further is scheduled.
+    """
+    window = FAIL_FAST_WINDOW if mode == MODE_FAIL_FAST else None
+    judge_results = runner.iter_results(language, source_code, [input_data for _, input_data, _ in test_cases], window)
+    try:
+        for index, judge_result in judge_results:
+            test_case, input_data, expected_output = test_cases[index]
+            result = build_test_case_result(test_case, input_data, expected_output, judge_result)
+            yield result
+            if mode == MODE_FAIL_FAST and result['result'] != 'Passed':
+                logger.info(f"Stopping at first failure (test case {test_case}) in fail-fast mode")
+                break
+    finally:
+        judge_results.close()
+
 def run_code(request, question_id):
     """Run user code against test cases stored in S3 and return results"""
     if request.method == 'POST':
         logger.info(f"Received request to run code for question_id: {question_id}")
 
-        # Get code and language from the POST request
+        # Get code, language and execution mode from the POST request
         try:
-            body = json.loads(request.body)
-            source_code = body.get('source_code').strip()
-            language = body.get('language')
-            logger.info(f"Source code and language received. Language: {language}")
+            source_code, language, mode = parse_run_request(request)
+            logger.info(f"Source code and language received. Language: {language}, mode: {mode}")
         except Exception as e:
             logger.error(f"Error reading request body: {str(e)}")
             return JsonResponse({'error': 'Invalid request body'}, status=400)
 
-        # Check for default placeholder and remove it
-        if source_code.startswith("# Write your code here"):
-            source_code = source_code.replace("# Write your code here", "").strip()
-
-        # Convert language to Judge0 language_id
-        language_id = {
-            'python': 71,
-            'javascript': 63,
-            'cpp': 54,
-            'c': 50,
-            'java': 62
-        }.get(language, 71)  # Default to Python if not specified
-        logger.info(f"Judge0 language ID for selected language: {language_id}")
-
-        headers = {
-            'content-type': "application/json",
-            'x-rapidapi-host': "judge0-ce.p.rapidapi.com",
-            'x-rapidapi-key': RAPIDAPI_KEY
-        }
-
-        total_test_cases = 10  # Modify this for the correct number of test cases
-        results = []
-
-        for i in range(1, total_test_cases + 1):
-            # Fetch the input test case from S3
-            input_key = f"{question_id}/input/testcase{i}.txt"
-            expected_output_key = f"{question_id}/output/testcase{i}.txt"
-
-            input_data = fetch_s3_file('leetcode-ai-problems', input_key)
-            expected_output = fetch_s3_file('leetcode-ai-problems', expected_output_key)
-
-            if input_data is None or expected_output is None:
-                logger.error(f"Test case {i} missing in S3")
-                return JsonResponse({'error': f"Test case {i} missing in S3"}, status=500)
-
-            # Base64 encode the input data (stdin)
-            encoded_input = base64.b64encode(input_data.encode('utf-8')).decode('utf-8')
-
-            # Prepare the payload for Judge0 with input data
-            payload = {
-                "language_id": language_id,
-                "source_code": source_code,  # Send source code as plain text
-                "stdin": encoded_input,
-                "base64_encoded": False,  # No base64 encoding for code
-                "wait": True  # Wait for immediate result
-            }
-
-            logger.info(f"Submitting code to Judge0 for test case {i}")
-            response = requests.post(JUDGE0_API_URL, json=payload, headers=headers)
-            logger.info(f"Response status code from Judge0: {response.status_code}")
-            logger.info(f"Response body from Judge0: {response.text}")
-
-            if response.status_code == 201:
-                submission_result = response.json()
-                token = submission_result['token']
-                result_url = f"{JUDGE0_API_URL}/{token}"
-                logger.info(f"Fetching result from Judge0 for token: {token}")
-
-                result_response = requests.get(result_url, headers=headers)
-                logger.info(f"Judge0 result fetch status: {result_response.status_code}")
-                logger.info(f"Judge0 result response: {result_response.text}")
-
-                if result_response.status_code == 200:
-                    judge0_result = result_response.json()
-
-                    # Handle missing stdout (runtime error or other issues)
-                    stdout = judge0_result.get('stdout', None)
-                    if stdout:
-                        actual_output = stdout.strip()
-                    else:
-                        actual_output = "No output or Runtime Error"
-                        logger.error(f"No stdout for test case {i}: {judge0_result.get('stderr', '')}")
-
-                    expected_output = expected_output.strip()
-
-                    result = {
-                        'test_case': i,
-                        'input': input_data,  # Add test case input to the result
-                        'expected': expected_output,
-                        'actual': actual_output,
-                        'status': judge0_result.get('status', {}).get('description', 'Unknown'),
-                        'stderr': judge0_result.get('stderr', ''),
-                        'result': 'Passed' if actual_output == expected_output else 'Failed'
-                    }
-
-                    results.append(result)
-                else:
-                    logger.error(f"Failed to fetch result from Judge0 for token {token}")
-                    return JsonResponse({'error': 'Failed to fetch result from Judge0'}, status=500)
-
-            else:
-                logger.error(f"Failed to submit code to Judge0 for test case {i}")
-                return JsonResponse({'error': 'Failed to submit code to Judge0'}, status=500)
+        # Load the whole suite once; hot questions are served from the test-case cache
+        try:
+            suite = load_test_suite(question_id)
+            test_cases = select_test_cases(suite, mode)
+        except TestCaseMissingError as e:
+            logger.error(str(e))
+            return JsonResponse({'error': str(e)}, status=500)
+        except NoSampleCasesError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        # Identical resubmissions against the same suite version are answered from the verdict cache
+        cached_results = get_verdict(question_id, language, mode, source_code, suite.version)
+        if cached_results is not None:
+            return JsonResponse({
+                'mode': mode,
+                'test_case_results': cached_results,
+                'skipped': len(test_cases) - len(cached_results),
+                'metrics': build_submission_metrics(question_id, language, mode, cached_results, len(test_cases), record=False),
+                'cached': True
+            }, safe=False)
+
+        # Run the selected test cases on the configured judge backend
+        runner = get_runner()
+        try:
+            logger.info(f"Running {len(test_cases)} test cases on the {runner.name} judge backend")
+            results = sorted(
+                iter_test_case_results(runner, language, source_code, test_cases, mode),
+                key=lambda result: result['test_case']
+            )
+        except RunnerError as e:
+            logger.error(str(e))
+            return JsonResponse({'error': f'Failed to run code on the {runner.name} judge backend'}, status=500)
+
+        store_verdict(question_id, language, mode, source_code, suite.version, results)
 
         logger.info(f"All test cases processed for question_id: {question_id}")
-        return JsonResponse({'test_case_results': results}, safe=False)
+        return JsonResponse({
+            'mode': mode,
+            'test_case_results': results,
+            'skipped': len(test_cases) - len(results),
+            'metrics': build_submission_metrics(question_id, language, mode, results, len(test_cases), record=True),
+            'cached': False
+        }, safe=False)
 
     else:
         logger.error(f"Invalid request method: {request.method}")
         return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+async def run_code_stream(request, question_id):
+    """
+    Streaming variant of run_code: responds with NDJSON, one line per test case as soon as
+    the judge finishes it, framed by a 'start' line and a 'done' (or 'error') line. Lines only
+    reach the browser incrementally under an ASGI server (uvicorn, see the README) running
+    leetcode_ai/asgi.py; under WSGI, including runserver, the whole response is buffered.
+    """
+    if request.method != 'POST':
+        logger.error(f"Invalid request method: {request.method}")
+        return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+    logger.info(f"Received request to stream run results for question_id: {question_id}")
+    try:
+        source_code, language, mode = parse_run_request(request)
+    except Exception as e:
+        logger.error(f"Error reading request body: {str(e)}")
+        return JsonResponse({'error': 'Invalid request body'}, status=400)
+
+    try:
+        suite = await sync_to_async(load_test_suite)(question_id)
+        test_cases = select_test_cases(suite, mode)
+    except TestCaseMissingError as e:
+        logger.error(str(e))
+        return JsonResponse({'error': str(e)}, status=500)
+    except NoSampleCasesError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    cached_results = await sync_to_async(get_verdict)(question_id, language, mode, source_code, suite.version)
+
+    runner = get_runner()
+    if cached_results is not None:
+        results = iter(cached_results)
+    else:
+        results = iter_test_case_results(runner, language, source_code, test_cases, mode)
+    # Each step of the blocking judge generator runs on one worker thread so the event loop
+    # stays free, and closing it is queued behind whatever step is still in flight
+    judge_thread = ThreadPoolExecutor(max_workers=1)
+
+    async def next_result():
+        return await asyncio.get_running_loop().run_in_executor(judge_thread, next, results, None)
+
+    async def stream():
+        try:
+            yield json.dumps({'event': 'start', 'mode': mode, 'total': len(test_cases), 'cached': cached_results is not None}) + "\n"
+            judged = []
+            try:
+                while True:
+                    result = await next_result()
+                    if result is None:
+                        break
+                    judged.append(result)
+                    yield json.dumps({'event': 'result', **result}) + "\n"
+            except RunnerError as e:
+                logger.error(str(e))
+                yield json.dumps({'event': 'error', 'error': f'Failed to run code on the {runner.name} judge backend'}) + "\n"
+                return
+
+            if cached_results is None:
+                judged.sort(key=lambda result: result['test_case'])
+                await sync_to_async(store_verdict)(question_id, language, mode, source_code, suite.version, judged)
+            metrics = await sync_to_async(build_submission_metrics)(
+                question_id, language, mode, judged, len(test_cases), record=cached_results is None
+            )
+
+            logger.info(f"All test cases streamed for question_id: {question_id}")
+            yield json.dumps({
+                'event': 'done',
+                'passed': sum(result['result'] == 'Passed' for result in judged),
+                'total': len(test_cases),
+                'skipped': len(test_cases) - len(judged),
+                'metrics': metrics
+            }) + "\n"
+        finally:
+            # A client that disconnects cancels this generator; closing the judge generator
+            # stops Judge0 polling or local workers that would otherwise run for nobody
+            judge_thread.submit(getattr(results, 'close', lambda: None))
+            judge_thread.shutdown(wait=False)
+
+    response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop reverse proxies from buffering the stream
+    return response
@@ -2,6 +2,8 @@ from django.shortcuts import render
 import boto3
 import os
 
+from questions.jobs import DEFAULT_OWNER, owner_jobs
+
 # Initialize DynamoDB resource
 dynamodb = boto3.resource(
     'dynamodb',
@@ -10,14 +12,6 @@ dynamodb = boto3.resource(
     region_name=os.getenv('AWS_REGION')
 )
 
-# Initialize AWS S3 and DynamoDB clients
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-    region_name=os.getenv('AWS_REGION')
-)
-
 def all_problems(request):
     # Fetch all problems from DynamoDB
     table = dynamodb.Table('leetcode-ai-questions')
@@ -30,19 +24,21 @@ def all_problems(request):
 def user_problems(request):
     table = dynamodb.Table('leetcode-ai-questions')
     response = table.scan()
-    problems = [item for item in response.get('Items', []) if item.get('uploaded_by') == 'sid']
-
-    # Check if problems are still being processed
-    processing_problems = []
-    for problem in problems:
-        s3_path = f"{problem['question_id']}/{problem['question_id']}.html"
-        try:
-            s3.head_object(Bucket=os.getenv('AWS_STORAGE_BUCKET_NAME'), Key=s3_path)
-        except s3.exceptions.ClientError:
-            processing_problems.append(problem)
+    problems = [item for item in response.get('Items', []) if item.get('uploaded_by') == DEFAULT_OWNER]
+
+    # Jobs still generating (or failed) come from the job status cache in one lookup
+    processing_problems = [
+        {
+            'title': job.get('title') or job.get('description', job['job_id'])[:80],
+            'job_id': job['job_id'],
+            'state': job['state'],
+            'stages_done': sum(state == 'done' for state in job.get('stages', {}).values()),
+            'stages_total': job.get('stages_total')
+        }
+        for job in owner_jobs(DEFAULT_OWNER)
+    ]
 
     return render(request, 'problems_ui/user_problems.html', {
         'problems': problems,
         'processing_problems': processing_problems
     })
-
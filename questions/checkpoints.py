@@ -0,0 +1,64 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import AWS_S3_BUCKET, s3
+
+logger = logging.getLogger(__name__)
+
+# Stage outputs of generation jobs live at {CHECKPOINT_PREFIX}/{job_id}/{stage}.json
+CHECKPOINT_PREFIX = os.getenv('CHECKPOINT_PREFIX', '_jobs')
+
+
+class CheckpointStore:
+    """
+    Persists each pipeline stage's result under a job ID, so a retried or resumed job only
+    runs the stages that have not completed yet. Results the helpers use to signal failure
+    (None / False) and values that are not JSON are never saved.
+    """
+
+    def __init__(self, job_id, bucket_name=None):
+        self.job_id = job_id
+        self.bucket_name = bucket_name or AWS_S3_BUCKET
+        self.prefix = f"{CHECKPOINT_PREFIX}/{job_id}/"
+        self._completed = None
+
+    def _key(self, stage):
+        return f"{self.prefix}{stage}.json"
+
+    def load_all(self):
+        """Return {stage: result} for every completed stage of this job, read from S3 once"""
+        if self._completed is not None:
+            return dict(self._completed)
+        keys = []
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.json'))
+
+        def load(key):
+            response = s3.get_object(Bucket=self.bucket_name, Key=key)
+            return json.loads(response['Body'].read())
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            records = list(executor.map(load, keys))
+        self._completed = {record['stage']: record['result'] for record in records}
+        if self._completed:
+            logger.info(f"Job {self.job_id} resumes with completed stages {sorted(self._completed)}")
+        return dict(self._completed)
+
+    def save(self, stage, result):
+        if result is None or result is False:
+            return False
+        try:
+            body = json.dumps({'stage': stage, 'result': result})
+        except TypeError:
+            logger.info(f"Not checkpointing stage {stage} of job {self.job_id}: result is not JSON")
+            return False
+        try:
+            s3.put_object(Bucket=self.bucket_name, Key=self._key(stage), Body=body, ContentType='application/json')
+            return True
+        except Exception as e:
+            # A lost checkpoint only costs a re-run of that stage
+            logger.error(f"Error checkpointing stage {stage} of job {self.job_id}: {str(e)}")
+            return False
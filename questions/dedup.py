@@ -0,0 +1,218 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from .utils import dynamodb
+
+logger = logging.getLogger(__name__)
+
+# A submitted description whose estimated Jaccard similarity to an existing question's
+# description reaches this threshold is treated as that question
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))
+DEDUP_INDEX_PATH = os.getenv(
+    'DEDUP_INDEX_PATH', os.path.join(os.path.expanduser('~'), '.cache', 'leetcode_ai', 'question_index.json')
+)
+# Questions are indexed by the worker that generated them, which may run on another host, so
+# each host rebuilds its index from DynamoDB once it is this many seconds old
+DEDUP_INDEX_MAX_AGE = float(os.getenv('DEDUP_INDEX_MAX_AGE', '900'))
+
+# Character 5-grams of the normalized text are the shingles
+SHINGLE_SIZE = 5
+# 16 bands of 8 rows: pairs above ~0.7 similarity share a band with high probability
+NUM_BANDS = 16
+ROWS_PER_BAND = 8
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed: signatures must stay comparable across processes and restarts
+_rng = random.Random(2024)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9]+', ' ', (text or '').lower())).strip()
+
+
+def shingles(text):
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """MinHash signature of the text's shingles, or None for empty text"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for shingle in shingles(text)
+    ]
+    if not hashes:
+        return None
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the two texts behind the signatures"""
+    return sum(x == y for x, y in zip(signature, other)) / len(signature)
+
+
+def _band_keys(signature):
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        yield f"{band}:{hashlib.blake2b(repr(rows).encode('utf-8'), digest_size=8).hexdigest()}"
+
+
+class QuestionIndex:
+    """
+    MinHash/LSH index of existing question descriptions, persisted as JSON at `path` so
+    every process on the host shares it. It is reloaded when another process has written
+    it, and rebuilt from DynamoDB when it does not exist yet or is older than `max_age`.
+    """
+
+    def __init__(self, path=DEDUP_INDEX_PATH, max_age=DEDUP_INDEX_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.entries = {}  # question_id -> {'title', 'signature'}
+        self.buckets = {}  # band key -> set of question_ids
+        self.built_at = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _insert(self, question_id, title, signature):
+        self.entries[question_id] = {'title': title, 'signature': signature}
+        for key in _band_keys(signature):
+            self.buckets.setdefault(key, set()).add(question_id)
+
+    @contextmanager
+    def _file_lock(self):
+        # The file lock serializes rebuilds and read-modify-writes across processes sharing the index
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _stale(self):
+        return self.built_at is None or time.time() - self.built_at > self.max_age
+
+    def _load(self, locked=False):
+        self._read()
+        if not self._stale():
+            return
+        try:
+            if locked:
+                self._rebuild()
+                return
+            with self._file_lock():
+                # Another process may have rebuilt it while this one waited
+                self._read()
+                if self._stale():
+                    self._rebuild()
+        except Exception as e:
+            if not self.entries:
+                raise
+            logger.error(f"Error rebuilding question index, using the one built at {self.built_at}: {str(e)}")
+
+    def _read(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading question index {self.path}: {str(e)}")
+            return
+        self.entries, self.buckets = {}, {}
+        for question_id, entry in data.get('entries', {}).items():
+            self._insert(question_id, entry['title'], entry['signature'])
+        self.built_at = data.get('built_at')
+        self._mtime = mtime
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'built_at': self.built_at, 'entries': self.entries}, f)
+        os.replace(temp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def _rebuild(self):
+        """Index every question in DynamoDB that has its description stored"""
+        built_at = time.time()
+        items = []
+        table = dynamodb.Table('leetcode-ai-questions')
+        scan_kwargs = {'ProjectionExpression': 'question_id, title, description'}
+        while True:
+            response = table.scan(**scan_kwargs)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        # Swap only after a complete scan, so a failed rebuild leaves the previous index in place
+        self.entries, self.buckets = {}, {}
+        for item in items:
+            signature = minhash(item.get('description'))
+            if signature is not None:
+                self._insert(item['question_id'], item.get('title', ''), signature)
+        self.built_at = built_at
+        logger.info(f"Built question index with {len(self.entries)} questions")
+        self._save()
+
+    def find(self, description, threshold=DEDUP_THRESHOLD):
+        """Return (question_id, title, similarity) of the closest existing question at or above threshold"""
+        signature = minhash(description)
+        if signature is None:
+            return None
+        with self._lock:
+            self._load()
+            candidates = set()
+            for key in _band_keys(signature):
+                candidates |= self.buckets.get(key, set())
+            scored = [
+                (question_id, self.entries[question_id]['title'], similarity(signature, self.entries[question_id]['signature']))
+                for question_id in candidates
+            ]
+        best = max(scored, key=lambda match: match[2], default=None)
+        if best is not None and best[2] >= threshold:
+            return best
+        return None
+
+    def add(self, question_id, description, title=''):
+        signature = minhash(description)
+        if signature is None:
+            return
+        with self._lock, self._file_lock():
+            self._load(locked=True)
+            self._insert(question_id, title, signature)
+            self._save()
+
+
+_index = QuestionIndex()
+
+
+def find_duplicate_question(description, threshold=DEDUP_THRESHOLD):
+    """Best-effort lookup: an unavailable index never blocks creating a question"""
+    try:
+        return _index.find(description, threshold)
+    except Exception as e:
+        logger.error(f"Error looking up duplicate questions: {str(e)}")
+        return None
+
+
+def index_question(question_id, description, title=''):
+    try:
+        _index.add(question_id, description, title)
+    except Exception as e:
+        logger.error(f"Error indexing question {question_id}: {str(e)}")
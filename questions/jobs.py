@@ -0,0 +1,119 @@
+import os
+import time
+
+from leetcode_ai.caching import delete_shared, get_many_shared, get_shared, incr_shared, set_shared
+
+# Status of each question generation job lives in the shared cache at job:{job_id}. Each owner's
+# jobs are listed one per key, at jobs:owner:{owner}:{n} for a slot n taken from an atomic
+# counter, so web requests and import runs registering jobs at once never overwrite each other
+JOB_STATUS_TTL = int(os.getenv('JOB_STATUS_TTL', str(7 * 24 * 60 * 60)))
+
+# How many of an owner's most recent slots a page looks at; older jobs have expired by then
+OWNER_JOB_LIMIT = int(os.getenv('OWNER_JOB_LIMIT', '200'))
+
+# Placeholder until questions carry real users, as in store_question_metadata_in_dynamo
+DEFAULT_OWNER = 'sid'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+ACTIVE_STATES = (QUEUED, RUNNING, RETRYING)
+
+# Celery task states for jobs whose cached status has expired or was never written
+CELERY_STATES = {
+    'PENDING': QUEUED,
+    'RECEIVED': QUEUED,
+    'STARTED': RUNNING,
+    'RETRY': RETRYING,
+    'SUCCESS': SUCCEEDED,
+    'FAILURE': FAILED
+}
+
+
+def _job_key(job_id):
+    return f"job:{job_id}"
+
+
+def _owner_count_key(owner):
+    return f"jobs:owner:{owner}:count"
+
+
+def _owner_slot_key(owner, slot):
+    return f"jobs:owner:{owner}:{slot}"
+
+
+class JobStatus:
+    """
+    Stage-level status of one generation job. A job runs on one worker at a time, so the
+    status is kept in memory and written whole on every change.
+    """
+
+    def __init__(self, job_id, data=None):
+        self.job_id = job_id
+        self.data = data or {'job_id': job_id, 'state': QUEUED, 'stages': {}}
+
+    @classmethod
+    def load(cls, job_id):
+        return cls(job_id, get_shared(_job_key(job_id)))
+
+    def save(self):
+        self.data['updated_at'] = time.time()
+        set_shared(_job_key(self.job_id), self.data, JOB_STATUS_TTL)
+
+    def update(self, **fields):
+        self.data.update(fields)
+        self.save()
+
+    def stage(self, name, state):
+        self.data['stages'][name] = state
+        self.save()
+
+
+def register_job(job_id, description, owner=DEFAULT_OWNER):
+    """Record a job as queued and list it under its owner; call before enqueuing the task"""
+    status = JobStatus(job_id)
+    status.data.update({'owner': owner, 'description': description[:200], 'created_at': time.time()})
+    status.save()
+    # The counter never expires, so slot numbers are never reused
+    slot = incr_shared(_owner_count_key(owner))
+    if slot is not None:
+        set_shared(_owner_slot_key(owner, slot), job_id, JOB_STATUS_TTL)
+    return status
+
+
+def get_job_status(job_id, task=None):
+    """Cached status of a job, falling back to the Celery state of its task"""
+    data = get_shared(_job_key(job_id))
+    if data is not None:
+        return data
+    if task is None:
+        return None
+    state = task.AsyncResult(job_id).state
+    if state == 'PENDING':
+        # Celery reports unknown task IDs as pending too
+        return None
+    return {'job_id': job_id, 'state': CELERY_STATES.get(state, state.lower()), 'stages': {}}
+
+
+def owner_jobs(owner=DEFAULT_OWNER):
+    """
+    Status of the owner's jobs that have not succeeded, oldest first. Succeeded and expired
+    jobs are unlisted as a side effect; each lives in its own slot, so this races with nothing.
+    """
+    count = get_shared(_owner_count_key(owner)) or 0
+    slot_keys = [_owner_slot_key(owner, slot) for slot in range(max(1, count - OWNER_JOB_LIMIT + 1), count + 1)]
+    if not slot_keys:
+        return []
+    job_ids = get_many_shared(slot_keys)
+    listed = [(key, job_ids[key]) for key in slot_keys if key in job_ids]
+    statuses = get_many_shared([_job_key(job_id) for _, job_id in listed])
+    jobs = []
+    for slot_key, job_id in listed:
+        job = statuses.get(_job_key(job_id))
+        if job is None or job['state'] == SUCCEEDED:
+            delete_shared(slot_key)
+        else:
+            jobs.append(job)
+    return jobs
@@ -0,0 +1,362 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import types
+from collections import deque
+
+import openai
+from langchain_openai import ChatOpenAI
+
+from leetcode_ai.caching import get_shared, set_shared
+
+from . import spans
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+# Identical (model, messages, parameters) are answered from a local disk tier, then from the
+# shared Redis tier, before the model is called. LLM_CACHE_ENABLED=0 turns both off.
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 60 * 60)))
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'leetcode_ai', 'llm'))
+LLM_DISK_CACHE_MAX_BYTES = int(os.getenv('LLM_DISK_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Responses larger than this are not cached at all
+LLM_CACHE_MAX_ENTRY_BYTES = int(os.getenv('LLM_CACHE_MAX_ENTRY_BYTES', str(1024 * 1024)))
+
+
+def prompt_key(model, messages, params):
+    """Stable hash of everything that determines the model's answer"""
+    payload = json.dumps({
+        'model': model,
+        'messages': [{'role': message.type, 'content': message.content} for message in messages],
+        'params': params
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """
+    Local tier: one JSON file per response under `root`, expired by age and evicted
+    least-recently-used first (hits refresh the file's mtime) once the directory grows past
+    `max_bytes`.
+    """
+
+    def __init__(self, root, ttl, max_bytes):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._bytes = None  # Measured on first write
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                content = json.load(f)['content']
+            os.utime(path)
+            return content
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, content):
+        path = self._path(key)
+        data = json.dumps({'content': content}).encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing LLM response to disk cache: {str(e)}")
+            return
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._measure()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if file_name.endswith('.json'):
+                    path = os.path.join(directory, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _measure(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Drop to 90% so a full cache does not rescan on every write
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._bytes -= size
+            except OSError:
+                pass
+
+
+_disk_cache = DiskCache(LLM_CACHE_DIR, LLM_CACHE_TTL, LLM_DISK_CACHE_MAX_BYTES)
+_stats = {'disk_hits': 0, 'shared_hits': 0, 'misses': 0, 'uncached': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """Hit and miss counters of this process, plus the hit rate over cacheable calls"""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['disk_hits'] + stats['shared_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['disk_hits'] + stats['shared_hits']) / lookups, 3) if lookups else None
+    return stats
+
+
+# Per-model limits shared by every caller in the process: how many requests may be in
+# flight, how long one may take, and how often a throttled or failed request is retried
+MODEL_LIMITS = {
+    'gpt-4o': {
+        'max_concurrency': int(os.getenv('GPT4O_MAX_CONCURRENCY', '4')),
+        'timeout': float(os.getenv('GPT4O_TIMEOUT', '180')),
+        'max_retries': int(os.getenv('GPT4O_MAX_RETRIES', '3'))
+    },
+    'gpt-4o-mini': {
+        'max_concurrency': int(os.getenv('GPT4O_MINI_MAX_CONCURRENCY', '8')),
+        'timeout': float(os.getenv('GPT4O_MINI_TIMEOUT', '120')),
+        'max_retries': int(os.getenv('GPT4O_MINI_MAX_RETRIES', '3'))
+    }
+}
+DEFAULT_MODEL_LIMITS = {'max_concurrency': 4, 'timeout': 120.0, 'max_retries': 3}
+
+# USD per million (prompt, completion) tokens, for the cost recorded on stage spans
+MODEL_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60)
+}
+
+# Errors worth retrying: throttling, timeouts and server-side failures
+RETRYABLE_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# LLM_FAKE=1 answers every prompt with a deterministic fake model, for offline runs. Fake
+# replies are never cached
+LLM_FAKE = os.getenv('LLM_FAKE', '0') == '1'
+
+# How many recent latencies each model keeps for its p50/p95
+LATENCY_SAMPLE_SIZE = 512
+
+
+class FakeChatModel:
+    """Deterministic stand-in for ChatOpenAI: the same prompt always gets the same reply"""
+
+    def __init__(self, model, responder=None):
+        self.model = model
+        self.responder = responder
+
+    def invoke(self, messages):
+        if self.responder is not None:
+            content = self.responder(self.model, messages)
+        else:
+            digest = hashlib.sha256('\n'.join(message.content for message in messages).encode('utf-8')).hexdigest()
+            content = f"fake {self.model} response {digest[:16]}"
+        prompt_tokens = sum(len(message.content.split()) for message in messages)
+        return types.SimpleNamespace(
+            content=content,
+            usage_metadata={'input_tokens': prompt_tokens, 'output_tokens': len(content.split())}
+        )
+
+
+class ModelClient:
+    """
+    One reusable chat model per (model, parameters). A semaphore caps concurrent requests to
+    the model across threads, retryable errors are retried with full-jitter backoff outside
+    the semaphore, and latency, queue wait and token usage are recorded.
+    """
+
+    def __init__(self, model, chat, max_concurrency, max_retries=3):
+        self.model = model
+        self.chat = chat
+        self.max_retries = max_retries
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLE_SIZE)
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.max_wait = 0.0
+
+    def invoke(self, messages):
+        attempt = 0
+        while True:
+            try:
+                return self._invoke_once(messages)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                logger.info(f"Retrying {self.model} in {delay:.2f}s after {type(e).__name__}: {str(e)}")
+                with self._lock:
+                    self.retries += 1
+                spans.record(retries=1)
+                attempt += 1
+                time.sleep(delay)
+
+    def _invoke_once(self, messages):
+        queued = time.monotonic()
+        with self._semaphore:
+            started = time.monotonic()
+            try:
+                response = self.chat.invoke(messages)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                latency = time.monotonic() - started
+        usage = getattr(response, 'usage_metadata', None) or {}
+        input_tokens = usage.get('input_tokens', 0)
+        output_tokens = usage.get('output_tokens', 0)
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(latency)
+            self.max_wait = max(self.max_wait, started - queued)
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+        input_price, output_price = MODEL_PRICES.get(self.model, (0, 0))
+        spans.record(
+            model=self.model,
+            llm_calls=1,
+            prompt_tokens=input_tokens,
+            completion_tokens=output_tokens,
+            cost_usd=(input_tokens * input_price + output_tokens * output_price) / 1_000_000
+        )
+        return response
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'retries': self.retries,
+                'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+                'latency_p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+                'max_queue_wait': self.max_wait,
+                'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens
+            }
+
+
+_models = {}
+_models_lock = threading.Lock()
+_fake_responder = None
+
+
+def use_fake_models(responder=None):
+    """
+    Serve every model from FakeChatModel from now on. `responder(model, messages)` may
+    return the reply text; by default replies are derived from a hash of the prompt.
+    """
+    global LLM_FAKE, _fake_responder
+    with _models_lock:
+        LLM_FAKE = True
+        _fake_responder = responder
+        _models.clear()
+
+
+def get_model(model, **params):
+    """Return the process-wide client for `model` with these parameters, creating it on first use"""
+    key = (model, tuple(sorted(params.items())))
+    with _models_lock:
+        if key not in _models:
+            limits = MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
+            if LLM_FAKE:
+                chat = FakeChatModel(model, _fake_responder)
+            else:
+                chat = ChatOpenAI(
+                    api_key=OPENAI_API_KEY,
+                    model=model,
+                    timeout=limits['timeout'],
+                    max_retries=0,  # Retried by ModelClient, so retries are counted
+                    **params
+                )
+            _models[key] = ModelClient(model, chat, limits['max_concurrency'], limits['max_retries'])
+        return _models[key]
+
+
+def model_stats():
+    """Latency, queue wait and token usage per model client in this process"""
+    with _models_lock:
+        clients = list(_models.items())
+    return {
+        model if not params else f"{model} {dict(params)}": client.stats()
+        for (model, params), client in clients
+    }
+
+
+def _call_model(model, messages, params):
+    return get_model(model, **params).invoke(messages).content
+
+
+def invoke_llm(model, messages, cache=True, **params):
+    """
+    Return the model's reply to `messages` as text. Repeated prompts are served from the
+    cache; pass cache=False when a fresh answer is the point (for example regenerating a
+    rejected solution). Fake models bypass both tiers, so their replies are never stored
+    where a real run would read them, nor answered from real replies.
+    """
+    if not (cache and LLM_CACHE_ENABLED) or LLM_FAKE:
+        _count('uncached')
+        return _call_model(model, messages, params)
+
+    key = prompt_key(model, messages, params)
+    content = _disk_cache.get(key)
+    if content is not None:
+        _count('disk_hits')
+        spans.record(model=model, cache_hits=1)
+        logger.info(f"LLM cache hit (disk) for {model} prompt {key[:12]}")
+        return content
+
+    shared_key = f"llm:{key}"
+    content = get_shared(shared_key)
+    if content is not None:
+        _count('shared_hits')
+        spans.record(model=model, cache_hits=1)
+        logger.info(f"LLM cache hit (shared) for {model} prompt {key[:12]}")
+        _disk_cache.set(key, content)
+        return content
+
+    _count('misses')
+    content = _call_model(model, messages, params)
+    if len(content.encode('utf-8')) <= LLM_CACHE_MAX_ENTRY_BYTES:
+        _disk_cache.set(key, content)
+        set_shared(shared_key, content, LLM_CACHE_TTL)
+    return content
@@ -0,0 +1,211 @@
+import json
+import os
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from celery import states
+
+from problems.metrics import percentile
+from questions.dedup import find_duplicate_question
+from questions.jobs import ACTIVE_STATES, SUCCEEDED, get_job_status, register_job
+from questions.tasks import process_question_task
+
+
+def read_progress(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'line': 0, 'in_flight': {}, 'finished': []}
+
+
+def write_progress(path, progress):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(temp_path, path)
+
+
+def in_flight_state(job_id):
+    """
+    What became of a job that was in flight when the last import stopped: 'live' (queued or
+    running, so it must not be enqueued again), 'finished', or 'lost'. Celery reports both
+    queued and unknown tasks as PENDING, so those are told apart by the job's status record.
+    """
+    state = process_question_task.AsyncResult(job_id).state
+    if state in states.READY_STATES:
+        return 'finished'
+    if state != states.PENDING:
+        return 'live'
+    status = get_job_status(job_id)
+    if status is None:
+        return 'lost'
+    return 'live' if status['state'] in ACTIVE_STATES else 'finished'
+
+
+def record_description(record):
+    """A record's description, or its title and body for backlog-style records"""
+    if record.get('description'):
+        return record['description']
+    return "\n\n".join(part for part in (record.get('title'), record.get('body')) if part)
+
+
+class Command(BaseCommand):
+    help = "Generate questions for every description in a JSONL file, a bounded number at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL file with one {\"description\": ...} (or title/body) per line")
+        parser.add_argument('--window', type=int, default=4, help="Generation jobs in flight at once")
+        parser.add_argument('--progress-file', help="Where progress is kept for resuming (default: PATH.progress.json)")
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--allow-duplicates', action='store_true', help="Skip the near-duplicate check")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        progress_path = options['progress_file'] or f"{path}.progress.json"
+        progress = read_progress(progress_path)
+        resumed_from = progress['line']
+        if resumed_from:
+            self.stdout.write(f"Resuming after line {resumed_from} with {len(progress['in_flight'])} job(s) re-attached")
+
+        # Jobs that were in flight when the last import stopped are still queued or running
+        # unless Celery and their status record say otherwise; those are re-attached, and only
+        # lost ones are re-enqueued under their job ID to resume from their checkpoints
+        pending = {int(line): job_id for line, job_id in progress['in_flight'].items()}
+        running = {}  # line -> AsyncResult
+        # Lines past the watermark that finished out of order
+        finished_lines = set(progress.get('finished', []))
+        stats = {'succeeded': 0, 'failed': 0, 'duplicates': 0, 'stage_seconds': {}, 'job_seconds': [], 'failures': []}
+        started_at = {}
+        started = time.monotonic()
+
+        def checkpoint():
+            # Lines up to the first unfinished one never need to be read again
+            line = progress['line']
+            while line + 1 in finished_lines:
+                line += 1
+                finished_lines.discard(line)
+            progress['line'] = line
+            progress['in_flight'] = {str(number): result.id for number, result in running.items()}
+            progress['finished'] = sorted(finished_lines)
+            write_progress(progress_path, progress)
+
+        def collect(block):
+            while running:
+                for line, result in list(running.items()):
+                    if not result.ready():
+                        continue
+                    del running[line]
+                    finished_lines.add(line)
+                    stats['job_seconds'].append(time.monotonic() - started_at.pop(line))
+                    outcome = result.result if result.successful() else {'status': 'error', 'message': str(result.result)}
+                    if isinstance(outcome, dict) and outcome.get('status') == 'success':
+                        stats['succeeded'] += 1
+                        for stage, seconds in (outcome.get('timings') or {}).items():
+                            stats['stage_seconds'].setdefault(stage, []).append(seconds)
+                        self.stdout.write(f"line {line}: question {outcome.get('question_id')}")
+                    else:
+                        stats['failed'] += 1
+                        message = outcome.get('message') if isinstance(outcome, dict) else str(outcome)
+                        stats['failures'].append((line, message))
+                        self.stdout.write(f"line {line}: failed: {message}")
+                checkpoint()
+                if not block or len(running) < options['window']:
+                    return
+                time.sleep(options['poll_interval'])
+
+        def enqueue(line, description, job_id=None):
+            if len(running) >= options['window']:
+                collect(block=True)
+            kwargs = {'job_id': job_id} if job_id else {}
+            if job_id is None:
+                # Listed like jobs created from the web form; a re-enqueued job is listed already
+                job_id = str(uuid.uuid4())
+                register_job(job_id, description)
+            running[line] = process_question_task.apply_async(args=(description, []), kwargs=kwargs, task_id=job_id)
+            started_at[line] = time.monotonic()
+            checkpoint()
+
+        def resume(line, description, job_id):
+            state = in_flight_state(job_id)
+            result = process_question_task.AsyncResult(job_id)
+            if state == 'lost':
+                self.stdout.write(f"line {line}: job {job_id} was lost, re-enqueuing it")
+                enqueue(line, description, job_id)
+            elif state == 'live' or result.ready():
+                # Its outcome is collected like any other job's
+                running[line] = result
+                started_at[line] = time.monotonic()
+            else:
+                # Finished, but Celery no longer holds its result
+                status = get_job_status(job_id)
+                finished_lines.add(line)
+                if status['state'] == SUCCEEDED:
+                    stats['succeeded'] += 1
+                    self.stdout.write(f"line {line}: question {status.get('question_id')}")
+                else:
+                    stats['failed'] += 1
+                    stats['failures'].append((line, status.get('error')))
+
+        with open(path) as f:
+            for line_number, raw in enumerate(f, start=1):
+                if (line_number <= resumed_from or line_number in finished_lines) and line_number not in pending:
+                    continue
+                raw = raw.strip()
+                if not raw:
+                    finished_lines.add(line_number)
+                    continue
+                try:
+                    description = record_description(json.loads(raw))
+                except ValueError as e:
+                    stats['failed'] += 1
+                    stats['failures'].append((line_number, f"invalid JSON: {e}"))
+                    finished_lines.add(line_number)
+                    continue
+
+                if not options['allow_duplicates'] and line_number not in pending:
+                    duplicate = find_duplicate_question(description)
+                    if duplicate is not None:
+                        stats['duplicates'] += 1
+                        self.stdout.write(f"line {line_number}: duplicate of question {duplicate[0]}")
+                        finished_lines.add(line_number)
+                        continue
+
+                if line_number in pending:
+                    resume(line_number, description, pending.pop(line_number))
+                else:
+                    enqueue(line_number, description)
+
+        while running:
+            collect(block=False)
+            if running:
+                time.sleep(options['poll_interval'])
+        checkpoint()
+
+        self.report(stats, time.monotonic() - started)
+
+    def report(self, stats, elapsed):
+        jobs = stats['succeeded'] + stats['failed']
+        self.stdout.write("")
+        self.stdout.write(
+            f"{jobs} jobs in {elapsed:.1f}s ({60 * jobs / elapsed if elapsed else 0:.2f} jobs/min): "
+            f"{stats['succeeded']} succeeded, {stats['failed']} failed, {stats['duplicates']} duplicates skipped"
+        )
+        if stats['job_seconds']:
+            self.stdout.write(
+                f"job latency p50 {percentile(stats['job_seconds'], 0.5):.1f}s "
+                f"p95 {percentile(stats['job_seconds'], 0.95):.1f}s max {max(stats['job_seconds']):.1f}s"
+            )
+        if stats['stage_seconds']:
+            self.stdout.write(f"{'stage':<28}{'runs':>6}{'p50 s':>9}{'p95 s':>9}{'max s':>9}")
+            for stage, seconds in sorted(stats['stage_seconds'].items(), key=lambda item: -percentile(item[1], 0.5)):
+                self.stdout.write(
+                    f"{stage:<28}{len(seconds):>6}{percentile(seconds, 0.5):>9.1f}"
+                    f"{percentile(seconds, 0.95):>9.1f}{max(seconds):>9.1f}"
+                )
+        for line, message in stats['failures']:
+            self.stdout.write(f"failed line {line}: {message}")
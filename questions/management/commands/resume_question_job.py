@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questions.checkpoints import CheckpointStore
+from questions.tasks import process_question_task
+
+
+class Command(BaseCommand):
+    help = "Re-enqueue a question generation job; stages it already completed are not run again"
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_id')
+
+    def handle(self, *args, **options):
+        job_id = options['job_id']
+        completed = CheckpointStore(job_id).load_all()
+        if 'request' not in completed:
+            raise CommandError(f"No checkpoints found for job {job_id}")
+
+        request = completed['request']
+        task = process_question_task.delay(request['description'], request['file_ids'], job_id=job_id)
+        done = sorted(stage for stage in completed if stage != 'request')
+        self.stdout.write(f"Resumed job {job_id} as task {task.id}; completed stages: {', '.join(done) or 'none'}")
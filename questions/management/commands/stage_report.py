@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from problems.metrics import percentile
+from questions.spans import load_recent_traces
+
+
+class Command(BaseCommand):
+    help = ("Summarize per-stage wall time, LLM calls and cache hits, tokens, cost, upload bytes and retries "
+            "across recent generation jobs")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100, help="How many of the most recent job attempts to include")
+        parser.add_argument('--stage', action='append', help="Only report on this stage (repeatable)")
+
+    def handle(self, *args, **options):
+        traces = load_recent_traces(options['jobs'])
+        if not traces:
+            self.stdout.write("No job spans recorded yet")
+            return
+
+        stages = {}
+        for trace in traces:
+            for span in trace['spans']:
+                if options['stage'] and span['stage'] not in options['stage']:
+                    continue
+                stages.setdefault(span['stage'], []).append(span)
+
+        job_seconds = [trace['seconds'] for trace in traces]
+        self.stdout.write(
+            f"{len(traces)} job attempt(s): wall p50 {percentile(job_seconds, 0.5):.1f}s "
+            f"p95 {percentile(job_seconds, 0.95):.1f}s max {max(job_seconds):.1f}s"
+        )
+        self.stdout.write(
+            f"{'stage':<24}{'runs':>6}{'errors':>7}{'p50 s':>8}{'p95 s':>8}{'max s':>8}"
+            f"{'llm':>6}{'cached':>8}{'prompt tok':>12}{'compl tok':>11}{'cost $':>9}{'bytes':>11}{'retries':>8}"
+        )
+        # Stages that dominate the typical job first
+        by_p50 = sorted(stages.items(), key=lambda item: -percentile([span['seconds'] for span in item[1]], 0.5))
+        for stage, stage_spans in by_p50:
+            seconds = [span['seconds'] for span in stage_spans]
+            self.stdout.write(
+                f"{stage:<24}{len(stage_spans):>6}{sum(span['status'] == 'error' for span in stage_spans):>7}"
+                f"{percentile(seconds, 0.5):>8.1f}{percentile(seconds, 0.95):>8.1f}{max(seconds):>8.1f}"
+                f"{sum(span['llm_calls'] for span in stage_spans):>6}"
+                f"{sum(span['cache_hits'] for span in stage_spans):>8}"
+                f"{sum(span['prompt_tokens'] for span in stage_spans):>12}"
+                f"{sum(span['completion_tokens'] for span in stage_spans):>11}"
+                f"{sum(span['cost_usd'] for span in stage_spans):>9.3f}"
+                f"{sum(span['bytes_uploaded'] for span in stage_spans):>11}"
+                f"{sum(span['retries'] for span in stage_spans):>8}"
+            )
+        all_spans = [span for stage_spans in stages.values() for span in stage_spans]
+        total_cost = sum(span['cost_usd'] for span in all_spans)
+        self.stdout.write(f"Total cost ${total_cost:.3f}, ${total_cost / len(traces):.4f} per job attempt")
+        cache_hits = sum(span['cache_hits'] for span in all_spans)
+        prompts = cache_hits + sum(span['llm_calls'] for span in all_spans)
+        if prompts:
+            self.stdout.write(f"LLM cache answered {cache_hits} of {prompts} prompts ({100 * cache_hits / prompts:.0f}%)")
@@ -0,0 +1,123 @@
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Steps of one question that may run at the same time (LLM calls, S3 and Dynamo writes)
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', '6'))
+
+
+class Step:
+    """
+    One node of a pipeline: `func` is called with the results of `deps` as positional
+    arguments, in order. `after` lists steps that must finish first without passing a result.
+    """
+
+    def __init__(self, name, func, deps=(), after=(), checkpoint=True):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.after = tuple(after)
+        self.checkpoint = checkpoint  # False for results only valid in this process, like temp paths
+
+    @property
+    def requires(self):
+        return self.deps + self.after
+
+
+class PipelineError(Exception):
+    """Raised when a step fails; carries the step name and whatever had finished by then"""
+
+    def __init__(self, step, error, results):
+        super().__init__(f"Step {step} failed: {error}")
+        self.step = step
+        self.error = error
+        self.results = results
+
+
+def run_pipeline(steps, max_workers=PIPELINE_WORKERS, checkpoints=None, trace=None, on_step=None):
+    """
+    Run `steps` as a dependency graph on a thread pool, starting each one as soon as
+    everything it requires has finished, so total time follows the critical path.
+    Returns ({step name: result}, {step name: seconds}). On the first failure nothing
+    new is started and PipelineError is raised once the running steps have returned.
+
+    With a CheckpointStore, steps completed by an earlier attempt of the same job are
+    taken from it instead of being run, and each newly finished step is saved to it.
+    With a JobTrace, each step that runs is recorded as a span of that name. `on_step(name,
+    state)` is called from the calling thread as steps go 'running', 'done' or 'failed'.
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        missing = [name for name in step.requires if name not in by_name]
+        if missing:
+            raise ValueError(f"Step {step.name} requires unknown steps {missing}")
+
+    results = {}
+    if checkpoints is not None:
+        completed = checkpoints.load_all()
+        results = {step.name: completed[step.name] for step in steps if step.checkpoint and step.name in completed}
+    timings = {}
+    waiting = [step for step in steps if step.name not in results]
+    # A step whose result was not kept is only re-run if something still needs it
+    for step in reversed(steps):
+        dependents = [other for other in steps if step.name in other.requires]
+        if step in waiting and dependents and all(other.name in results for other in dependents):
+            waiting.remove(step)
+            results.setdefault(step.name, None)
+    running = {}
+    failure = None
+
+    def notify(name, state):
+        if on_step is not None:
+            on_step(name, state)
+
+    for name in results:
+        notify(name, 'done')
+
+    def timed(step, args):
+        started = time.monotonic()
+        try:
+            if trace is not None:
+                with trace.span(step.name):
+                    result = step.func(*args)
+            else:
+                result = step.func(*args)
+        finally:
+            timings[step.name] = time.monotonic() - started
+        if checkpoints is not None and step.checkpoint:
+            checkpoints.save(step.name, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while waiting or running:
+            if failure is None:
+                for step in [step for step in waiting if all(name in results for name in step.requires)]:
+                    waiting.remove(step)
+                    args = [results[name] for name in step.deps]
+                    running[executor.submit(timed, step, args)] = step
+                    notify(step.name, 'running')
+
+            if not running:
+                if failure is None and waiting:
+                    raise ValueError(f"Pipeline has a dependency cycle among {[step.name for step in waiting]}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    results[step.name] = future.result()
+                    logger.info(f"Pipeline step {step.name} finished in {timings[step.name]:.2f}s")
+                    notify(step.name, 'done')
+                except Exception as e:
+                    logger.error(f"Pipeline step {step.name} failed: {str(e)}")
+                    notify(step.name, 'failed')
+                    if failure is None:
+                        failure = (step.name, e)
+
+    if failure is not None:
+        raise PipelineError(failure[0], failure[1], results)
+    return results, timings
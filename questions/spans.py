@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+s3 = boto3.client(
+    's3',
+    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+    region_name=os.getenv('AWS_REGION')
+)
+
+# Each attempt of a generation job writes its stage spans to
+# {SPAN_PREFIX}/{job_id}/{attempt}.json, and logs one JSON line per span
+SPAN_PREFIX = os.getenv('SPAN_PREFIX', '_spans')
+SPANS_ENABLED = os.getenv('SPANS_ENABLED', '1') == '1'
+
+# Counters a span accumulates from the helpers that run inside it
+SPAN_COUNTERS = ('llm_calls', 'cache_hits', 'prompt_tokens', 'completion_tokens', 'cost_usd',
+                 'bytes_uploaded', 'retries')
+
+_local = threading.local()
+
+
+class Span:
+    """Timing and resource counters of one pipeline stage of one job"""
+
+    def __init__(self, job_id, stage):
+        self.job_id = job_id
+        self.stage = stage
+        self.started_at = time.time()
+        self.ended_at = None
+        self.seconds = None
+        self.status = 'running'
+        self.error = None
+        self.models = set()
+        self.counters = dict.fromkeys(SPAN_COUNTERS, 0)
+
+    def add(self, model=None, **counts):
+        if model is not None:
+            self.models.add(model)
+        for name, value in counts.items():
+            self.counters[name] += value
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'stage': self.stage,
+            'started_at': self.started_at,
+            'ended_at': self.ended_at,
+            'seconds': self.seconds,
+            'status': self.status,
+            'error': self.error,
+            'models': sorted(self.models),
+            **{name: round(value, 6) if isinstance(value, float) else value for name, value in self.counters.items()}
+        }
+
+
+def current_span():
+    return getattr(_local, 'span', None)
+
+
+def record(model=None, **counts):
+    """Add to the span of the stage running on this thread; a no-op outside of one"""
+    span = current_span()
+    if span is not None:
+        span.add(model, **counts)
+
+
+class JobTrace:
+    """Collects the spans of one attempt of a generation job and writes them to the sink"""
+
+    def __init__(self, job_id, attempt=0, bucket_name=None):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.bucket_name = bucket_name or os.getenv('AWS_STORAGE_BUCKET_NAME')
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        span = Span(self.job_id, stage)
+        previous = current_span()
+        _local.span = span
+        started = time.monotonic()
+        try:
+            yield span
+            span.status = 'ok'
+        except Exception as e:
+            span.status = 'error'
+            span.error = str(e)
+            raise
+        finally:
+            span.seconds = time.monotonic() - started
+            span.ended_at = time.time()
+            _local.span = previous
+            with self._lock:
+                self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            'job_id': self.job_id,
+            'attempt': self.attempt,
+            'started_at': self.started_at,
+            'seconds': time.time() - self.started_at,
+            'spans': sorted(spans, key=lambda span: span['started_at'])
+        }
+
+    def emit(self):
+        """Best-effort: losing a job's spans never fails the job"""
+        if not SPANS_ENABLED:
+            return
+        trace = self.to_dict()
+        for span in trace['spans']:
+            logger.info(f"span {json.dumps(span, sort_keys=True)}")
+        try:
+            s3.put_object(
+                Bucket=self.bucket_name,
+                Key=f"{SPAN_PREFIX}/{self.job_id}/{self.attempt}.json",
+                Body=json.dumps(trace),
+                ContentType='application/json'
+            )
+        except Exception as e:
+            logger.error(f"Error writing spans of job {self.job_id}: {str(e)}")
+
+
+def load_recent_traces(limit=100, bucket_name=None):
+    """The most recently written job traces, newest first"""
+    bucket_name = bucket_name or os.getenv('AWS_STORAGE_BUCKET_NAME')
+    objects = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{SPAN_PREFIX}/"):
+        objects.extend(obj for obj in page.get('Contents', []) if obj['Key'].endswith('.json'))
+    objects.sort(key=lambda obj: obj['LastModified'], reverse=True)
+
+    def load(obj):
+        response = s3.get_object(Bucket=bucket_name, Key=obj['Key'])
+        return json.loads(response['Body'].read())
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return list(executor.map(load, objects[:limit]))
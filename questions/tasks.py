@@ -10,6 +10,7 @@ from .utils import (
     generate_test_case_script_with_gpt,
     upload_question_to_s3,
     generate_optimal_solution_with_gpt,
+    generate_scaling_input_script_with_gpt,
     upload_test_case_script_to_s3,
     generate_interview_conversation,
     convert_text_to_audio,
@@ -19,6 +20,12 @@ from .utils import (
     store_question_metadata_in_dynamo,
     format_question_as_html
 )
+from .checkpoints import CheckpointStore
+from .dedup import index_question
+from .jobs import FAILED, RETRYING, RUNNING, SUCCEEDED, JobStatus
+from .llm import cache_stats, model_stats
+from .pipeline import PipelineError, Step, run_pipeline
+from .spans import JobTrace
 
 s3 = boto3.client(
     's3',
@@ -27,91 +34,152 @@ s3 = boto3.client(
     region_name=os.getenv('AWS_REGION')
 )
 
-@shared_task
-def process_question_task(description, file_ids):
-    # Upload attachments and call all the steps to generate question
+# Retries of a failed generation job; each resumes from the job's checkpoints
+MAX_JOB_RETRIES = int(os.getenv('QUESTION_JOB_MAX_RETRIES', '3'))
+RETRY_BACKOFF = int(os.getenv('QUESTION_JOB_RETRY_BACKOFF', '30'))
+
+@shared_task(bind=True, max_retries=MAX_JOB_RETRIES)
+def process_question_task(self, description, file_ids, job_id=None):
+    # Upload attachments and call all the steps to generate question. Stage results are
+    # checkpointed under the job ID (the Celery task ID unless one is passed to resume an
+    # earlier job), so a retry only pays for the stages that had not finished.
+    job_id = job_id or self.request.id or str(uuid.uuid4())
+    checkpoints = CheckpointStore(job_id)
+    # Per-stage timing, tokens, cost, upload bytes and retries of this attempt
+    trace = JobTrace(job_id, attempt=self.request.retries or 0)
+    # Stage-level status for the job status endpoint and the user's problem list
+    status = JobStatus.load(job_id)
+    status.update(state=RUNNING, task_id=self.request.id, attempt=self.request.retries or 0)
     try:
-        # Replace with actual implementation as per `create_question` logic
-        # Step 1: Generate LeetCode-style question using GPT-4
-        generated_question = generate_question_with_gpt(description, file_ids)
-
-        # Step 2: Generate metadata for the question using GPT-4
-        generated_metadata = generate_metadata_with_gpt(generated_question)
-
-        # Step 3: Parse the metadata
-        metadata = parse_metadata(generated_metadata)
-
-        # Generate unique ID for the question
-        question_id = generate_unique_question_id()
-
-        # Step 4: Format the question as HTML
-        html_content, question_statement, example_1, example_2, input_format, output_format, constraints  = format_question_as_html(question_id, generated_question)
-
-        # Step 5: Upload the HTML to S3
-        s3_url = upload_question_to_s3(question_id, html_content)
-
-        # Step 6: Store the metadata in DynamoDB
-        meta_data_stored = store_question_metadata_in_dynamo(
-            question_id=question_id,
-            metadata=metadata
-        )
-
-        # Step 7: Generate the test case script using GPT-4o-mini
-        python_script = generate_test_case_script_with_gpt(
-            question_id=question_id,
-            input_format=input_format,
-            constraints=constraints,
-            bucket_name=AWS_S3_BUCKET,
-            test_cases_path=f"{question_id}/input"
-        )
-
-        # Step 8: Upload the generated Python script to S3
-        test_case_script_url = upload_test_case_script_to_s3(question_id, python_script, "generate_test_cases")
-
-        # Step 9: Generate the optimal solution using GPT-4o-mini
-        optimal_solution = generate_optimal_solution_with_gpt(
-            question_id=question_id,
-            generated_question=generated_question,
-            question_statement=question_statement,
-            input_format=input_format,
-            constraints=constraints,
-            output_format=output_format,
-            bucket_name=AWS_S3_BUCKET
-        )
-
-        # Step 10: Upload the optimal solution to S3
-        tester_solution_url = upload_test_case_script_to_s3(question_id, optimal_solution, "tester_solution")
-        
-         # Step 11: Generate interview conversation and audio
-        interview_conversation = generate_interview_conversation(generated_question)
-        print(interview_conversation)
-        audio_file_path = convert_text_to_audio(interview_conversation)
-        audio_url = upload_audio_to_s3(audio_file_path, question_id)
+        completed = checkpoints.load_all()
+        if 'request' not in completed:
+            checkpoints.save('request', {'description': description, 'file_ids': file_ids})
+        question_id = completed.get('question_id')
+        if question_id is None:
+            question_id = generate_unique_question_id()
+            checkpoints.save('question_id', question_id)
+        status.update(question_id=question_id)
+
+        # Each step starts as soon as the steps it reads from have finished; metadata, the
+        # test case script, the solution and the interview only depend on the question
+        steps = [
+            # Step 1: Generate LeetCode-style question using GPT-4
+            Step('generated_question', lambda: generate_question_with_gpt(description, file_ids)),
+
+            # Step 2-3: Generate and parse metadata for the question using GPT-4
+            Step('metadata', lambda question: parse_metadata(generate_metadata_with_gpt(question)),
+                 deps=['generated_question']),
+
+            # Step 4: Format the question as HTML
+            Step('sections', lambda question: format_question_as_html(question_id, question),
+                 deps=['generated_question']),
+
+            # Step 5: Upload the HTML to S3
+            Step('s3_url', lambda sections: upload_question_to_s3(question_id, sections[0]), deps=['sections']),
+
+            # Step 6: Store the metadata in DynamoDB. The row lists the question, so it waits
+            # for the HTML upload; problem_detail would otherwise hit a missing object.
+            Step('meta_data_stored', lambda metadata: store_question_metadata_in_dynamo(
+                question_id=question_id,
+                metadata=metadata,
+                description=description
+            ), deps=['metadata'], after=['s3_url']),
+
+            # Step 7: Generate the test case script using GPT-4o-mini
+            Step('python_script', lambda sections: generate_test_case_script_with_gpt(
+                question_id=question_id,
+                input_format=sections[4],
+                constraints=sections[6],
+                bucket_name=AWS_S3_BUCKET,
+                test_cases_path=f"{question_id}/input",
+                examples=(sections[2], sections[3])
+            ), deps=['sections']),
+
+            # Step 8: Upload the generated Python script to S3
+            Step('test_case_script_url', lambda python_script: upload_test_case_script_to_s3(
+                question_id, python_script, "generate_test_cases"
+            ), deps=['python_script']),
+
+            # Step 8b: Generate and upload the input-scaling script before the solution, whose
+            # upload triggers the Lambda that verifies its performance with it
+            Step('scaling_script', lambda sections: generate_scaling_input_script_with_gpt(
+                question_id=question_id,
+                input_format=sections[4],
+                constraints=sections[6]
+            ), deps=['sections']),
+            Step('scaling_script_url', lambda scaling_script: upload_test_case_script_to_s3(
+                question_id, scaling_script, "scaling_input"
+            ), deps=['scaling_script']),
+
+            # Step 9: Generate the optimal solution using GPT-4o-mini
+            Step('optimal_solution', lambda question, sections: generate_optimal_solution_with_gpt(
+                question_id=question_id,
+                generated_question=question,
+                question_statement=sections[1],
+                input_format=sections[4],
+                constraints=sections[6],
+                output_format=sections[5],
+                bucket_name=AWS_S3_BUCKET
+            ), deps=['generated_question', 'sections']),
+
+            # Step 10: Upload the optimal solution to S3, after the scripts its Lambda relies on
+            # and the Dynamo row it flags if the solution fails verification. If its Lambda
+            # still runs before the inputs exist, it defers to generate_test_cases
+            Step('tester_solution_url', lambda optimal_solution: upload_test_case_script_to_s3(
+                question_id, optimal_solution, "tester_solution"
+            ), deps=['optimal_solution'], after=['test_case_script_url', 'scaling_script_url', 'meta_data_stored']),
+
+            # Step 11: Generate interview conversation and audio
+            Step('interview_conversation', generate_interview_conversation, deps=['generated_question']),
+            Step('audio_file_path', convert_text_to_audio, deps=['interview_conversation'], checkpoint=False),
+            Step('audio_url', lambda audio_file_path: upload_audio_to_s3(audio_file_path, question_id),
+                 deps=['audio_file_path'])
+        ]
+        status.update(stages_total=len(steps))
+        results, timings = run_pipeline(steps, checkpoints=checkpoints, trace=trace, on_step=status.stage)
+        index_question(question_id, description, results['metadata']['title'])
+        status.update(state=SUCCEEDED, title=results['metadata']['title'])
+        print(results['interview_conversation'])
 
         print({
             'status': 'success',
-            's3_url': s3_url,
-            'generated_question': generated_question,
-            'meta_data_stored': meta_data_stored,
-            'metadata': metadata,
-            'test_case_script_url': test_case_script_url,
-            'tester_solution_url': tester_solution_url,
-            'audio_url': audio_url
+            's3_url': results['s3_url'],
+            'generated_question': results['generated_question'],
+            'meta_data_stored': results['meta_data_stored'],
+            'metadata': results['metadata'],
+            'test_case_script_url': results['test_case_script_url'],
+            'tester_solution_url': results['tester_solution_url'],
+            'audio_url': results['audio_url']
         })
         
         return {
             'status': 'success',
-            's3_url': s3_url,
-            'generated_question': generated_question,
-            'meta_data_stored': meta_data_stored,
-            'metadata': metadata,
-            'test_case_script_url': test_case_script_url,
-            'tester_solution_url': tester_solution_url,
-            'audio_url': audio_url
+            'job_id': job_id,
+            'question_id': question_id,
+            's3_url': results['s3_url'],
+            'generated_question': results['generated_question'],
+            'meta_data_stored': results['meta_data_stored'],
+            'metadata': results['metadata'],
+            'test_case_script_url': results['test_case_script_url'],
+            'tester_solution_url': results['tester_solution_url'],
+            'audio_url': results['audio_url'],
+            'timings': timings,
+            # Counters of this worker process since it started, not of this job alone
+            'llm_cache': cache_stats(),
+            'llm_models': model_stats()
         }
         
 
 
         # return {'status': 'success', 'question_id': question_id}
+    except PipelineError as e:
+        if self.request.retries < self.max_retries:
+            status.update(state=RETRYING, error=str(e))
+            raise self.retry(exc=e, countdown=RETRY_BACKOFF * 2 ** self.request.retries)
+        status.update(state=FAILED, error=str(e))
+        return {'status': 'error', 'job_id': job_id, 'message': str(e)}
     except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+        status.update(state=FAILED, error=str(e))
+        return {'status': 'error', 'job_id': job_id, 'message': str(e)}
+    finally:
+        trace.emit()
@@ -1,3 +1,579 @@
-from django.test import TestCase
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import include, path
+
+from . import checkpoints, dedup, jobs, llm, tasks, views
+from .checkpoints import CheckpointStore
+from .dedup import QuestionIndex
+from .jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobStatus, get_job_status, owner_jobs, register_job
+from .llm import DiskCache, FakeChatModel, ModelClient, cache_stats, get_model, invoke_llm, model_stats, use_fake_models
+from .pipeline import PipelineError, Step, run_pipeline
+
+# Enough of the site's routes for the views' redirects to resolve
+urlpatterns = [
+    path('questions/', include('questions.urls')),
+    path('problems/', include('problems.urls')),
+    path('problems_list/', include('problems_ui.urls'))
+]
+
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'questions-tests'}}
+
+
+class FakeCheckpoints:
+    """In-memory stand-in for CheckpointStore"""
+
+    def __init__(self, completed=None):
+        self.completed = dict(completed or {})
+        self.saved = {}
+
+    def load_all(self):
+        return dict(self.completed)
+
+    def save(self, stage, result):
+        self.saved[stage] = result
+        return True
+
+
+class RunPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def step(self, name, value=None, deps=(), after=(), delay=0, checkpoint=True):
+        def func(*args):
+            with self.lock:
+                self.events.append(('start', name))
+            time.sleep(delay)
+            with self.lock:
+                self.events.append(('end', name))
+            return value if value is not None else (name, args)
+        return Step(name, func, deps=deps, after=after, checkpoint=checkpoint)
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+    def test_steps_start_after_what_they_require(self):
+        steps = [
+            self.step('a', delay=0.05),
+            self.step('b', delay=0.01),
+            self.step('c', deps=['b', 'a']),
+            self.step('d', after=['c'])
+        ]
+        results, timings = run_pipeline(steps, max_workers=4)
+
+        self.assertEqual(results['c'], ('c', (('b', ()), ('a', ()))))
+        self.assertEqual(results['d'], ('d', ()))
+        self.assertGreater(self.index('start', 'c'), self.index('end', 'a'))
+        self.assertGreater(self.index('start', 'c'), self.index('end', 'b'))
+        self.assertGreater(self.index('start', 'd'), self.index('end', 'c'))
+        # Independent steps overlap
+        self.assertLess(self.index('start', 'b'), self.index('end', 'a'))
+        self.assertEqual(set(timings), {'a', 'b', 'c', 'd'})
+
+    def test_on_step_reports_each_state(self):
+        states = []
+        run_pipeline([self.step('a'), self.step('b', deps=['a'])], on_step=lambda name, state: states.append((name, state)))
+        self.assertEqual(states, [('a', 'running'), ('a', 'done'), ('b', 'running'), ('b', 'done')])
+
+    def test_failure_stops_dependents(self):
+        def boom():
+            raise RuntimeError('boom')
+
+        steps = [Step('a', boom), self.step('b', deps=['a']), self.step('c')]
+        with self.assertRaises(PipelineError) as raised:
+            run_pipeline(steps)
+        self.assertEqual(raised.exception.step, 'a')
+        self.assertNotIn(('start', 'b'), self.events)
+
+    def test_resume_skips_checkpointed_steps(self):
+        checkpoints = FakeCheckpoints({'a': 'saved a'})
+        states = []
+        steps = [self.step('a'), self.step('b', deps=['a']), self.step('c', deps=['b'])]
+        results, _ = run_pipeline(steps, checkpoints=checkpoints, on_step=lambda name, state: states.append((name, state)))
+
+        self.assertNotIn(('start', 'a'), self.events)
+        self.assertEqual(results['b'], ('b', ('saved a',)))
+        self.assertEqual(set(checkpoints.saved), {'b', 'c'})
+        self.assertEqual(states[0], ('a', 'done'))
+
+    def test_unkept_step_is_rerun_only_when_still_needed(self):
+        steps = [
+            self.step('path', checkpoint=False),
+            self.step('url', deps=['path']),
+            self.step('script', deps=['path'])
+        ]
+        run_pipeline(steps, checkpoints=FakeCheckpoints({'url': 'saved url', 'script': 'saved script'}))
+        self.assertEqual(self.events, [])
+
+        run_pipeline(steps, checkpoints=FakeCheckpoints({'url': 'saved url'}))
+        self.assertEqual([name for event, name in self.events if event == 'start'], ['path', 'script'])
+
+    def test_unknown_requirement_is_rejected(self):
+        with self.assertRaises(ValueError):
+            run_pipeline([self.step('a', deps=['missing'])])
+
+    def test_cycle_is_rejected(self):
+        steps = [self.step('a'), self.step('b', deps=['a', 'c']), self.step('c', after=['b'])]
+        with self.assertRaisesMessage(ValueError, 'dependency cycle'):
+            run_pipeline(steps)
+        self.assertEqual(self.events, [('start', 'a'), ('end', 'a')])
+
+
+SECTIONS = ['<h1>Two Sum</h1>', 'statement', 'example 1', 'example 2', 'input format', 'output format', 'constraints']
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class QuestionTaskTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.events = []
+        self.lock = threading.Lock()
+        self.checkpoints = FakeCheckpoints()
+        stages = {
+            'generate_unique_question_id': 'q1',
+            'generate_question_with_gpt': 'question',
+            'generate_metadata_with_gpt': 'raw metadata',
+            'parse_metadata': {'title': 'Two Sum'},
+            'format_question_as_html': SECTIONS,
+            'upload_question_to_s3': 'https://bucket/q1/question.html',
+            'store_question_metadata_in_dynamo': True,
+            'generate_test_case_script_with_gpt': 'script',
+            'generate_scaling_input_script_with_gpt': 'scaling script',
+            'generate_optimal_solution_with_gpt': 'solution',
+            'generate_interview_conversation': 'conversation',
+            'convert_text_to_audio': '/tmp/q1.mp3',
+            'upload_audio_to_s3': 'https://bucket/q1/audio.mp3'
+        }
+        for name, value in stages.items():
+            self.patch(name, self.recorder(name, value))
+        self.patch('upload_test_case_script_to_s3', self.recorder(
+            None, 'https://bucket/script', name_of=lambda question_id, script, name: f"upload {name}"
+        ))
+        self.patch('CheckpointStore', lambda job_id: self.checkpoints)
+        self.patch('index_question', mock.Mock())
+        patcher = mock.patch('questions.spans.s3')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def patch(self, name, value):
+        patcher = mock.patch.object(tasks, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def recorder(self, name, value, name_of=None):
+        def func(*args, **kwargs):
+            label = name_of(*args, **kwargs) if name_of else name
+            with self.lock:
+                self.events.append(('start', label))
+            time.sleep(0.01)
+            with self.lock:
+                self.events.append(('end', label))
+            return value
+        return func
+
+    def assertBefore(self, first, then):
+        self.assertLess(self.events.index(('end', first)), self.events.index(('start', then)))
+
+    def test_stages_run_in_dependency_order(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = tasks.process_question_task.apply(args=('Two numbers adding to a target', []), task_id='job-1').get()
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual((result['question_id'], result['s3_url']), ('q1', 'https://bucket/q1/question.html'))
+        # The Dynamo row lists the question, so the HTML must already be in S3
+        self.assertBefore('upload_question_to_s3', 'store_question_metadata_in_dynamo')
+        # The solution upload triggers the Lambda, which needs the scripts and the row
+        for first in ('upload generate_test_cases', 'upload scaling_input', 'store_question_metadata_in_dynamo'):
+            self.assertBefore(first, 'upload tester_solution')
+        tasks.index_question.assert_called_once_with('q1', 'Two numbers adding to a target', 'Two Sum')
+        self.assertEqual(get_job_status('job-1')['state'], SUCCEEDED)
+        self.assertEqual(set(result['llm_cache']), {'disk_hits', 'shared_hits', 'misses', 'uncached', 'hit_rate'})
+        self.assertIsInstance(result['llm_models'], dict)
+
+    def test_resumed_job_only_runs_unfinished_stages(self):
+        self.checkpoints.completed = {
+            'request': {'description': 'Two numbers adding to a target', 'file_ids': []},
+            'question_id': 'q1',
+            'generated_question': 'question',
+            'metadata': {'title': 'Two Sum'},
+            'sections': SECTIONS,
+            's3_url': 'https://bucket/q1/question.html',
+            'meta_data_stored': True,
+            'interview_conversation': 'conversation',
+            'audio_url': 'https://bucket/q1/audio.mp3'
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = tasks.process_question_task.apply(args=('ignored', []), task_id='job-2').get()
+        self.assertEqual(result['status'], 'success')
+        started = {name for event, name in self.events if event == 'start'}
+        self.assertEqual(started, {
+            'generate_test_case_script_with_gpt', 'upload generate_test_cases', 'generate_scaling_input_script_with_gpt',
+            'upload scaling_input', 'generate_optimal_solution_with_gpt', 'upload tester_solution'
+        })
+        # The audio file path is never kept, and nothing left needs it
+        self.assertNotIn('audio_file_path', self.checkpoints.saved)
+        self.assertIn('tester_solution_url', self.checkpoints.saved)
+
+
+class FakeS3:
+    """The part of the S3 client CheckpointStore uses, in memory"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body.encode('utf-8') if isinstance(Body, str) else Body
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {'Contents': [{'Key': key} for key in sorted(self.objects) if key.startswith(Prefix)]}
+
+
+class CheckpointStoreTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(checkpoints, 's3', FakeS3())
+        self.s3 = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_saved_stages_are_loaded_by_a_later_attempt(self):
+        store = CheckpointStore('job-1', bucket_name='bucket')
+        self.assertTrue(store.save('metadata', {'title': 'Two Sum'}))
+        self.assertTrue(store.save('sections', SECTIONS))
+        self.assertEqual(CheckpointStore('job-1', bucket_name='bucket').load_all(),
+                         {'metadata': {'title': 'Two Sum'}, 'sections': SECTIONS})
+        self.assertEqual(CheckpointStore('job-2', bucket_name='bucket').load_all(), {})
+
+    def test_failure_results_and_non_json_are_not_saved(self):
+        store = CheckpointStore('job-1', bucket_name='bucket')
+        self.assertFalse(store.save('meta_data_stored', False))
+        self.assertFalse(store.save('s3_url', None))
+        self.assertFalse(store.save('audio_file_path', object()))
+        self.assertEqual(self.s3.objects, {})
+
+    def test_lost_checkpoint_write_is_not_fatal(self):
+        self.s3.put_object = mock.Mock(side_effect=OSError('S3 unavailable'))
+        self.assertFalse(CheckpointStore('job-1', bucket_name='bucket').save('metadata', {'title': 'Two Sum'}))
+
+
+def messages(text):
+    return [types.SimpleNamespace(type='system', content='You write questions.'), types.SimpleNamespace(type='human', content=text)]
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class InvokeLLMCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.disk = DiskCache(directory.name, ttl=60, max_bytes=1024 * 1024)
+        for patcher in (
+            mock.patch.object(llm, '_disk_cache', self.disk),
+            mock.patch.dict(llm._stats, dict.fromkeys(llm._stats, 0)),
+            mock.patch.object(llm, 'LLM_CACHE_ENABLED', True),
+            mock.patch.object(llm, '_call_model', side_effect=lambda model, prompt, params: f"reply {len(prompt)}")
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeated_prompt_is_served_from_disk(self):
+        self.assertEqual(invoke_llm('gpt-4o', messages('two sum')), 'reply 2')
+        self.assertEqual(invoke_llm('gpt-4o', messages('two sum')), 'reply 2')
+        self.assertEqual(llm._call_model.call_count, 1)
+        self.assertEqual(cache_stats()['disk_hits'], 1)
+        self.assertEqual(cache_stats()['hit_rate'], 0.5)
+
+    def test_shared_tier_answers_other_workers_and_fills_their_disk(self):
+        invoke_llm('gpt-4o', messages('two sum'))
+        # Another worker: its own disk tier is empty
+        self.disk.root = tempfile.mkdtemp(dir=self.disk.root)
+        self.assertEqual(invoke_llm('gpt-4o', messages('two sum')), 'reply 2')
+        self.assertEqual(llm._call_model.call_count, 1)
+        key = llm.prompt_key('gpt-4o', messages('two sum'), {})
+        self.assertEqual(self.disk.get(key), 'reply 2')
+        self.assertEqual(cache_stats()['shared_hits'], 1)
+
+    def test_model_parameters_and_prompt_are_part_of_the_key(self):
+        invoke_llm('gpt-4o', messages('two sum'))
+        invoke_llm('gpt-4o', messages('two sum'), temperature=0.2)
+        invoke_llm('gpt-4o-mini', messages('two sum'))
+        invoke_llm('gpt-4o', messages('three sum'))
+        self.assertEqual(llm._call_model.call_count, 4)
+
+    def test_uncached_calls_skip_both_tiers(self):
+        invoke_llm('gpt-4o', messages('two sum'))
+        invoke_llm('gpt-4o', messages('two sum'), cache=False)
+        self.assertEqual(llm._call_model.call_count, 2)
+        self.assertEqual(cache_stats()['uncached'], 1)
+
+    def test_oversized_replies_are_not_cached(self):
+        with mock.patch.object(llm, 'LLM_CACHE_MAX_ENTRY_BYTES', 4):
+            invoke_llm('gpt-4o', messages('two sum'))
+            invoke_llm('gpt-4o', messages('two sum'))
+        self.assertEqual(llm._call_model.call_count, 2)
+
+    def test_disk_entries_expire_and_are_evicted_oldest_first(self):
+        self.disk.set('aa1', 'x' * 400)
+        self.disk.set('aa2', 'y' * 400)
+        os.utime(self.disk._path('aa1'), (time.time() - 120, time.time() - 120))
+        self.assertIsNone(self.disk.get('aa1'))
+        self.assertEqual(self.disk.get('aa2'), 'y' * 400)
+
+        small = DiskCache(tempfile.mkdtemp(dir=self.disk.root), ttl=60, max_bytes=1000)
+        for n, age in ((1, 30), (2, 20), (3, 10)):
+            small.set(f"bb{n}", 'z' * 400)
+            os.utime(small._path(f"bb{n}"), (time.time() - age, time.time() - age))
+        self.assertIsNone(small.get('bb1'))
+        self.assertEqual(small.get('bb3'), 'z' * 400)
+
+
+class StageReportTests(SimpleTestCase):
+    def span(self, stage, seconds, **counters):
+        return {'stage': stage, 'seconds': seconds, 'status': 'ok', 'llm_calls': 0, 'cache_hits': 0, 'prompt_tokens': 0,
+                'completion_tokens': 0, 'cost_usd': 0.0, 'bytes_uploaded': 0, 'retries': 0, **counters}
+
+    def test_reports_llm_calls_and_cache_hits(self):
+        traces = [
+            {'seconds': 30, 'spans': [self.span('generated_question', 20, llm_calls=1, cost_usd=0.02),
+                                      self.span('metadata', 5, cache_hits=1)]},
+            {'seconds': 10, 'spans': [self.span('generated_question', 8, cache_hits=1), self.span('metadata', 1, cache_hits=1)]}
+        ]
+        out = io.StringIO()
+        with mock.patch('questions.management.commands.stage_report.load_recent_traces', return_value=traces):
+            call_command('stage_report', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[2].split()[:8], ['generated_question', '2', '0', '8.0', '20.0', '20.0', '1', '1'])
+        self.assertIn("LLM cache answered 3 of 4 prompts (75%)", out.getvalue())
+
+
+DESCRIPTIONS = {
+    'q1': "Given an array of integers nums and an integer target, return the indices of the two "
+          "numbers such that they add up to target. Each input has exactly one solution.",
+    'q2': "Given the head of a singly linked list, reverse the list in place and return the head "
+          "of the reversed list.",
+}
+
+
+class QuestionIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.json')
+        self.items = [
+            {'question_id': question_id, 'title': question_id.upper(), 'description': description}
+            for question_id, description in DESCRIPTIONS.items()
+        ]
+        table = mock.Mock()
+        table.scan.side_effect = lambda **kwargs: {'Items': list(self.items)}
+        patcher = mock.patch('questions.dedup.dynamodb')
+        self.dynamodb = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dynamodb.Table.return_value = table
+        self.table = table
+
+    def test_finds_near_duplicate(self):
+        index = QuestionIndex(self.path)
+        reworded = DESCRIPTIONS['q1'].replace('nums', 'numbers').replace('exactly one', 'one')
+        question_id, title, score = index.find(reworded)
+        self.assertEqual((question_id, title), ('q1', 'Q1'))
+        self.assertGreaterEqual(score, 0.8)
+
+    def test_unrelated_description_has_no_match(self):
+        index = QuestionIndex(self.path)
+        self.assertIsNone(index.find("Design a least recently used cache with get and put in constant time."))
+        self.assertIsNone(index.find(""))
+
+    def test_exact_match_with_threshold_one(self):
+        index = QuestionIndex(self.path)
+        self.assertEqual(index.find(DESCRIPTIONS['q2'], threshold=1.0)[0], 'q2')
+
+    def test_added_question_is_seen_by_other_processes(self):
+        QuestionIndex(self.path).add('q3', "Return the length of the longest substring without repeating characters.", 'Q3')
+        other = QuestionIndex(self.path)
+        self.assertEqual(other.find("Return the length of the longest substring without repeating characters")[0], 'q3')
+        self.assertEqual(self.table.scan.call_count, 1)
+
+    def test_stale_index_is_rebuilt(self):
+        index = QuestionIndex(self.path, max_age=60)
+        index.find(DESCRIPTIONS['q1'])
+        self.items.append({'question_id': 'q4', 'title': 'Q4', 'description': "Merge two sorted linked lists into one sorted list and return its head."})
+        self.assertIsNone(index.find("Merge two sorted linked lists into one sorted list and return its head."))
+
+        index.built_at -= 61
+        self.assertEqual(index.find("Merge two sorted linked lists into one sorted list and return its head.")[0], 'q4')
+        self.assertEqual(self.table.scan.call_count, 2)
+
+
+@override_settings(CACHES=LOCAL_CACHES, ROOT_URLCONF='questions.tests')
+class CreateQuestionDedupTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        patcher = mock.patch.object(views, 'process_question_task')
+        self.task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_known_description_redirects_to_its_problem(self):
+        with mock.patch.object(dedup._index, 'find', return_value=('q1', 'Two Sum', 0.93)):
+            response = self.client.post('/questions/create/', {'description': DESCRIPTIONS['q1']})
+        self.assertRedirects(response, '/problems/q1/', fetch_redirect_response=False)
+        self.task.apply_async.assert_not_called()
+
+    def test_unavailable_index_does_not_block_generation(self):
+        with mock.patch.object(dedup._index, 'find', side_effect=OSError('index unavailable')):
+            response = self.client.post('/questions/create/', {'description': DESCRIPTIONS['q1']})
+        self.assertRedirects(response, '/problems_list/user_problems/', fetch_redirect_response=False)
+        self.task.apply_async.assert_called_once()
+
+
+class FlakyChat:
+    """Chat model that fails with `errors` first, then answers; tracks how many calls overlap"""
+
+    def __init__(self, errors=(), delay=0):
+        self.errors = list(errors)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, messages):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            error = self.errors.pop(0) if self.errors else None
+        try:
+            time.sleep(self.delay)
+            if error is not None:
+                raise error
+            return types.SimpleNamespace(content='answer', usage_metadata={'input_tokens': 3, 'output_tokens': 1})
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ModelClientTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.disk = DiskCache(directory.name, ttl=60, max_bytes=1024 * 1024)
+        for patcher in (
+            mock.patch.dict(llm._models, clear=True),
+            mock.patch.object(llm, 'LLM_FAKE', False),
+            mock.patch.object(llm, '_fake_responder', None),
+            mock.patch.object(llm, 'LLM_CACHE_ENABLED', True),
+            mock.patch.object(llm, '_disk_cache', self.disk),
+            mock.patch.object(llm, 'ChatOpenAI', side_effect=lambda **kwargs: FlakyChat()),
+            mock.patch.object(llm, 'BACKOFF_MAX', 0)
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_one_client_per_model_and_parameters(self):
+        self.assertIs(get_model('gpt-4o'), get_model('gpt-4o'))
+        self.assertIsNot(get_model('gpt-4o'), get_model('gpt-4o', temperature=0.2))
+        self.assertEqual(set(model_stats()), {'gpt-4o', "gpt-4o {'temperature': 0.2}"})
+
+    def test_concurrent_requests_are_capped(self):
+        chat = FlakyChat(delay=0.05)
+        client = ModelClient('gpt-4o', chat, max_concurrency=2)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            list(executor.map(lambda _: client.invoke(messages('two sum')), range(5)))
+        self.assertEqual(chat.max_active, 2)
+        self.assertEqual(client.stats()['calls'], 5)
+        self.assertEqual(client.stats()['input_tokens'], 15)
+
+    def test_retryable_errors_are_retried_then_raised(self):
+        client = ModelClient('gpt-4o', FlakyChat([llm.RETRYABLE_ERRORS[1]('slow down')]), max_concurrency=1, max_retries=2)
+        self.assertEqual(client.invoke(messages('two sum')).content, 'answer')
+        self.assertEqual((client.stats()['retries'], client.stats()['errors']), (1, 1))
+
+        errors = [llm.RETRYABLE_ERRORS[0]('down')] * 3
+        client = ModelClient('gpt-4o', FlakyChat(errors), max_concurrency=1, max_retries=2)
+        with self.assertRaises(llm.RETRYABLE_ERRORS[0]):
+            client.invoke(messages('two sum'))
+        self.assertEqual(client.stats()['retries'], 2)
+
+    def test_switching_to_fakes_replaces_existing_clients(self):
+        real = get_model('gpt-4o')
+        use_fake_models()
+        fake = get_model('gpt-4o')
+        self.assertIsNot(fake, real)
+        self.assertIsInstance(fake.chat, FakeChatModel)
+
+    def test_fake_replies_never_touch_the_caches(self):
+        invoke_llm('gpt-4o', messages('two sum'))
+        responder = mock.Mock(side_effect=lambda model, prompt: f"fake {model}")
+        use_fake_models(responder)
+        # The real reply cached above is not served to the fake run
+        self.assertEqual(invoke_llm('gpt-4o', messages('two sum')), 'fake gpt-4o')
+        self.assertEqual(invoke_llm('gpt-4o', messages('three sum')), 'fake gpt-4o')
+        self.assertEqual(invoke_llm('gpt-4o', messages('three sum')), 'fake gpt-4o')
+        self.assertEqual(responder.call_count, 3)
+        key = llm.prompt_key('gpt-4o', messages('three sum'), {})
+        self.assertIsNone(self.disk.get(key))
+        self.assertIsNone(caches['default'].get(f"llm:{key}"))
+
+
+@override_settings(CACHES=LOCAL_CACHES, ROOT_URLCONF='questions.tests')
+class JobRegistryTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_concurrent_registrations_are_all_listed(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda n: register_job(f"job-{n}", f"description {n}", owner='ada'), range(40)))
+        listed = owner_jobs('ada')
+        self.assertEqual(sorted(job['job_id'] for job in listed), sorted(f"job-{n}" for n in range(40)))
+        self.assertTrue(all(job['state'] == QUEUED for job in listed))
+        self.assertEqual(owner_jobs('grace'), [])
+
+    def test_succeeded_and_expired_jobs_are_unlisted(self):
+        for n in range(3):
+            register_job(f"job-{n}", 'two sum', owner='ada')
+        JobStatus.load('job-0').update(state=SUCCEEDED)
+        JobStatus.load('job-1').update(state=FAILED, error='boom')
+        caches['default'].delete('job:job-2')
+        self.assertEqual([(job['job_id'], job['state']) for job in owner_jobs('ada')], [('job-1', FAILED)])
+        # Only the failed job keeps its slot
+        slots = caches['default'].get_many([f"jobs:owner:ada:{slot}" for slot in (1, 2, 3)])
+        self.assertEqual(slots, {'jobs:owner:ada:2': 'job-1'})
+
+    def test_only_the_most_recent_slots_are_read(self):
+        with mock.patch.object(jobs, 'OWNER_JOB_LIMIT', 2):
+            for n in range(4):
+                register_job(f"job-{n}", 'two sum', owner='ada')
+            self.assertEqual([job['job_id'] for job in owner_jobs('ada')], ['job-2', 'job-3'])
+
+    def test_stage_updates_and_status_endpoint(self):
+        status = register_job('job-1', 'two sum ' * 50)
+        self.assertEqual(len(status.data['description']), 200)
+        status.update(state=RUNNING)
+        status.stage('metadata', 'done')
+        response = self.client.get('/questions/jobs/job-1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stages'], {'metadata': 'done'})
+        self.assertEqual(response.json()['state'], RUNNING)
+
+    def test_unknown_job_falls_back_to_the_task_state(self):
+        task = mock.Mock()
+        task.AsyncResult.return_value.state = 'STARTED'
+        self.assertEqual(get_job_status('job-9', task=task)['state'], RUNNING)
+        task.AsyncResult.return_value.state = 'PENDING'
+        self.assertIsNone(get_job_status('job-9', task=task))
+        with mock.patch.object(views, 'process_question_task', task):
+            self.assertEqual(self.client.get('/questions/jobs/job-9/').status_code, 404)
@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('create/', views.create_question, name='create_question'),
+    path('jobs/<str:job_id>/', views.job_status, name='job_status'),
 ]
@@ -4,9 +4,11 @@ import requests
 import os
 import uuid
 import boto3
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 from pydub import AudioSegment
+from leetcode_ai.http_client import get_client
+from .llm import invoke_llm
+from .spans import record as record_span
 # from .tasks import process_question_task
 
 # Load your OpenAI API key and AWS credentials
@@ -47,7 +49,7 @@ def upload_file_to_openai(file, purpose="assistants"):
         'purpose': (None, purpose),
     }
     
-    response = requests.post(UPLOAD_URL, headers=headers, files=files)
+    response = get_client('openai').post(UPLOAD_URL, headers=headers, files=files)
     if response.status_code == 200:
         return response.json()['id']  # Return the uploaded file's ID
     else:
@@ -87,10 +89,9 @@ def generate_question_with_gpt(description, file_ids):
     ]
 
     # Use the OpenAI chat model for GPT-4
-    chat = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o")
-    response = chat.invoke(messages)
+    response_text = invoke_llm("gpt-4o", messages)
     
-    return response.content  # Return the raw text response
+    return response_text  # Return the raw text response
 
 # Function to generate metadata for the question
 def generate_metadata_with_gpt(question_content):
@@ -112,11 +113,10 @@ def generate_metadata_with_gpt(question_content):
     ]
 
     # Use the OpenAI chat model for GPT-4
-    chat = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o")
-    response = chat.invoke(messages)
-    print(f"Generated metadata: {response}")
+    response_text = invoke_llm("gpt-4o", messages)
+    print(f"Generated metadata: {response_text}")
     
-    return response.content
+    return response_text
 
 # Function to parse the metadata from the generated content
 def parse_metadata(metadata_content):
@@ -142,20 +142,21 @@ def parse_metadata(metadata_content):
     }
 
 # Function to store metadata in DynamoDB
-def store_question_metadata_in_dynamo(question_id, metadata):
+def store_question_metadata_in_dynamo(question_id, metadata, description=None):
     try:
         table = dynamodb.Table('leetcode-ai-questions')
-        table.put_item(
-            Item={
-                'question_id': question_id,
-                'title': metadata['title'],
-                'company': metadata['company'],
-                'difficulty': metadata['difficulty'],
-                'num_submissions': 0,  # Initial count of submissions
-                'successful_submissions': 0,  # Initial count of successful submissions
-                'uploaded_by': 'sid'  # Placeholder for now, replace with actual user data
-            }
-        )
+        item = {
+            'question_id': question_id,
+            'title': metadata['title'],
+            'company': metadata['company'],
+            'difficulty': metadata['difficulty'],
+            'num_submissions': 0,  # Initial count of submissions
+            'successful_submissions': 0,  # Initial count of successful submissions
+            'uploaded_by': 'sid'  # Placeholder for now, replace with actual user data
+        }
+        if description:
+            item['description'] = description  # Lets the duplicate index be rebuilt from Dynamo
+        table.put_item(Item=item)
         return True
     except Exception as e:
         print(f"Error storing metadata in DynamoDB: {e}")
@@ -245,17 +246,26 @@ def upload_question_to_s3(question_id, html_content):
             Body=html_content,
             ContentType='text/html'
         )
+        record_span(bytes_uploaded=len(html_content.encode('utf-8')))
         return f"https://{os.getenv('AWS_STORAGE_BUCKET_NAME')}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{s3_file_path}"
     except Exception as e:
         print(f"Error uploading file to S3: {e}")
         return None
 
 # Function to generate a Python script to create test cases using GPT-4o-mini
-def generate_test_case_script_with_gpt(question_id, input_format, constraints, bucket_name, test_cases_path):
+def generate_test_case_script_with_gpt(question_id, input_format, constraints, bucket_name, test_cases_path, examples=()):
     """
     This function uses GPT-4o-mini to generate a robust Python script that generates test cases
     and uploads them to a specified S3 path. The script is designed to handle edge cases
-    and include error handling.
+    and include error handling. The question's worked examples are also written as
+    sample1.txt, sample2.txt, ... so the judge can run just those on "Run".
+    """
+    examples_prompt = ""
+    for number, example in enumerate(examples, start=1):
+        if example:
+            examples_prompt += f"""
+    Example {number}:
+    {example}
     """
     test_case_prompt = f"""
     Create a robust Python script that generates 25 test cases based on the following input format 
@@ -280,12 +290,17 @@ def generate_test_case_script_with_gpt(question_id, input_format, constraints, b
     5. Ensure that temporary files (e.g., in the /tmp directory) are cleaned up after uploading to S3.
     6. Implement proper exception handling for S3 uploads and file creation.
     7. Ensure the script logs useful information, such as test case generation and upload success/failure.
+    8. Also write the input of each worked example below, exactly as a program would read it on stdin in the
+       input format above, to sample1.txt, sample2.txt, ... and upload them to "bucket_name/question_id/input/sampleX.txt".
+
+    Worked examples from the question:
+    {examples_prompt}
 
     Example:
     For a string input of lowercase letters with a length constraint of 1 to 1000, generate random strings that follow this constraint.
     
     Additional Requirements:
-    - Use the Python `boto3` library for uploading files to S3.
+    - Use the Python `boto3` library, through `boto3.client('s3')`, for uploading files to S3.
     - Write the test cases to the /tmp directory (for environments like AWS Lambda).
     - Catch any errors that may occur during file writing or S3 uploading and log them for troubleshooting.
     - Ensure the script is modular with functions that can be reused and tested independently.
@@ -302,10 +317,9 @@ def generate_test_case_script_with_gpt(question_id, input_format, constraints, b
     ]
 
     # Use GPT-4o-mini to generate the Python script
-    chat = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o-mini")
-    response = chat.invoke(messages)
+    response_text = invoke_llm("gpt-4o-mini", messages)
     
-    python_script = response.content
+    python_script = response_text
     python_script = python_script.replace("```python", "").replace("```", "").strip()
     python_script = python_script.replace("<code>", "").replace("</code>", "").strip()
 
@@ -325,6 +339,7 @@ def upload_test_case_script_to_s3(question_id, python_script, file_name):
             Body=python_script,
             ContentType='text/x-python'
         )
+        record_span(bytes_uploaded=len(python_script.encode('utf-8')))
         return f"https://{os.getenv('AWS_STORAGE_BUCKET_NAME')}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{s3_file_path}"
     except Exception as e:
         print(f"Error uploading Python script to S3: {e}")
@@ -376,16 +391,60 @@ def generate_optimal_solution_with_gpt(question_id, generated_question, question
     ]
 
     # Use GPT-4o-mini to generate the solution
-    chat = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o-mini")
-    response = chat.invoke(messages)
+    response_text = invoke_llm("gpt-4o-mini", messages)
     
     # Process the output to remove unnecessary tags
-    python_solution = response.content
+    python_solution = response_text
     python_solution = python_solution.replace("```python", "").replace("```", "").strip()
     python_solution = python_solution.replace("<code>", "").replace("</code>", "").strip()
 
     return python_solution
 
+def generate_scaling_input_script_with_gpt(question_id, input_format, constraints):
+    """
+    This function uses GPT-4o-mini to generate scaling_input.py, which builds one valid input
+    for a requested size n. The expected-output Lambda uses it to time the reference solution
+    at growing sizes before its outputs become ground truth.
+    """
+    scaling_prompt = f"""
+    Create a Python script that generates a single valid test input of a requested size for the following
+    input format and constraints.
+
+    Input Format:
+    {input_format}
+
+    Constraints:
+    {constraints}
+
+    The script must:
+    1. Define MAX_N, the largest value the constraints allow for the parameter that dominates the running time
+       (usually the array or string length, otherwise the largest numeric value).
+    2. Read one line from `sys.stdin`:
+       - If it is "max", print MAX_N and exit.
+       - Otherwise it is an integer n (1 <= n <= MAX_N); print one input, exactly as a solution would read it
+         on stdin, whose dominating parameter equals n and whose other values are random but within the constraints.
+    3. Use only the Python standard library and never read or write files or the network.
+    4. Be fast: generating the input for MAX_N must take well under a few seconds.
+
+    Avoid unnecessary comments and explanations.
+
+    Output Generation Format(I dont want any explanation at the beginning of the code or at the end of the code, I just want the code enclosed in code tags as mentioned below):
+    "<code>python_code</code>"
+    """
+
+    messages = [
+        SystemMessage(content="You are an AI that generates Python scripts for generating test cases."),
+        HumanMessage(content=scaling_prompt)
+    ]
+
+    response_text = invoke_llm("gpt-4o-mini", messages)
+
+    python_script = response_text
+    python_script = python_script.replace("```python", "").replace("```", "").strip()
+    python_script = python_script.replace("<code>", "").replace("</code>", "").strip()
+
+    return python_script
+
 # Function to generate realistic interview conversations
 def generate_interview_conversation(question_content):
     prompt = f"""
@@ -415,9 +474,8 @@ def generate_interview_conversation(question_content):
     """
     
     # Call OpenAI's GPT model to generate the conversation
-    chat = ChatOpenAI(api_key=OPENAI_API_KEY, model="gpt-4o")
-    response = chat.invoke([HumanMessage(content=prompt)])
-    conversation_text = response.content
+    response_text = invoke_llm("gpt-4o", [HumanMessage(content=prompt)])
+    conversation_text = response_text
     
     # Clean the response to match the desired format
     conversation_text = conversation_text.replace("<conversation>", "").replace("</conversation>", "").strip()
@@ -459,6 +517,7 @@ def upload_audio_to_s3(file_path, question_id):
     s3_key = f"{question_id}/interview_audio.mp3"
     try:
         s3.upload_file(file_path, AWS_S3_BUCKET, s3_key)
+        record_span(bytes_uploaded=os.path.getsize(file_path))
         return f"https://{AWS_S3_BUCKET}.s3.amazonaws.com/{s3_key}"
     except Exception as e:
         print(f"Error uploading audio file to S3: {e}")
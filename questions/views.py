@@ -1,12 +1,15 @@
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
 import requests
+import logging
 import os
 import uuid
 import boto3
 from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage, SystemMessage
 from pydub import AudioSegment
+from .dedup import find_duplicate_question
+from .jobs import get_job_status, register_job
 from .tasks import process_question_task
 # Main view to handle form submissions
 from .utils import (
@@ -25,6 +28,8 @@ from .utils import (
     store_question_metadata_in_dynamo
 )
 
+logger = logging.getLogger(__name__)
+
 def create_question(request):
     if request.method == 'POST':
         # description = request.POST.get('description', '')
@@ -34,18 +39,38 @@ def create_question(request):
         attachments = request.FILES.getlist('attachments')
         file_ids = []
 
+        # A description we have already turned into a problem goes straight to that problem.
+        # Attachments can change the problem, so those submissions are always generated
+        if not attachments:
+            duplicate = find_duplicate_question(description)
+            if duplicate is not None:
+                question_id, title, score = duplicate
+                logger.info(f"Description matches question {question_id} ({title}) with similarity {score:.2f}")
+                return redirect('problem_detail', question_id=question_id)
+
         # Upload attachments to OpenAI and get file IDs
         for attachment in attachments:
             file_id = upload_file_to_openai(attachment)
             file_ids.append(file_id)
 
-        # Trigger the background task and get the task ID
-        task = process_question_task.delay(description, file_ids)
+        # Record the job before enqueuing it, so its status exists before the worker updates
+        # it; the job ID doubles as the Celery task ID
+        job_id = str(uuid.uuid4())
+        register_job(job_id, description)
+        process_question_task.apply_async(args=(description, file_ids), task_id=job_id)
+        logger.info(f"Enqueued question generation job {job_id}")
 
         # Redirect to the 'user_problems' page
         return redirect('user_problems')
 
     return render(request, 'questions/create_question.html')
+
+
+def job_status(request, job_id):
+    status = get_job_status(job_id, task=process_question_task)
+    if status is None:
+        return JsonResponse({'status': 'error', 'message': f"Unknown job {job_id}"}, status=404)
+    return JsonResponse(status)
         
         
         